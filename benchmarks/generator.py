@@ -0,0 +1,60 @@
+import random
+import string
+
+
+def encode_index(index):
+    """
+    This function turns an index into a lowercase alphabetic string, so
+    that generated room names pass the room name validation
+    """
+    letters = ""
+    while True:
+        index, remainder = divmod(index, 26)
+        letters = string.ascii_lowercase[remainder] + letters
+        if not index:
+            return letters
+
+
+def random_name(rng):
+    """ This function generates a first and last name """
+    return " ".join(
+        "".join(rng.choice(string.ascii_lowercase)
+                for _ in range(rng.randint(3, 9))).title()
+        for _ in range(2))
+
+
+def generate_dojo(people, offices=None, livingspaces=None, fellow_ratio=0.7,
+                  accommodation_ratio=0.5, seed=0):
+    """
+    This function generates the rooms and people of a synthetic dojo.
+    Unless the number of rooms is given there are enough offices for
+    everyone and livingspaces for most of the fellows who want one. It
+    returns the office names, livingspace names and a list of (name,
+    designation, wants accommodation) tuples. The same seed always gives
+    the same dojo.
+    """
+    rng = random.Random(seed)
+    person_list = []
+    for _ in range(people):
+        if rng.random() < fellow_ratio:
+            wants = "Y" if rng.random() < accommodation_ratio else "N"
+            person_list.append((random_name(rng), "fellow", wants))
+        else:
+            person_list.append((random_name(rng), "staff", "N"))
+    if offices is None:
+        offices = people // 6 + 1
+    if livingspaces is None:
+        livingspaces = sum(1 for person in person_list
+                           if person[2] == "Y") // 5 + 1
+    office_names = ["Ofc" + encode_index(index) for index in range(offices)]
+    livingspace_names = ["Lvs" + encode_index(index)
+                         for index in range(livingspaces)]
+    return office_names, livingspace_names, person_list
+
+
+def write_people_file(path, person_list):
+    """ This function writes people in the format read by load_people """
+    with open(path, "w") as people_file:
+        for name, designation, wants in person_list:
+            people_file.write("{} {} {}\n".format(
+                name.upper(), designation.upper(), wants))
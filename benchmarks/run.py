@@ -0,0 +1,197 @@
+"""
+Usage:
+    run.py [--scales=<sizes>] [--seed=<seed>] [--fellows=<ratio>]
+           [--accommodation=<ratio>] [--backend=<scheme>] [--output=<file>]
+           [--compare=<file>]
+
+Options:
+    --scales=<sizes>         Comma separated numbers of people
+                             [default: 1000,10000,100000]
+    --seed=<seed>            Seed of the synthetic dojo generator [default: 0]
+    --fellows=<ratio>        Share of the people who are fellows [default: 0.7]
+    --accommodation=<ratio>  Share of the fellows who want a livingspace
+                             [default: 0.5]
+    --backend=<scheme>       Storage backend the state is saved to, such as
+                             memory:, sqlite: or jsonl: [default: memory:]
+    --output=<file>          File the results are written to
+                             [default: benchmarks/results.json]
+    --compare=<file>         Results of an earlier run to compare against
+"""
+from contextlib import redirect_stdout
+from datetime import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+from docopt import docopt
+
+from benchmarks.generator import generate_dojo, write_people_file
+from data.backends import get_backend
+from rooms.dojo import Dojo
+
+
+def get_commit():
+    """ This function gets the commit the benchmarks are run on """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class NullSink(object):
+    """
+    This class is a report sink writing to the null device, it counts
+    the lines of the report written
+    """
+
+    def __init__(self, null_file):
+        self.null_file = null_file
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        self.null_file.write(text)
+
+
+def add_result(results, scale, operation, items, seconds):
+    """ This function adds the time an operation took to the results """
+    results.append({"scale": scale, "operation": operation, "items": items,
+                    "seconds": seconds,
+                    "items_per_second": items / max(seconds, 1e-9)})
+
+
+def timed(results, scale, operation, items, func, *args):
+    """
+    This function runs func with its output silenced and adds the time
+    it took, and the number of items it handled, to the results
+    """
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start_time = time.perf_counter()
+        func(*args)
+        seconds = time.perf_counter() - start_time
+    add_result(results, scale, operation, items, seconds)
+
+
+def timed_report(results, scale, operation, dojo, blocks, title=""):
+    """
+    This function renders a report of the dojo to the null device, the
+    way the console shows it, and adds the time it took and the number
+    of lines written to the results
+    """
+    with open(os.devnull, "w") as devnull:
+        sink = NullSink(devnull)
+        start_time = time.perf_counter()
+        dojo.show_report(blocks, title, [sink])
+        seconds = time.perf_counter() - start_time
+    add_result(results, scale, operation, sink.lines, seconds)
+
+
+def run_scale(people, seed, fellow_ratio, accommodation_ratio,
+              backend_scheme="memory:"):
+    """
+    This function times the main operations of the dojo on a synthetic
+    dojo of the number of people given and returns the results. The
+    state is saved to and loaded from the backend of backend_scheme.
+    """
+    offices, livingspaces, person_list = generate_dojo(
+        people, fellow_ratio=fellow_ratio,
+        accommodation_ratio=accommodation_ratio, seed=seed)
+    rng = random.Random(seed)
+    dojo = Dojo()
+    results = []
+
+    def create_rooms():
+        dojo.create_room(offices, "office")
+        dojo.create_room(livingspaces, "livingspace")
+
+    def add_people(records):
+        for record in records:
+            dojo.add_person(*record)
+
+    def reallocate_people(count):
+        person_ids = list(dojo.people)
+        for _ in range(count):
+            dojo.reallocate_person(rng.choice(person_ids), rng.choice(offices))
+
+    timed(results, people, "create_room", len(offices) + len(livingspaces),
+          create_rooms)
+    half = len(person_list) // 2
+    timed(results, people, "add_person", half, add_people, person_list[:half])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "people.txt")
+        write_people_file(path, person_list[half:])
+        timed(results, people, "load_people", len(person_list) - half,
+              dojo.load_people, path)
+    moves = min(people, 1000)
+    timed(results, people, "reallocate_person", moves, reallocate_people,
+          moves)
+    timed_report(results, people, "print_allocation", dojo,
+                 dojo.allocation_blocks())
+    timed_report(results, people, "print_unallocated", dojo,
+                 dojo.unallocated_lines(), "UNALLOCATED LIST\n\n")
+    database, db_name = get_backend("{}benchmark_{}_{}".format(
+        backend_scheme, people, os.getpid()))
+    backend_name = type(database).__name__
+    rows = len(dojo.all_rooms) + people
+    try:
+        timed(results, people, backend_name + ".save_state", rows,
+              database.save_state, db_name, dojo.all_rooms,
+              dojo.staff_list + dojo.fellow_list)
+        timed(results, people, backend_name + ".load_state", rows,
+              database.load_state, db_name)
+    finally:
+        dojo.reset()
+        if database.db_exists(db_name):
+            database.discard(db_name)
+    return results
+
+
+def compare(results, earlier_results):
+    """
+    This function prints the change in time of each operation from an
+    earlier run, a negative change is an improvement
+    """
+    earlier = {(result["scale"], result["operation"]): result["seconds"]
+               for result in earlier_results}
+    print("{:<24}{:>10}{:>12}{:>12}{:>10}".format(
+        "operation", "scale", "before (s)", "after (s)", "change"))
+    for result in results:
+        key = (result["scale"], result["operation"])
+        if key in earlier:
+            print("{:<24}{:>10}{:>12.4f}{:>12.4f}{:>+9.1f}%".format(
+                result["operation"], result["scale"], earlier[key],
+                result["seconds"], (result["seconds"] - earlier[key]) /
+                max(earlier[key], 1e-9) * 100))
+
+
+def main(argv=None):
+    arg = docopt(__doc__, argv)
+    seed = int(arg["--seed"])
+    results = []
+    for scale in arg["--scales"].split(","):
+        scale_results = run_scale(int(scale), seed, float(arg["--fellows"]),
+                                  float(arg["--accommodation"]),
+                                  arg["--backend"])
+        for result in scale_results:
+            print("{:<24}{:>10}{:>12.4f}s{:>14.0f}/s".format(
+                result["operation"], result["scale"], result["seconds"],
+                result["items_per_second"]))
+        results += scale_results
+    report = {"commit": get_commit(), "python": platform.python_version(),
+              "created": datetime.now().isoformat(), "seed": seed,
+              "results": results}
+    with open(arg["--output"], "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    if arg["--compare"]:
+        with open(arg["--compare"]) as earlier_file:
+            compare(results, json.load(earlier_file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from copy import copy
+import threading
+import time
+
+from data.backends import get_backend
+
+
+class AutoSaver(object):
+    """
+    This class saves the state of a dojo into a database on a background
+    thread, every interval seconds or once enough changes have been made.
+    The rooms and people changed are copied while the lock of the dojo is
+    held, which is quick, and the copies are written without the lock so
+    the dojo can be changed during the save.
+    """
+
+    def __init__(self, dojo, db_name, interval=60, change_limit=1000):
+        self.dojo = dojo
+        self.db_name = db_name
+        self.backend, self.name = get_backend(db_name)
+        self.interval = interval
+        self.change_limit = change_limit
+        self.full = True
+        self.changes = 0
+        # dictionaries are used as sets that keep the order of the changes
+        self.dirty_rooms = {}
+        self.dirty_people = {}
+        self.deleted_people = {}
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.save_count = 0
+        self.last_save = None
+        self.last_duration = None
+        self.last_rows = None
+        self.last_error = None
+
+    def note(self, entry):
+        """
+        This function records a change made to the dojo, it is given the
+        entries written to the journal
+        """
+        operation = entry["op"]
+        if operation == "add_room":
+            self.dirty_rooms[entry["name"].title()] = None
+        elif operation == "remove":
+            self.dirty_people.pop(entry["id"], None)
+            self.deleted_people[entry["id"]] = None
+        else:
+            self.dirty_people[entry["id"]] = None
+        self.changes += 1
+        if self.changes >= self.change_limit:
+            self.wake.set()
+
+    def reset(self):
+        """
+        This function makes the next save write the whole state, after
+        the state of the dojo has been replaced
+        """
+        self.full = True
+        self.changes += 1
+        self.dirty_rooms = {}
+        self.dirty_people = {}
+        self.deleted_people = {}
+
+    def is_running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        This function stops the background thread and saves the changes
+        made since the last save before returning
+        """
+        with self.dojo.lock:
+            snapshot = self.take_snapshot()
+        self.stopping = True
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+        if snapshot:
+            self.write(snapshot)
+
+    def run(self):
+        """
+        This function saves in the background until the saver is stopped.
+        An error that ends the thread is kept in last_error for the status.
+        """
+        try:
+            self.save_until_stopped()
+        except Exception as error:
+            self.last_error = "Autosave stopped by an error: {!r}".format(
+                error)
+
+    def save_until_stopped(self):
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopping:
+                return
+            snapshot = self.take_snapshot_when_free()
+            if snapshot:
+                self.write(snapshot)
+
+    def take_snapshot_when_free(self):
+        """
+        This function waits for the dojo lock to take a snapshot, giving
+        up when the saver is stopped in the meantime
+        """
+        while not self.dojo.lock.acquire(timeout=0.5):
+            if self.stopping:
+                return None
+        try:
+            return self.take_snapshot()
+        finally:
+            self.dojo.lock.release()
+
+    def take_snapshot(self):
+        """
+        This function copies the rooms and people changed since the last
+        save, or all of them for a full save. It returns None when there
+        is nothing to save. The lock of the dojo must be held.
+        """
+        if not self.changes and not self.full:
+            return None
+        dojo = self.dojo
+        if self.full:
+            rooms = list(dojo.all_rooms)
+            person_list = list(dojo.staff_list) + list(dojo.fellow_list)
+        else:
+            rooms = [dojo.rooms_index[name] for name in self.dirty_rooms
+                     if name in dojo.rooms_index]
+            person_list = [dojo.people.get(person_id)
+                           for person_id in self.dirty_people]
+        snapshot = ([copy(room) for room in rooms],
+                    [copy(person) for person in person_list if person],
+                    self.deleted_people, self.full)
+        self.full = False
+        self.changes = 0
+        self.dirty_rooms = {}
+        self.dirty_people = {}
+        self.deleted_people = {}
+        return snapshot
+
+    def write(self, snapshot):
+        """
+        This function writes a snapshot into the database. When the write
+        fails the next save writes the whole state again.
+        """
+        rooms, person_list, deleted_ids, full = snapshot
+        start_time = time.time()
+        row_count, log = self.backend.save_incremental(
+            self.name, rooms, person_list, deleted_ids, full)
+        if row_count is None:
+            self.full = True
+            self.last_error = log
+            return
+        self.save_count += 1
+        self.last_save = time.time()
+        self.last_duration = self.last_save - start_time
+        self.last_rows = row_count
+        self.last_error = None
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+from data.database import DB, StorageBackend
+from persons.fellows import Fellow
+from persons.staffs import Staff
+from persons.waitlist import Waitlist
+from rooms.livingspace import LivingSpace
+from rooms.office import Office
+from utils.safe_files import create_exclusive, file_lock
+
+
+class MemoryDB(DB):
+    """
+    This class saves and loads the state of the dojo in SQLite databases
+    kept in memory. A database lasts as long as the process, so a state
+    saved by one dojo can be loaded by another without touching the disk.
+    """
+
+    scheme = "memory"
+    location = "memory:{}"
+    databases = {}
+    claim_lock = threading.Lock()
+    write_lock = threading.Lock()
+
+    def get_uri(self, db_name):
+        return "file:dojo-{}?mode=memory&cache=shared".format(quote(db_name))
+
+    def connect(self, db_name, shared=False):
+        """
+        This function opens a connection to a shared in-memory database.
+        The first connection is kept open to keep the database alive.
+        """
+        self.claim(db_name)
+        return sqlite3.connect(self.get_uri(db_name), uri=True,
+                               timeout=self.busy_timeout,
+                               isolation_level=None,
+                               check_same_thread=not shared)
+
+    def claim(self, db_name):
+        """
+        This function creates an in-memory database unless the name is
+        taken. It returns True when it was created.
+        """
+        with self.claim_lock:
+            if db_name in self.databases:
+                return False
+            self.databases[db_name] = sqlite3.connect(
+                self.get_uri(db_name), uri=True, check_same_thread=False)
+            return True
+
+    def lock(self, db_name):
+        """
+        This function gives the lock held by writers of an in-memory
+        database, only the sessions of this process can reach it
+        """
+        return self.write_lock
+
+    def discard(self, db_name):
+        """ This function drops an in-memory database """
+        self.databases.pop(db_name).close()
+
+    def db_exists(self, db_name):
+        return db_name in self.databases
+
+
+class JsonLinesDB(StorageBackend):
+    """
+    This class saves and loads the state of the dojo in JSON-lines files
+    kept in the data folder, a line for each room followed by a line for
+    each person
+    """
+
+    scheme = "jsonl"
+    location = "{}.jsonl"
+
+    def get_path(self, db_name):
+        return "data/{}.jsonl".format(db_name)
+
+    def db_exists(self, db_name):
+        """ This function check if a JSON-lines file exist """
+        return os.path.isfile(self.get_path(db_name))
+
+    def claim(self, db_name):
+        """
+        This function creates an empty JSON-lines file unless the name is
+        taken. It returns True when it was created.
+        """
+        return create_exclusive(self.get_path(db_name))
+
+    def discard(self, db_name):
+        """ This function deletes a JSON-lines file """
+        os.remove(self.get_path(db_name))
+
+    def lock(self, db_name):
+        """ This function gives the lock held by writers of the file """
+        return file_lock(self.get_path(db_name))
+
+    def save_state(self, db_name, rooms, person_list):
+        """
+        This function writes the rooms and people into a JSON-lines file.
+        The file is written under a temporary name and renamed once
+        complete. It returns the values of DB.save_state.
+        """
+        db_name = self.claim_name(db_name.strip())
+        if not db_name:
+            return None, None, ("Database name already existed!"
+                                " Kindly choose another name.")
+        start_time = time.time()
+        path = self.get_path(db_name)
+        row_count = 0
+        with open(path + ".tmp", "w") as state_file:
+            for room in rooms:
+                state_file.write(json.dumps({
+                    "room": room.name,
+                    "type": DB.room_type_mapping[type(room)],
+                    "capacity": room.total_space}) + "\n")
+                row_count += 1
+            for person in person_list:
+                livingspace = getattr(person, "livingspace", None)
+                state_file.write(json.dumps({
+                    "id": person.id, "name": person.name,
+                    "designation": person.designation,
+                    "wants_accommodation": getattr(
+                        person, "wants_accommodation", 0),
+                    "office": person.office.name if person.office else None,
+                    "livingspace": livingspace.name if livingspace
+                    else None}) + "\n")
+                row_count += 1
+        os.replace(path + ".tmp", path)
+        duration = max(time.time() - start_time, 1e-6)
+        return row_count, db_name, (
+            "{} rows saved in {:.3f}s ({:.0f} rows/sec)\n".format(
+                row_count, duration, row_count / duration) +
+            "The state has been successfully saved in " +
+            self.location.format(db_name))
+
+    def load_state(self, db_name):
+        """
+        This function reads the rooms and people of a JSON-lines file and
+        returns them in the format of DB.load_state
+        """
+        rooms_mapping = {"office": Office, "livingspace": LivingSpace}
+        rooms_by_name = {}
+        app_data = {"all_rooms": [], "staff_list": [], "fellow_list": [],
+                    "allocated": {},
+                    "unallocated": {"office": Waitlist(),
+                                    "livingspace": Waitlist()}}
+        database = DB()
+        with open(self.get_path(db_name)) as state_file:
+            for line in state_file:
+                row = json.loads(line)
+                if "room" in row:
+                    room = rooms_mapping[row["type"]](row["room"],
+                                                      row["capacity"])
+                    rooms_by_name[room.name] = room
+                    app_data["all_rooms"].append(room)
+                    continue
+                if row["designation"] == "fellow":
+                    person = Fellow(row["name"])
+                    app_data["fellow_list"].append(person)
+                else:
+                    person = Staff(row["name"])
+                    app_data["staff_list"].append(person)
+                person.id = row["id"]
+                person.office = database.allocate_loaded_person(
+                    person, "office", rooms_by_name.get(row["office"]),
+                    app_data)
+                if row["designation"] == "fellow":
+                    person.wants_accommodation = row["wants_accommodation"]
+                    if person.wants_accommodation:
+                        person.livingspace = database.allocate_loaded_person(
+                            person, "livingspace",
+                            rooms_by_name.get(row["livingspace"]), app_data)
+        return app_data
+
+
+backends = {"sqlite": DB, "memory": MemoryDB, "jsonl": JsonLinesDB}
+
+
+def get_backend(uri):
+    """
+    This function gets the storage backend and the name of a state from
+    a name such as memory:name or jsonl:name. A plain name, or one
+    starting with sqlite:, is an SQLite file in the data folder.
+    """
+    scheme, separator, db_name = uri.partition(":")
+    if separator and scheme in backends:
+        return backends[scheme](), db_name
+    return DB(), uri
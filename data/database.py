@@ -1,76 +1,79 @@
+from abc import ABCMeta, abstractmethod
 from datetime import datetime
+from itertools import groupby
 import os
 import sqlite3
+import time
+from urllib.parse import quote
 
 from persons.fellows import Fellow
 from persons.staffs import Staff
+from persons.waitlist import Waitlist
 from rooms.livingspace import LivingSpace
 from rooms.office import Office
+from utils.custom_messages import unsupported_backend_error
+from utils.instrumentation import instrumented
+from utils.safe_files import create_exclusive, file_lock
 
 
-class DB(object):
-    room_type_mapping = {Office: "office", LivingSpace: "livingspace"}
+class StorageBackend(metaclass=ABCMeta):
+    """
+    This class is the interface of the storage backends the state of the
+    dojo is saved to and loaded from. A backend names its states, claims
+    a name before saving under it and gives the lock its writers hold.
+    A backend missing one of these methods cannot be created. Backends
+    that cannot save incrementally keep save_incremental, which reports
+    it.
+    """
+
+    scheme = None
+    location = "{}"
+
+    @abstractmethod
+    def db_exists(self, db_name):
+        pass
 
+    @abstractmethod
+    def claim(self, db_name):
+        pass
+
+    @abstractmethod
+    def discard(self, db_name):
+        pass
+
+    @abstractmethod
+    def lock(self, db_name):
+        pass
+
+    @abstractmethod
     def save_state(self, db_name, rooms, person_list):
+        pass
+
+    @abstractmethod
+    def load_state(self, db_name):
+        pass
+
+    def save_incremental(self, db_name, rooms, person_list, deleted_ids,
+                         full=False):
         """
-        This function saves the state of the application by saving data
-        such as room collection, staff list and fellow list currently available
-        in the application
+        This function returns the result of an incremental save of a
+        backend that cannot save incrementally, nothing is written
         """
-        db_name = db_name.strip() or self.generate_name()
-        if self.db_exists(db_name):
-            return ("Database name already existed!"
-                    " Kindly choose another name.")
-        else:
-            sqlite_file = "data/{}.sqlite".format(db_name)
-            conn = sqlite3.connect(sqlite_file)
-            c = conn.cursor()
-            self.run_migrations(c)
-            self.insert_rooms(rooms, c)
-            self.insert_people(person_list, c)
-            conn.commit()
-            conn.close()
-            return "The state has been successfully saved in %s.sqlite" \
-                   % db_name
+        return None, unsupported_backend_error.format(
+            self.location.format(db_name), "incremental saves")
 
-    def insert_rooms(self, rooms, c):
+    def claim_name(self, db_name):
         """
-        This function executes the sql command insert to
-        save each room in the Database
+        This function claims db_name, or a generated name when db_name is
+        empty, so that no other session can save under it. It returns the
+        name claimed or None when db_name is already taken.
         """
-        for room in rooms:
-            try:
-                room_type = self.room_type_mapping[type(room)]
-                c.execute(
-                    "INSERT INTO room_table (name, type, capacity) "
-                    "VALUES ('{}', '{}', '{}')".format(
-                        room.name, room_type, room.total_space))
-            except:
-                print('ERROR: failed to insert room {}'.format(room.name))
-
-    def insert_people(self, person_list, c):
-        """
-        This function executes the sql command insert to
-        save each person in the Database
-        """
-        for person in person_list:
-            office = person.office.name if person.office else ""
-            c.execute(
-                "INSERT INTO person_table (id, name, designation, " +
-                "office) VALUES ('{}', '{}', '{}', '{}')".format(
-                    person.id, person.name, person.designation, office))
-            if person.designation.lower() == "fellow":
-                livingSpace = person.livingspace.name \
-                    if person.livingspace else ""
-                c.execute(
-                    "INSERT INTO livingspace_table (ids,"
-                    "wants_accommodation, livingspace) VALUES"
-                    "('{}', {}, '{}')".format(
-                        person.id, person.wants_accommodation, livingSpace))
-
-    def db_exists(self, db_name):
-        """This function check if a database file exist"""
-        return os.path.isfile("data/{}.sqlite".format(db_name))
+        if db_name:
+            return db_name if self.claim(db_name) else None
+        db_name = self.generate_name()
+        while not self.claim(db_name):
+            db_name = str(int(db_name) + 1)
+        return db_name
 
     def generate_name(self):
         """
@@ -85,95 +88,529 @@ class DB(object):
             db_name = str(int(db_name) + 1)
         return db_name
 
-    def run_migrations(self, c):
-        """This function creates table for room, person and livingspace"""
-        c.execute("CREATE TABLE room_table (name TEXT PRIMARY KEY, \
-                                        type TEXT, capacity INTEGER)")
 
-        c.execute("CREATE TABLE person_table (id TEXT PRIMARY KEY,\
-                            name TEXT, designation TEXT, office TEXT)")
+class DB(StorageBackend):
+    """
+    This class saves and loads the state of the dojo in SQLite database
+    files kept in the data folder. It is the default storage backend.
+    """
 
-        c.execute("CREATE TABLE livingspace_table (ids TEXT PRIMARY KEY,\
-                            wants_accommodation INTEGER, livingspace TEXT)")
+    scheme = "sqlite"
+    location = "{}.sqlite"
+    room_type_mapping = {Office: "office", LivingSpace: "livingspace"}
+    room_column_mapping = {"office": "office_id",
+                           "livingspace": "livingspace_id"}
+    schema_version = 2
+    busy_timeout = 30
+    supports_upsert = sqlite3.sqlite_version_info >= (3, 24, 0)
+    default_capacity = {"office": 6, "livingspace": 4}
 
-    def load_state(self, db_name):
+    @instrumented
+    def save_state(self, db_name, rooms, person_list):
         """
-        This function loads application data from the database
-        and returns it to the application
+        This function saves the state of the application by saving data
+        such as room collection, staff list and fellow list currently available
+        in the application. It returns the number of rows saved, or None
+        on failure, the name saved under and the message to show.
         """
-        sqlite_file = "data/{}.sqlite".format(db_name)
-        conn = sqlite3.connect(sqlite_file)
+        db_name = self.claim_name(db_name.strip())
+        if not db_name:
+            return None, None, ("Database name already existed!"
+                                " Kindly choose another name.")
+        else:
+            start_time = time.time()
+            conn = self.connect(db_name)
+            self.tune_for_bulk_load(conn)
+            c = conn.cursor()
+            try:
+                c.execute("BEGIN")
+                self.run_migrations(c)
+                row_count = self.insert_rooms(rooms, c)
+                row_count += self.insert_people(person_list, c)
+                c.execute("COMMIT")
+            except sqlite3.Error as error:
+                c.execute("ROLLBACK")
+                conn.close()
+                self.discard(db_name)
+                return None, None, "The state could not be saved: {}".format(
+                    error)
+            conn.close()
+            duration = max(time.time() - start_time, 1e-6)
+            return row_count, db_name, (
+                "{} rows saved in {:.3f}s ({:.0f} rows/sec)\n".format(
+                    row_count, duration, row_count / duration) +
+                "The state has been successfully saved in " +
+                self.location.format(db_name))
+
+    @instrumented
+    def save_incremental(self, db_name, rooms, person_list, deleted_ids,
+                         full=False):
+        """
+        This function upserts the rooms and people passed into a long-lived
+        database opened in WAL mode and deletes the people removed since
+        the last save. When full is True the tables are emptied first so
+        the database matches the rooms and people passed exactly.
+        It returns the number of rows written, or None on failure, and
+        the message to show.
+        """
+        with self.lock(db_name):
+            return self.write_incremental(db_name, rooms, person_list,
+                                          deleted_ids, full)
+
+    def write_incremental(self, db_name, rooms, person_list, deleted_ids,
+                          full):
+        """
+        This function writes the rows of an incremental save, the file
+        lock of the database must be held
+        """
+        start_time = time.time()
+        try:
+            conn = self.open_db(db_name)
+        except sqlite3.Error as error:
+            return None, "The state could not be saved: {}".format(error)
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            if full:
+                c.execute("DELETE FROM people")
+                c.execute("DELETE FROM rooms")
+            c.executemany("DELETE FROM people WHERE id = ?",
+                          ((person_id,) for person_id in deleted_ids))
+            row_count = self.insert_rooms(rooms, c, upsert=True)
+            row_count += self.insert_people(person_list, c, upsert=True)
+            c.execute("COMMIT")
+        except sqlite3.Error as error:
+            c.execute("ROLLBACK")
+            conn.close()
+            return None, "The state could not be saved: {}".format(error)
+        conn.close()
+        duration = max(time.time() - start_time, 1e-6)
+        return row_count, (
+            "{} changed rows saved in {:.3f}s ({:.0f} rows/sec)\n".format(
+                row_count, duration, row_count / duration) +
+            "The state has been successfully saved in " +
+            self.location.format(db_name))
+
+    @instrumented
+    def open_db(self, db_name, shared=False):
+        """
+        This function opens a database that is kept between saves in WAL
+        mode with foreign keys enforced. The tables are created, or an
+        older schema upgraded, before the connection is returned.
+        A shared connection can be closed from any thread.
+        """
+        conn = self.connect(db_name, shared)
+        self.tune_for_writes(conn)
         c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            self.run_migrations(c)
+            c.execute("COMMIT")
+        except sqlite3.Error:
+            c.execute("ROLLBACK")
+            conn.close()
+            raise
+        return conn
+
+    def open_for_load(self, db_name, shared=False):
+        """
+        This function opens a database to be loaded. The file is left as
+        it is unless its schema is older and has to be upgraded first, a
+        newer schema, a database without saved state or a file that is
+        not a database raises a sqlite3.DatabaseError before anything is
+        read or written.
+        """
+        conn = self.connect(db_name, shared)
+        try:
+            version = self.get_schema_version(conn.cursor())
+            if version > self.schema_version:
+                raise sqlite3.DatabaseError(
+                    "schema version {} is newer than this application "
+                    "supports".format(version))
+            if not version:
+                raise sqlite3.DatabaseError("the file holds no saved state")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        if version == self.schema_version:
+            return conn
+        try:
+            self.back_up(conn, db_name, version)
+        finally:
+            conn.close()
+        return self.open_db(db_name, shared)
+
+    def back_up(self, conn, db_name, version):
+        """
+        This function copies a database of an older schema next to it
+        before it is upgraded in place, so the original file can be
+        restored by the older version of the application
+        """
+        backup = sqlite3.connect(
+            "data/{}.sqlite.v{}.bak".format(db_name, version))
+        try:
+            conn.backup(backup)
+        finally:
+            backup.close()
+
+    def tune_for_writes(self, conn):
+        """
+        This function sets the pragmas of a database that is written to
+        many times. In WAL mode with synchronous NORMAL a commit appends to
+        the log without waiting for the disk, the log is synced when it is
+        checkpointed.
+        """
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    def tune_for_bulk_load(self, conn):
+        """
+        This function sets the pragmas used when writing a new database
+        in one go. The file is only complete after the single commit so
+        the rollback journal is kept in memory and syncs are skipped.
+        """
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -65536")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    def insert_rooms(self, rooms, c, upsert=False):
+        """
+        This function executes the sql command insert to save all
+        rooms in the Database, it returns the number of rows inserted.
+        Existing rooms are skipped, or updated in place when upsert is
+        True so that their keys do not change. SQLite older than 3.24 has
+        no upsert, the row is replaced with its key instead.
+        """
+        sql = "INSERT OR IGNORE INTO rooms (name, type, capacity) " \
+            "VALUES (?, ?, ?)"
+        rows = ((room.name, self.room_type_mapping[type(room)],
+                 room.total_space) for room in rooms)
+        if upsert and self.supports_upsert:
+            sql = "INSERT INTO rooms (name, type, capacity) " \
+                "VALUES (?, ?, ?) ON CONFLICT (name) DO UPDATE SET " \
+                "type = excluded.type, capacity = excluded.capacity"
+        elif upsert:
+            sql = "INSERT OR REPLACE INTO rooms (id, name, type, capacity) " \
+                "VALUES ((SELECT id FROM rooms WHERE name = ?), ?, ?, ?)"
+            rows = ((row[0],) + row for row in rows)
+        c.executemany(sql, rows)
+        return c.rowcount
+
+    def insert_people(self, person_list, c, upsert=False):
+        """
+        This function executes the sql command insert to save all
+        people in the Database, it returns the number of rows inserted.
+        Rooms are referenced by their keys, looked up by name. When
+        upsert is True existing people are updated in place so that they
+        keep their rowid, which gives the order people are loaded in.
+        Without upsert support the row is replaced with its rowid.
+        """
+        sql = "INSERT INTO people (id, name, designation, " \
+            "wants_accommodation, office_id, livingspace_id) VALUES " \
+            "(?, ?, ?, ?, (SELECT id FROM rooms WHERE name = ?), " \
+            "(SELECT id FROM rooms WHERE name = ?))"
+        rows = ((person.id, person.name, person.designation,
+                 getattr(person, "wants_accommodation", 0),
+                 person.office.name if person.office else None,
+                 person.livingspace.name
+                 if getattr(person, "livingspace", None) else None)
+                for person in person_list)
+        if upsert and self.supports_upsert:
+            sql += " ON CONFLICT (id) DO UPDATE SET name = excluded.name, " \
+                "designation = excluded.designation, " \
+                "wants_accommodation = excluded.wants_accommodation, " \
+                "office_id = excluded.office_id, " \
+                "livingspace_id = excluded.livingspace_id"
+        elif upsert:
+            sql = "INSERT OR REPLACE INTO people (rowid, id, name, " \
+                "designation, wants_accommodation, office_id, " \
+                "livingspace_id) VALUES " \
+                "((SELECT rowid FROM people WHERE id = ?), ?, ?, ?, ?, " \
+                "(SELECT id FROM rooms WHERE name = ?), " \
+                "(SELECT id FROM rooms WHERE name = ?))"
+            rows = ((row[0],) + row for row in rows)
+        c.executemany(sql, rows)
+        return c.rowcount
+
+    def connect(self, db_name, shared=False):
+        """
+        This function opens a connection to a database, transactions are
+        started and ended explicitly. A database locked by another session
+        is waited for up to the busy timeout.
+        """
+        return sqlite3.connect("data/{}.sqlite".format(db_name),
+                               timeout=self.busy_timeout,
+                               isolation_level=None,
+                               check_same_thread=not shared)
+
+    def lock(self, db_name):
+        """
+        This function gives the lock held by writers of a database, so
+        that sessions on the same data folder take turns
+        """
+        return file_lock("data/{}.sqlite".format(db_name))
 
-        c.execute("select name, type from room_table")
-        db_rooms = c.fetchall()
-        rooms = self.get_rooms_from_db_rooms(db_rooms)
+    def claim(self, db_name):
+        """
+        This function creates an empty database file unless the name is
+        taken, in one atomic step. It returns True when it was created.
+        """
+        return create_exclusive("data/{}.sqlite".format(db_name))
 
-        c.execute("select id, name, designation, office," +
-                  " wants_accommodation, livingspace from " +
-                  "person_table INNER JOIN " +
-                  "livingspace_table ON id = " +
-                  "ids WHERE designation = 'fellow'")
-        db_fellow_list = c.fetchall()
-        fellow_list = self.get_fellows_from_db_fellows(db_fellow_list, rooms)
+    def discard(self, db_name):
+        """ This function deletes a database that could not be saved """
+        os.remove("data/{}.sqlite".format(db_name))
 
+    def db_exists(self, db_name):
+        """This function check if a database file exist"""
+        return os.path.isfile("data/{}.sqlite".format(db_name))
+
+    def get_schema_version(self, c):
+        """
+        This function gets the schema version of a database. Databases
+        saved with the original room_table, person_table and
+        livingspace_table are version 1, empty databases are version 0.
+        """
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if not version and c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                "AND name = 'room_table'").fetchone():
+            version = 1
+        return version
+
+    def run_migrations(self, c):
+        """
+        This function creates the tables of the current schema version or
+        upgrades the tables of an older version, it must be run inside a
+        transaction
+        """
+        version = self.get_schema_version(c)
+        if version > self.schema_version:
+            raise sqlite3.DatabaseError(
+                "schema version {} is newer than this application supports"
+                .format(version))
+        if version == 0:
+            self.create_schema(c)
+        elif version == 1:
+            self.migrate_from_version_1(c)
+        c.execute("PRAGMA user_version = {}".format(self.schema_version))
+
+    def create_schema(self, c):
+        """
+        This function creates the rooms and people tables. Rooms have
+        integer keys that people reference for their office and
+        livingspace, both of which are indexed.
+        """
+        c.execute("CREATE TABLE rooms ("
+                  "id INTEGER PRIMARY KEY, "
+                  "name TEXT NOT NULL UNIQUE COLLATE NOCASE, "
+                  "type TEXT NOT NULL "
+                  "CHECK (type IN ('office', 'livingspace')), "
+                  "capacity INTEGER NOT NULL CHECK (capacity > 0))")
+        c.execute("CREATE TABLE people ("
+                  "id TEXT PRIMARY KEY, "
+                  "name TEXT NOT NULL, "
+                  "designation TEXT NOT NULL "
+                  "CHECK (designation IN ('staff', 'fellow')), "
+                  "wants_accommodation INTEGER NOT NULL DEFAULT 0, "
+                  "office_id INTEGER REFERENCES rooms (id), "
+                  "livingspace_id INTEGER REFERENCES rooms (id))")
+        c.execute("CREATE INDEX people_office ON people (office_id)")
         c.execute(
-            "select id, name, designation, office" +
-            " from person_table WHERE designation = 'staff'")
-        db_staff_list = c.fetchall()
-        staff_list = self.get_staff_from_db_staff(db_staff_list, rooms)
-        app_data = {"all_rooms": rooms, "staff_list": staff_list,
-                    "fellow_list": fellow_list}
-        conn.commit()
+            "CREATE INDEX people_livingspace ON people (livingspace_id)")
+        c.execute(
+            "CREATE INDEX people_designation ON people (designation)")
+
+    def migrate_from_version_1(self, c):
+        """
+        This function moves the data of the original three tables into
+        the current schema, joining people to room keys by room name,
+        then drops the original tables
+        """
+        self.create_schema(c)
+        c.execute("INSERT OR IGNORE INTO rooms (name, type, capacity) "
+                  "SELECT name, lower(type), COALESCE("
+                  "CAST(NULLIF(capacity, '') AS INTEGER), "
+                  "CASE lower(type) WHEN 'office' THEN {} ELSE {} END) "
+                  "FROM room_table ORDER BY rowid".format(
+                      self.default_capacity["office"],
+                      self.default_capacity["livingspace"]))
+        c.execute("INSERT INTO people (id, name, designation, "
+                  "wants_accommodation, office_id, livingspace_id) "
+                  "SELECT person_table.id, person_table.name, "
+                  "lower(person_table.designation), "
+                  "COALESCE(livingspace_table.wants_accommodation, 0), "
+                  "office.id, livingspace.id FROM person_table "
+                  "LEFT JOIN livingspace_table "
+                  "ON livingspace_table.ids = person_table.id "
+                  "LEFT JOIN rooms AS office "
+                  "ON office.name = person_table.office "
+                  "LEFT JOIN rooms AS livingspace "
+                  "ON livingspace.name = livingspace_table.livingspace "
+                  "ORDER BY person_table.rowid")
+        for table in ["livingspace_table", "person_table", "room_table"]:
+            c.execute("DROP TABLE {}".format(table))
+
+    @instrumented
+    def load_state(self, db_name):
+        """
+        This function loads application data from the database
+        and returns it to the application. Rooms are read first into a
+        dictionary by key so each person row can be joined to its rooms,
+        the allocations are built in the same pass over the person rows.
+        """
+        conn = self.open_for_load(db_name)
+        c = conn.cursor()
+        rooms_by_id = {}
+        rooms = self.get_rooms_from_db_rooms(
+            c.execute("SELECT id, name, type, capacity FROM rooms "
+                      "ORDER BY id"), rooms_by_id)
+        app_data = {"all_rooms": rooms, "staff_list": [], "fellow_list": [],
+                    "allocated": {},
+                    "unallocated": {"office": Waitlist(),
+                                    "livingspace": Waitlist()}}
+        c.execute("SELECT id, name, designation, wants_accommodation, "
+                  "office_id, livingspace_id FROM people ORDER BY rowid")
+        self.get_people_from_db_people(c, rooms_by_id, app_data)
         conn.close()
         return app_data
 
-    def get_rooms_from_db_rooms(self, db_rooms):
+    def get_rooms_from_db_rooms(self, db_rooms, rooms_by_id):
         """
         This function extracts the collection of rooms from the
-        rows of room returned from the database
+        rows of room returned from the database and fills the
+        rooms_by_id dictionary with the rooms by their keys
         """
         rooms = []
         rooms_mapping = {"office": Office, "livingspace": LivingSpace}
         for row in db_rooms:
-            new_room = rooms_mapping[row[1].lower()](row[0])
+            new_room = rooms_mapping[row[2].lower()](row[1], row[3])
+            rooms_by_id[row[0]] = new_room
             rooms.append(new_room)
         return rooms
 
-    def get_fellows_from_db_fellows(self, db_fellow_list, rooms):
+    def allocate_loaded_person(self, person, room_type, room, app_data):
         """
-        This function extracts the collection of rooms from the
-        rows of room returned from the database
-        """
-        fellow_list = []
-        for row in db_fellow_list:
-            new_fellow = Fellow(row[1])
-            new_fellow.id = row[0]
-            new_fellow.office = [
-                room for room in rooms
-                if room.name.title() == row[3].title()][0] if row[3] and \
-                row[3].title() in [room.name.title() for room in rooms] \
-                else None
-            new_fellow.wants_accommodation = row[4]
-            new_fellow.livingspace = [
-                room for room in rooms
-                if room.name.title() == row[5].title()][0] if row[5] else None
-            fellow_list.append(new_fellow)
-        return fellow_list
-
-    def get_staff_from_db_staff(self, db_staff_list, rooms):
+        This function adds a loaded person to the allocation of the room
+        the person was saved in, or to the waitlist of the room type when
+        there is no room. It returns the room or None.
         """
-        This function extracts the collection of rooms from the
-        rows of room returned from the database
-        """
-        staff_list = []
-        for row in db_staff_list:
-            new_staff = Staff(row[1])
-            new_staff.id = row[0]
-            new_staff.office = [
-                room for room in rooms
-                if room.name.title() == row[3].title()][0] if row[3] and \
-                row[3].title() in [room.name.title() for room in rooms] \
-                else None
-            staff_list.append(new_staff)
-        return staff_list
+        if room:
+            app_data["allocated"].setdefault(
+                room.name.title(), []).append(person)
+        else:
+            app_data["unallocated"][room_type].append(person.id.upper())
+        return room
+
+    def get_people_from_db_people(self, db_people, rooms_by_id, app_data):
+        """
+        This function extracts the staff and fellows from the rows of
+        people returned from the database into the app_data lists
+        """
+        for row in db_people:
+            if row[2] == "fellow":
+                new_person = Fellow(row[1])
+                app_data["fellow_list"].append(new_person)
+            else:
+                new_person = Staff(row[1])
+                app_data["staff_list"].append(new_person)
+            new_person.id = row[0]
+            new_person.office = self.allocate_loaded_person(
+                new_person, "office", rooms_by_id.get(row[4]), app_data)
+            if row[2] == "fellow":
+                new_person.wants_accommodation = row[3]
+                if row[3]:
+                    new_person.livingspace = self.allocate_loaded_person(
+                        new_person, "livingspace", rooms_by_id.get(row[5]),
+                        app_data)
+
+    def open_read_only(self, db_name):
+        """
+        This function opens a saved database for reports without loading
+        it. The file is opened read-only so it is never changed. A file
+        saved in an older format is copied into memory and the copy is
+        upgraded, so the reports read the current tables either way. A
+        newer or unknown file, or one that is not a database, raises a
+        sqlite3.DatabaseError.
+        """
+        conn = sqlite3.connect(
+            "file:{}?mode=ro".format(quote("data/{}.sqlite".format(db_name))),
+            uri=True, timeout=self.busy_timeout)
+        try:
+            version = self.get_schema_version(conn.cursor())
+            if version > self.schema_version:
+                raise sqlite3.DatabaseError(
+                    "schema version {} is newer than this application "
+                    "supports".format(version))
+            if not version:
+                raise sqlite3.DatabaseError("the file holds no saved state")
+            if version == self.schema_version:
+                return conn
+            copy = sqlite3.connect(":memory:", isolation_level=None)
+            conn.backup(copy)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        conn.close()
+        c = copy.cursor()
+        c.execute("BEGIN")
+        self.run_migrations(c)
+        c.execute("COMMIT")
+        return copy
+
+    def query_room(self, conn, room_name):
+        """
+        This function gets the key, name and type of a room of a saved
+        database or None when there is no such room
+        """
+        return conn.execute("SELECT id, name, type FROM rooms WHERE name = ?",
+                            (room_name,)).fetchone()
+
+    def query_occupants(self, conn, room_id, room_type):
+        """
+        This function yields the names of the people allocated to a room
+        of a saved database through the index of the room type column
+        """
+        rows = conn.execute(
+            "SELECT name FROM people WHERE {} = ? ORDER BY rowid".format(
+                self.room_column_mapping[room_type]), (room_id,))
+        for row in rows:
+            yield row[0]
+
+    def query_allocations(self, conn):
+        """
+        This function yields the name of each room of a saved database
+        that has occupants with the list of their names. The occupants of
+        every room are read in one query ordered by room, each join going
+        through the index of its room column.
+        """
+        rows = conn.execute(
+            "SELECT rooms.id, rooms.name, people.rowid, people.name "
+            "FROM rooms JOIN people ON people.office_id = rooms.id "
+            "WHERE rooms.type = 'office' UNION ALL "
+            "SELECT rooms.id, rooms.name, people.rowid, people.name "
+            "FROM rooms JOIN people ON people.livingspace_id = rooms.id "
+            "WHERE rooms.type = 'livingspace' ORDER BY 1, 3")
+        for (room_id, room_name), room_rows in groupby(
+                rows, key=lambda row: row[:2]):
+            yield room_name, [row[3] for row in room_rows]
+
+    def query_unallocated(self, conn):
+        """
+        This function yields the name and missing room type of the people
+        on the waitlists of a saved database, offices first
+        """
+        rows = conn.execute(
+            "SELECT name, 'office' FROM people WHERE office_id IS NULL "
+            "ORDER BY rowid")
+        for row in rows:
+            yield row
+        rows = conn.execute(
+            "SELECT name, 'livingspace' FROM people WHERE "
+            "designation = 'fellow' AND wants_accommodation = 1 AND "
+            "livingspace_id IS NULL ORDER BY rowid")
+        for row in rows:
+            yield row
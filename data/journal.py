@@ -0,0 +1,56 @@
+import json
+import os
+
+from utils.safe_files import try_lock
+
+
+class Journal(object):
+    """
+    This class is an append-only log of the changes made to the dojo.
+    Each record is written as a line of JSON and flushed at once so the
+    changes survive a crash of the application. The journal is locked
+    while open so that only one session writes to it.
+    """
+
+    def __init__(self, name):
+        self.path = "data/{}.journal".format(name)
+        self.file = open(self.path, "a")
+        try:
+            try_lock(self.file)
+        except OSError:
+            self.file.close()
+            raise
+        self.record_count = 0
+
+    def append(self, record):
+        """ This function writes a record at the end of the journal """
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.record_count += 1
+
+    def truncate(self):
+        """ This function empties the journal after a snapshot """
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.record_count = 0
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def read(name):
+        """
+        This function yields the records of a journal in the order they
+        were written. A last line cut short by a crash is skipped.
+        """
+        path = "data/{}.journal".format(name)
+        if not os.path.isfile(path):
+            return
+        with open(path, "r") as journal_file:
+            for line in journal_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
@@ -0,0 +1,300 @@
+from collections import OrderedDict
+import threading
+
+from data.database import DB
+from persons.fellows import Fellow
+from persons.staffs import Staff
+from persons.waitlist import Waitlist
+
+
+class LazyStore(object):
+    """
+    This class gives the dojo access to the people of a saved database
+    without loading them all. People are fetched by id when needed, kept
+    in a bounded LRU cache and written back to the database as soon as
+    they change. It behaves like the id to person dictionary of the dojo.
+    """
+
+    person_query = (
+        "SELECT id, name, designation, office_id, wants_accommodation, "
+        "livingspace_id FROM people")
+
+    def __init__(self, db_name, cache_size=10000, backend=None):
+        self.db_name = db_name
+        self.backend = backend or DB()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.rooms_index = {}
+        self.rooms_by_id = {}
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+
+    @property
+    def conn(self):
+        """
+        This function gives the connection of the current thread, SQLite
+        connections cannot be shared between threads so each thread
+        reading the store, such as the autosave, opens its own. They are
+        shared connections so that close can close them all.
+        """
+        conn = getattr(self.local, "conn", None)
+        if not conn:
+            conn = self.local.conn = self.backend.open_for_load(
+                self.db_name, shared=True)
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    def close(self):
+        self.cache.clear()
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+    def load_rooms(self):
+        """
+        This function loads every room of the database and keeps an index
+        of them by key to attach rooms to the people fetched later
+        """
+        rooms = DB().get_rooms_from_db_rooms(
+            self.conn.execute("SELECT id, name, type, capacity FROM rooms "
+                              "ORDER BY id"), self.rooms_by_id)
+        self.rooms_index = {room.name.title(): room for room in rooms}
+        return rooms
+
+    def load_occupancy(self):
+        """
+        This function counts the people allocated to each room with
+        indexed group by queries instead of loading the people
+        """
+        occupancy = {}
+        rows = self.conn.execute(
+            "SELECT office_id, COUNT(*) FROM people WHERE office_id "
+            "IS NOT NULL GROUP BY office_id UNION ALL SELECT "
+            "livingspace_id, COUNT(*) FROM people WHERE livingspace_id "
+            "IS NOT NULL GROUP BY livingspace_id")
+        for room_id, count in rows:
+            if room_id in self.rooms_by_id:
+                occupancy[self.rooms_by_id[room_id].name.title()] = count
+        return occupancy
+
+    def load_waitlists(self):
+        """ This function loads the ids of the people on the waitlists """
+        return {
+            "office": Waitlist(row[0] for row in self.conn.execute(
+                "SELECT id FROM people WHERE office_id IS NULL "
+                "ORDER BY rowid")),
+            "livingspace": Waitlist(row[0] for row in self.conn.execute(
+                "SELECT id FROM people WHERE designation = 'fellow' "
+                "AND wants_accommodation = 1 AND livingspace_id IS NULL "
+                "ORDER BY rowid"))}
+
+    def make_person(self, row):
+        """ This function creates a person from a row of the database """
+        person = Fellow(row[1]) if row[2] == "fellow" else Staff(row[1])
+        person.id = row[0]
+        person.office = self.rooms_by_id.get(row[3])
+        if row[2] == "fellow":
+            person.wants_accommodation = row[4]
+            person.livingspace = self.rooms_by_id.get(row[5])
+        return person
+
+    def cache_person(self, person):
+        """
+        This function keeps a person in the cache, evicting the least
+        recently used people beyond the cache size
+        """
+        self.cache[person.id] = person
+        self.cache.move_to_end(person.id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def get(self, person_id, default=None):
+        """ This function gets a person from the cache or the database """
+        person = self.cache.get(person_id)
+        if person:
+            self.cache.move_to_end(person_id)
+            return person
+        row = self.conn.execute(self.person_query + " WHERE id = ?",
+                                (person_id,)).fetchone()
+        if not row:
+            return default
+        person = self.make_person(row)
+        self.cache_person(person)
+        return person
+
+    def __contains__(self, person_id):
+        return person_id in self.cache or self.conn.execute(
+            "SELECT 1 FROM people WHERE id = ?",
+            (person_id,)).fetchone() is not None
+
+    def __getitem__(self, person_id):
+        person = self.get(person_id)
+        if person is None:
+            raise KeyError(person_id)
+        return person
+
+    def __setitem__(self, person_id, person):
+        self.save_person(person)
+
+    def __delitem__(self, person_id):
+        self.cache.pop(person_id, None)
+        self.writer.execute("DELETE FROM people WHERE id = ?", (person_id,))
+
+    def __len__(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM people").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute(
+            "SELECT id FROM people ORDER BY rowid"))
+
+    @property
+    def writer(self):
+        """
+        This function gives the connection of the current thread set up
+        for writing. The database is switched to WAL mode on the first
+        write, so a load that changes nothing leaves the file as it is and
+        each change after it is committed without a sync.
+        """
+        conn = self.conn
+        if not getattr(self.local, "tuned", False):
+            self.backend.tune_for_writes(conn)
+            self.local.tuned = True
+        return conn
+
+    def save_person(self, person):
+        """ This function writes a new or changed person to the database """
+        self.cache_person(person)
+        c = self.writer.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        DB().insert_people([person], c, upsert=True)
+        c.execute("COMMIT")
+
+    def save_room(self, room):
+        """
+        This function writes a new room to the database and indexes it
+        by its key so people can be allocated to it
+        """
+        c = self.writer.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        DB().insert_rooms([room], c, upsert=True)
+        c.execute("COMMIT")
+        room_id = self.conn.execute("SELECT id FROM rooms WHERE name = ?",
+                                    (room.name,)).fetchone()[0]
+        self.rooms_by_id[room_id] = room
+        self.rooms_index[room.name.title()] = room
+
+    def count_people(self, designation):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM people WHERE designation = ?",
+            (designation,)).fetchone()[0]
+
+    def iter_people(self, designation):
+        """
+        This function yields the people of a designation in the order they
+        were saved, without filling the cache with all of them
+        """
+        rows = self.conn.cursor().execute(
+            self.person_query + " WHERE designation = ? ORDER BY rowid",
+            (designation,))
+        for row in rows:
+            yield self.cache.get(row[0]) or self.make_person(row)
+
+    def iter_occupants(self, room):
+        """ This function yields the people allocated to a room """
+        rows = self.conn.execute(
+            "SELECT id FROM people WHERE office_id = (SELECT id FROM rooms "
+            "WHERE name = ?) UNION ALL SELECT id FROM people WHERE "
+            "livingspace_id = (SELECT id FROM rooms WHERE name = ?)",
+            (room.name, room.name)).fetchall()
+        for row in rows:
+            person = self.get(row[0])
+            if person:
+                yield person
+
+
+class LazyPersonList(object):
+    """
+    This class stands in for the staff or fellow list of the dojo when
+    the people are kept in a LazyStore
+    """
+
+    def __init__(self, store, designation):
+        self.store = store
+        self.designation = designation
+
+    def __iter__(self):
+        return self.store.iter_people(self.designation)
+
+    def __len__(self):
+        return self.store.count_people(self.designation)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def append(self, person):
+        """ People are added to the store through the id dictionary """
+
+    def remove(self, person):
+        """ People are removed from the store through the id dictionary """
+
+
+class LazyOccupants(object):
+    """
+    This class stands in for the list of people allocated to a room. Its
+    length comes from the occupancy counter, its people from the store.
+    """
+
+    def __init__(self, store, room, occupancy):
+        self.store = store
+        self.room = room
+        self.occupancy = occupancy
+
+    def __len__(self):
+        return self.occupancy.get(self.room.name.title(), 0)
+
+    def __iter__(self):
+        return self.store.iter_occupants(self.room)
+
+    def append(self, person):
+        key = self.room.name.title()
+        self.occupancy[key] = self.occupancy.get(key, 0) + 1
+
+    def remove(self, person):
+        self.occupancy[self.room.name.title()] -= 1
+
+
+class LazyAllocations(object):
+    """
+    This class stands in for the allocated dictionary of the dojo, it
+    maps the names of rooms with occupants to LazyOccupants
+    """
+
+    def __init__(self, store, occupancy):
+        self.store = store
+        self.occupancy = occupancy
+
+    def __contains__(self, room_name):
+        return self.occupancy.get(room_name, 0) > 0
+
+    def __iter__(self):
+        return iter([room_name for room_name, count in
+                     self.occupancy.items() if count > 0])
+
+    def __getitem__(self, room_name):
+        return LazyOccupants(self.store, self.store.rooms_index[room_name],
+                             self.occupancy)
+
+    def __setitem__(self, room_name, occupants):
+        self.occupancy.setdefault(room_name, len(occupants))
+
+    def get(self, room_name, default=None):
+        return self[room_name] if room_name in self.store.rooms_index \
+            else default
+
+    def items(self):
+        return [(room_name, self[room_name]) for room_name in self]
@@ -0,0 +1,211 @@
+from array import array
+import mmap
+import os
+import struct
+import zlib
+
+from persons.fellows import Fellow
+from persons.staffs import Staff
+from persons.waitlist import Waitlist
+from rooms.livingspace import LivingSpace
+from rooms.office import Office
+
+# The file starts with a fixed header followed by the columns below, each
+# padded to 8 bytes:
+#   room types (1 byte), room capacities (uint32),
+#   room names (utf-8, NUL separated),
+#   person ids (7 ascii bytes), designations (1 byte), wants (1 byte),
+#   office and livingspace room index (int32, -1 for none),
+#   person names (utf-8, NUL separated)
+MAGIC = b"DOJOSNAP"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIIQ")
+ID_LENGTH = 7
+ROOM_TYPES = [Office, LivingSpace]
+DESIGNATIONS = ["staff", "fellow"]
+
+
+def pad(data):
+    """ This function pads a column to a multiple of 8 bytes """
+    return data + b"\0" * (-len(data) % 8)
+
+
+def encode_names(names):
+    """ This function encodes names as a NUL separated utf-8 blob """
+    return "\0".join(names).encode()
+
+
+def encode_ids(person_ids):
+    """
+    This function encodes the ids of the people as one ascii column of
+    ID_LENGTH bytes per id, the width the reader splits them at
+    """
+    encoded = []
+    for person_id in person_ids:
+        if len(person_id) != ID_LENGTH or not all(
+                ord(character) < 128 for character in person_id):
+            raise ValueError(
+                "The id {} cannot be saved in a snapshot, ids must be {} "
+                "ascii characters".format(person_id, ID_LENGTH))
+        encoded.append(person_id.encode("ascii"))
+    return b"".join(encoded)
+
+
+def save_snapshot(path, rooms, person_list):
+    """
+    This function writes the rooms and people into a binary columnar
+    snapshot file. The file is written under a temporary name and renamed
+    once complete so a reader never sees half a snapshot. A ValueError is
+    raised before anything is written when an id is not ID_LENGTH ascii
+    characters.
+    """
+    ids = encode_ids(person.id for person in person_list)
+    room_indexes = {room: index for index, room in enumerate(rooms)}
+    room_names = encode_names(room.name for room in rooms)
+    person_names = encode_names(person.name for person in person_list)
+
+    def room_index(room):
+        return room_indexes[room] if room else -1
+
+    columns = [
+        bytes(ROOM_TYPES.index(type(room)) for room in rooms),
+        array("I", (room.total_space for room in rooms)).tobytes(),
+        room_names,
+        ids,
+        bytes(DESIGNATIONS.index(person.designation)
+              for person in person_list),
+        bytes(getattr(person, "wants_accommodation", 0)
+              for person in person_list),
+        array("i", (room_index(person.office)
+                    for person in person_list)).tobytes(),
+        array("i", (room_index(getattr(person, "livingspace", None))
+                    for person in person_list)).tobytes(),
+        person_names,
+    ]
+    body = b"".join(pad(column) for column in columns)
+    lengths = struct.pack("<{}Q".format(len(columns)),
+                          *(len(column) for column in columns))
+    body = lengths + body
+    header = HEADER.pack(MAGIC, VERSION, len(rooms), len(person_list),
+                         zlib.crc32(body), len(body))
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(header)
+        snapshot_file.write(body)
+    os.replace(temp_path, path)
+    return len(rooms) + len(person_list)
+
+
+class Snapshot(object):
+    """
+    This class is a read-only view of a binary snapshot file. The file is
+    memory-mapped and its columns are read in place by to_app_data, which
+    creates the rooms and people. The ids column must hold ID_LENGTH
+    bytes per person.
+    """
+
+    column_count = 9
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("{} is corrupted".format(path))
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError("{} is corrupted".format(path))
+        magic, version, self.room_count, self.person_count, checksum, \
+            body_length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a dojo snapshot".format(path))
+        self.body = memoryview(self.map)[
+            HEADER.size:HEADER.size + body_length]
+        body = self.body
+        if len(body) != body_length or zlib.crc32(body) != checksum:
+            self.close()
+            raise ValueError("{} is corrupted".format(path))
+        lengths = struct.unpack_from(
+            "<{}Q".format(self.column_count), body, 0)
+        self.columns = []
+        position = 8 * self.column_count
+        for length in lengths:
+            self.columns.append(body[position:position + length])
+            position += length + (-length % 8)
+        self.room_types, capacities, self.room_names, self.ids, \
+            self.designations, self.wants, offices, livingspaces, \
+            self.person_names = self.columns
+        self.capacities = capacities.cast("I")
+        self.offices = offices.cast("i")
+        self.livingspaces = livingspaces.cast("i")
+        if len(self.ids) != self.person_count * ID_LENGTH:
+            self.close()
+            raise ValueError("{} is corrupted".format(path))
+
+    def close(self):
+        """ This function releases the memory map and the file """
+        for column in getattr(self, "columns", []):
+            column.release()
+        for view in ["capacities", "offices", "livingspaces"]:
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self.columns = []
+        if hasattr(self, "body"):
+            self.body.release()
+        self.map.close()
+        self.file.close()
+
+    def to_app_data(self):
+        """
+        This function creates every room and person of the snapshot in
+        bulk and returns them in the format of DB.load_state. The occupants
+        of each room are kept in a list by room index, so a person is
+        allocated without looking the room up by name.
+        """
+        room_names = bytes(self.room_names).decode().split("\0")
+        rooms = [ROOM_TYPES[room_type](name, capacity) for
+                 room_type, name, capacity in
+                 zip(self.room_types, room_names, self.capacities)]
+        room_keys = [room.name.title() for room in rooms]
+        occupants = [None] * len(rooms)
+        app_data = {"all_rooms": rooms, "staff_list": [], "fellow_list": [],
+                    "allocated": {}}
+        allocated = app_data["allocated"]
+        unallocated = {"office": [], "livingspace": []}
+        names = bytes(self.person_names).decode().split("\0")
+        ids = bytes(self.ids).decode("ascii")
+        people = zip(names, self.designations, self.wants,
+                     self.offices.tolist(), self.livingspaces.tolist())
+        for index, (name, is_fellow, wants, office, livingspace) in \
+                enumerate(people):
+            person = Fellow(name) if is_fellow else Staff(name)
+            person.id = ids[index * ID_LENGTH:(index + 1) * ID_LENGTH]
+            if office >= 0:
+                person.office = rooms[office]
+                room_occupants = occupants[office]
+                if room_occupants is None:
+                    room_occupants = occupants[office] = \
+                        allocated[room_keys[office]] = []
+                room_occupants.append(person)
+            else:
+                unallocated["office"].append(person.id)
+            if is_fellow:
+                person.wants_accommodation = wants
+                if livingspace >= 0:
+                    person.livingspace = rooms[livingspace]
+                    room_occupants = occupants[livingspace]
+                    if room_occupants is None:
+                        room_occupants = occupants[livingspace] = \
+                            allocated[room_keys[livingspace]] = []
+                    room_occupants.append(person)
+                elif wants:
+                    unallocated["livingspace"].append(person.id)
+                app_data["fellow_list"].append(person)
+            else:
+                app_data["staff_list"].append(person)
+        app_data["unallocated"] = {
+            room_type: Waitlist(ids) for room_type, ids in unallocated.items()}
+        return app_data
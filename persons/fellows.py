@@ -1,5 +1,3 @@
-from termcolor import cprint
-
 from persons.persons import Person
 
 
@@ -11,13 +9,14 @@ class Fellow(Person):
         self.wants_accommodation = 0
         self.livingspace = None
 
-    def print_creation_info(self):
+    def creation_messages(self):
         first_name = self.name.split()[0].title()
-        super().print_creation_info()
+        messages = super().creation_messages()
         if self.livingspace:
-            cprint("{} has been allocated ".format(first_name) +
-                   "the livingspace {}".format(
-                   self.livingspace.name.title()), "green")
+            messages.append(("info", "{} has been allocated ".format(
+                first_name) + "the livingspace {}".format(
+                self.livingspace.name.title())))
         elif self.wants_accommodation:
-            cprint("{} has been placed".format(first_name) +
-                   " on a waiting list for livingspace", "yellow")
+            messages.append(("warning", "{} has been placed".format(
+                first_name) + " on a waiting list for livingspace"))
+        return messages
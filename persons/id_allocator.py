@@ -0,0 +1,97 @@
+import random
+import string
+
+
+class IdAllocator(object):
+    """
+    This class issues unique ids in the F-XXXXX and S-XXXXX formats.
+    It keeps a set of the ids issued for each designation so that new ids
+    are checked for collision in constant-time. Ids issued before, such
+    as those of people kept in a database, can be checked through the
+    is_taken function passed and counted towards the id space through
+    the stored counts of each designation. The ids of people removed are
+    retired and not issued again, so that reports and journals never mix
+    up two people.
+    """
+
+    id_characters = string.ascii_uppercase + string.digits
+    id_length = 5
+    id_space = len(id_characters) ** id_length
+    warning_ratio = 0.9
+
+    def __init__(self, is_taken=None, stored=None):
+        self.issued = {"F": set(), "S": set()}
+        self.stored = {"F": 0, "S": 0}
+        for designation, count in (stored or {}).items():
+            self.stored[self.get_prefix(designation)] = count
+        self.warned = set()
+        self.is_taken = is_taken
+
+    def get_prefix(self, designation):
+        """ This function gets the id prefix of a designation """
+        return designation[0].upper()
+
+    def register(self, person_id):
+        """ This function records an id that was issued elsewhere """
+        person_id = person_id.upper()
+        self.issued[person_id[0]].add(person_id)
+
+    def retire(self, person_id):
+        """
+        This function keeps the id of a person removed from being issued
+        again, a stored id is moved from the stored count to the issued
+        """
+        person_id = person_id.upper()
+        prefix = person_id[0]
+        if person_id not in self.issued[prefix]:
+            self.issued[prefix].add(person_id)
+            self.stored[prefix] = max(self.stored[prefix] - 1, 0)
+
+    def count_used(self, prefix):
+        """ This function counts the ids of a prefix already in use """
+        return len(self.issued[prefix]) + self.stored[prefix]
+
+    def generate(self, designation):
+        """
+        This function generates a new unique id for the designation or
+        returns None if every id of the designation has been issued
+        """
+        prefix = self.get_prefix(designation)
+        issued = self.issued[prefix]
+        if self.count_used(prefix) >= self.id_space:
+            return None
+        while True:
+            new_id = "{}-{}".format(prefix, "".join(
+                random.choice(self.id_characters)
+                for _ in range(self.id_length)))
+            if new_id not in issued and not (
+                    self.is_taken and self.is_taken(new_id)):
+                issued.add(new_id)
+                return new_id
+
+    def reserve(self, designation, count):
+        """
+        This function reserves a block of new ids for the designation,
+        it returns fewer ids than requested when the id space runs out
+        """
+        new_ids = []
+        for _ in range(count):
+            new_id = self.generate(designation)
+            if not new_id:
+                break
+            new_ids.append(new_id)
+        return new_ids
+
+    def nearly_exhausted(self, designation):
+        """
+        This function checks if the ids issued for the designation have
+        reached the warning ratio of the id space. It is true only the
+        first time the ratio is reached so that the warning is given once.
+        """
+        prefix = self.get_prefix(designation)
+        if prefix in self.warned:
+            return False
+        if self.count_used(prefix) >= self.id_space * self.warning_ratio:
+            self.warned.add(prefix)
+            return True
+        return False
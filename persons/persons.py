@@ -1,9 +1,3 @@
-import random
-import string
-
-from termcolor import cprint
-
-
 class Person(object):
 
     """This is the base class for staff and fellow"""
@@ -18,23 +12,35 @@ class Person(object):
         """This function extracts a list of existing id from person list"""
         return [person.id for person in person_list]
 
-    def generate_id(self, person_list):
-        """This function generates id for either staff or fellow."""
-        current_id = '{}-'.format(self.designation[0].upper()) + ''.join(
-                     random.choice(string.ascii_uppercase + string.digits)
-                     for _ in range(5))
-        if current_id in self.get_existing_id(person_list):
-             generate_id(self, person_list, current_id)
-        self.id = current_id
-
-    def print_creation_info(self):
+    def generate_id(self, id_allocator):
+        """
+        This function gives the person a new id for either staff or fellow
+        from the id allocator of the dojo, the id is None when every id of
+        the designation has been issued
+        """
+        self.id = id_allocator.generate(self.designation)
+        return self.id
+
+    def creation_messages(self):
+        """
+        This function returns the (level, message) pairs telling where the
+        person has been placed, level is info or warning
+        """
         first_name = self.name.split()[0].title()
-        cprint("{} {} has been successfully added with id {}.".format(
-            self.designation.title(), self.name.title(), self.id.upper()),
-            "green")
+        messages = [("info", "{} {} has been successfully added with id {}."
+                     .format(self.designation.title(), self.name.title(),
+                             self.id.upper()))]
         if self.office:
-            cprint("{} has been allocated the office {}".format(
-                first_name, self.office.name.title()), "green")
+            messages.append(("info", "{} has been allocated the office {}"
+                             .format(first_name, self.office.name.title())))
         else:
-            cprint("{} has been placed".format(first_name) +
-                   " on a waiting list for office", "yellow")
+            messages.append(("warning", "{} has been placed".format(
+                first_name) + " on a waiting list for office"))
+        return messages
+
+    def print_creation_info(self):
+        from termcolor import cprint
+
+        level_colors = {"info": "green", "warning": "yellow"}
+        for level, message in self.creation_messages():
+            cprint(message, level_colors[level])
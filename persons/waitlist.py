@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+
+class Waitlist(object):
+    """
+    This class holds the ids of persons waiting for a room in the order
+    they were added. Membership checks, removal and popping the earliest
+    id are all constant-time.
+    """
+
+    def __init__(self, ids=None):
+        self.ids = OrderedDict.fromkeys(ids or [])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, person_id):
+        return person_id in self.ids
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "Waitlist({})".format(list(self))
+
+    def append(self, person_id):
+        """ This function adds an id to the end of the waitlist """
+        self.ids[person_id] = None
+
+    def remove(self, person_id):
+        """ This function removes an id, raising ValueError if missing """
+        try:
+            del self.ids[person_id]
+        except KeyError:
+            raise ValueError("{} is not on the waitlist".format(person_id))
+
+    def discard(self, person_id):
+        """ This function removes an id if it is on the waitlist """
+        self.ids.pop(person_id, None)
+
+    def pop(self):
+        """ This function removes and returns the earliest id added """
+        if not self.ids:
+            raise IndexError("pop from an empty waitlist")
+        return self.ids.popitem(last=False)[0]
@@ -0,0 +1,57 @@
+from termcolor import cprint
+
+from rooms.dojo import Dojo
+from utils import instrumentation
+from utils.custom_messages import file_exist_error, file_operation_menu
+
+
+class TerminalSink(object):
+    """ This class is a report sink printing the text it is given in colour """
+
+    def __init__(self, color):
+        self.color = color
+
+    def write(self, text):
+        with instrumentation.measure("render"):
+            cprint(text, self.color, end="")
+
+
+class ConsoleDojo(Dojo):
+    """
+    This class is the dojo of the command line. It prints the messages
+    of the dojo in colour and asks the user what to do with a report file
+    that exists, everything else is done by Dojo.
+    """
+
+    level_colors = {"info": "green", "warning": "yellow", "error": "red"}
+
+    def notify(self, level, message):
+        super().notify(level, message)
+        with instrumentation.measure("render"):
+            cprint(message, self.level_colors[level])
+
+    def report_sinks(self):
+        return [TerminalSink(self.level_colors["info"])]
+
+    def show_report(self, blocks, title="", sinks=()):
+        """
+        This function shows a report and leaves a blank line after it on
+        the terminal
+        """
+        count = super().show_report(blocks, title, sinks)
+        with instrumentation.measure("render"):
+            print()
+        return count
+
+    def choose_file_option(self):
+        """
+        This function asks the user whether to append to, overwrite or
+        cancel writing a report file that exists
+        """
+        option = ""
+        cprint(file_exist_error, "yellow")
+        cprint(file_operation_menu, "yellow")
+        with self.waiting_for_user():
+            while option.lower() not in ["a", "w", "c"]:
+                option = input("a, w or c: ")
+        return option.lower()
@@ -1,33 +1,145 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import chain
 import os
-import random
 import string
+import threading
+import time
 
-from termcolor import cprint
-
-from data.database import DB
 from persons.staffs import Staff
 from persons.fellows import Fellow
+from persons.id_allocator import IdAllocator
+from persons.waitlist import Waitlist
 from rooms.office import Office
 from rooms.livingspace import LivingSpace
-from utils.custom_messages import *
+from rooms.room_pool import RoomPool
+from utils.custom_messages import (
+    autosave_not_running_error, autosave_off_info, autosave_started_info,
+    autosave_status_info, autosave_stopped_info, binary_state_exist_error,
+    binary_state_saved_info, empty_allocation_list, empty_file_error,
+    empty_file_name_info, empty_person_list, empty_room_list,
+    empty_unallocated_list, file_cancelled_message,
+    id_space_exhausted_error, id_space_warning, incremental_exist_error,
+    incremental_name_error, invalid_id, invalid_record_error,
+    invalid_room_name_error, invalid_room_type_error, journal_in_use_error,
+    journal_snapshot_error, journal_started_info, line_not_loaded_error,
+    line_parameter_error, livingspace_created, livingspace_not_request,
+    missing_id_error, office_created, people_loaded_info,
+    person_removed_info, room_exist_error, room_full_error,
+    room_reallocate_success, same_room_error, saved_state_unreadable_error,
+    staff_livingspace_error, state_loaded_info, state_not_loaded_error,
+    unsupported_backend_error, write_to_file_success
+)
+from utils.instrumentation import instrumented
+from utils.people_file import (
+    can_load_in_parallel, check_person_details, get_people_file_path,
+    parse_people_in_parallel, parse_person_line, read_people_lines
+)
+from utils.report_writer import peek, render_report
+from utils.safe_files import atomic_writer, create_exclusive
+
+
+Notice = namedtuple("Notice", ["level", "message"])
 
 
 class Dojo(object):
-    """This is the app main class that has most functions"""
+    """
+    This is the app main class that has most functions. It does no
+    input or output of its own: messages are passed to notify, where the
+    warnings and errors are kept in notices for the caller, and results
+    are returned. The console layer, ConsoleDojo, prints them. The saves
+    and loads return a dictionary of the rows written or read, the
+    location of the database and the error, which is None on success.
+    The methods changing the rooms and people hold the lock of the dojo,
+    so the autosave never copies a change half made.
+    """
+
+    snapshot_interval = 1000
+    file_exist_option = None
 
     def __init__(self):
         self.all_rooms = []
+        self.rooms_index = {}
         self.staff_list = []
         self.fellow_list = []
+        self.people = {}
+        self.id_allocator = IdAllocator()
         self.allocated = {}
-        self.unallocated = {"office": [], "livingspace": []}
+        self.unallocated = {"office": Waitlist(), "livingspace": Waitlist()}
+        self.available_rooms = {
+            "office": RoomPool(), "livingspace": RoomPool()}
+        # dictionaries are used as sets that keep the order of the changes
+        self.dirty_rooms = {}
+        self.dirty_people = {}
+        self.deleted_people = {}
+        self.checkpoint_db = None
+        # the databases saved or loaded in this session, the only ones an
+        # incremental save or autosave may rewrite whole
+        self.owned_states = set()
+        self.journal = None
+        self.snapshot_name = None
+        self.lazy_store = None
+        self.notices = []
+        self.lock = threading.RLock()
+        self.command_running = False
+        self.autosaver = None
+
+    def notify(self, level, message):
+        """
+        This function receives the messages of the dojo, level is info,
+        warning or error. Warnings and errors are kept in notices for the
+        caller, who clears them when they have been read, the message is
+        not shown.
+        """
+        if level != "info" and message:
+            self.notices.append(Notice(level, message))
+
+    @contextmanager
+    def running_command(self):
+        """
+        This function holds the lock of the dojo while a command runs, so
+        the autosave sees the whole change the command makes
+        """
+        with self.lock:
+            self.command_running = True
+            try:
+                yield
+            finally:
+                self.command_running = False
+
+    @contextmanager
+    def waiting_for_user(self):
+        """
+        This function lets go of the lock held by the command running
+        while the user is asked something, so a prompt does not hold up
+        the autosave
+        """
+        if not self.command_running:
+            yield
+            return
+        self.lock.release()
+        try:
+            yield
+        finally:
+            self.lock.acquire()
 
+    def failed(self, message, **result):
+        """
+        This function reports an operation that failed and returns its
+        result dictionary with the error message
+        """
+        self.notify("error", message)
+        return dict(result, error=message)
+
+    @instrumented
     def create_room(self, room_name, room_type):
         """
         This function create a single room or multiple rooms of the same type
-        by receiving an array of room names an the room type.
+        by receiving an array of room names an the room type. It returns
+        the rooms created.
         """
         log = ""
+        created = []
         if room_type.lower() in ["office", "livingspace"]:
             for room in room_name:
                 room = room.title()
@@ -37,42 +149,61 @@ class Dojo(object):
                 elif self.check_room_name_exist(room):
                     log += room_exist_error.format(room_type, room)
                 else:
-                    self.add_room(room, room_type)
+                    created.append(self.add_room(room, room_type))
         else:
             log = invalid_room_type_error
 
-        cprint(log, "red")
+        self.notify("error", log)
+        return created
 
     def add_room(self, room_name, room_type):
         """ This function add the new room to the list of all rooms"""
         new_room = None
         if room_type.lower() == "office":
             new_room = Office(room_name)
-            cprint(office_created.format(room_name), "green")
-            self.all_rooms.append(new_room)
+            self.notify("info", office_created.format(room_name))
         else:
             new_room = LivingSpace(room_name)
-            cprint(livingspace_created.format(room_name), "green")
-            self.all_rooms.append(new_room)
+            self.notify("info", livingspace_created.format(room_name))
+        self.register_room(new_room)
+        return new_room
 
+    def register_room(self, room):
+        """
+        This function adds a room to the list and index of all rooms
+        and records it in the journal. When the state is loaded lazily
+        the room is written to the database at once.
+        """
+        with self.lock:
+            self.all_rooms.append(room)
+            self.rooms_index[room.name.title()] = room
+            if self.lazy_store:
+                self.lazy_store.save_room(room)
+            self.update_room_availability(room)
+            self.dirty_rooms[room.name.title()] = None
+            self.record({"op": "add_room", "name": room.name,
+                         "type": self.get_room_type(room)})
+
+    @instrumented
     def add_person(self, name, designation, wants_accommodation="N"):
         """
         This function add a person by calling the add_fellow
         or add_staff function as the case may be.
         """
-        wants_accommodation = wants_accommodation.lower()
-        if wants_accommodation in ["yes", "y", "no", "n"]:
-            if designation.lower() == "fellow":
-                return self.add_fellow(name, wants_accommodation)
-            elif designation.lower().strip() == "staff":
-                if wants_accommodation in ["y", "yes"]:
-                    cprint(livingspace_request_error, "red")
-                else:
-                    return self.add_staff(name)
-            else:
-                cprint(invalid_designation_error, "red")
+        error = self.check_person_details(designation, wants_accommodation)
+        if error:
+            self.notify("error", error)
+        elif designation.lower().strip() == "fellow":
+            return self.add_fellow(name, wants_accommodation.lower())
         else:
-            cprint(invalid_wants_accomodation, "red")
+            return self.add_staff(name)
+
+    def check_person_details(self, designation, wants_accommodation):
+        """
+        This function validates the designation and accommodation option
+        of a person, it returns the error message or None when valid
+        """
+        return check_person_details(designation, wants_accommodation)
 
     def add_fellow(self, name, accommodation):
         """
@@ -80,14 +211,9 @@ class Dojo(object):
         while calling the allocate function to allocate room.
         """
         new_fellow = Fellow(name)
-        new_fellow.generate_id(self.fellow_list)
-        new_fellow.office = self.allocate_room(new_fellow, Office)
-        if accommodation in ("y", "yes"):
-            new_fellow.livingspace = self.allocate_room(new_fellow,
-                                                        LivingSpace)
-            new_fellow.wants_accommodation = 1
-        self.fellow_list.append(new_fellow)
-        return new_fellow
+        if not self.issue_id(new_fellow):
+            return
+        return self.place_person(new_fellow, accommodation)
 
     def add_staff(self, name):
         """
@@ -95,59 +221,174 @@ class Dojo(object):
         while calling the allocate function to allocate room.
         """
         new_staff = Staff(name)
-        new_staff.generate_id(self.staff_list)
-        new_staff.office = self.allocate_room(new_staff, Office)
-        self.staff_list.append(new_staff)
-        return new_staff
+        if not self.issue_id(new_staff):
+            return
+        return self.place_person(new_staff)
+
+    def place_person(self, person, accommodation="n"):
+        """
+        This function allocates rooms to a person that already has an id
+        and adds the person to the staff or fellow list
+        """
+        person.office = self.allocate_room(person, Office)
+        if isinstance(person, Fellow) and accommodation in ("y", "yes"):
+            person.livingspace = self.allocate_room(person, LivingSpace)
+            person.wants_accommodation = 1
+        return self.register_person(person)
+
+    def register_person(self, person):
+        """
+        This function adds a person whose rooms are already allocated to
+        the staff or fellow list and records the person in the journal
+        """
+        with self.lock:
+            if isinstance(person, Fellow):
+                self.fellow_list.append(person)
+            else:
+                self.staff_list.append(person)
+            self.people[person.id] = person
+            self.dirty_people[person.id] = None
+            livingspace = getattr(person, "livingspace", None)
+            self.record({
+                "op": "add_person", "id": person.id, "name": person.name,
+                "office": person.office.name if person.office else None,
+                "livingspace": livingspace.name if livingspace else None,
+                "wants": getattr(person, "wants_accommodation", 0)})
+            return person
+
+    @instrumented
+    def add_people(self, records):
+        """
+        This function adds many people in one pass. Each record is a
+        (name, designation, wants_accommodation) tuple of text, the
+        accommodation option may be left out. All records are validated
+        first, records of another shape are rejected, ids are reserved in
+        blocks and rooms are then allocated from the pools.
+        It returns a dictionary of the people added, the added people
+        placed on a waiting list and the (line, error) of rejected records.
+        """
+        result = {"added": [], "waitlisted": [], "rejected": []}
+        accepted = []
+        counts = {"fellow": 0, "staff": 0}
+        for line, record in enumerate(records, 1):
+            if not isinstance(record, (tuple, list)) or \
+                    len(record) not in [2, 3] or \
+                    not all(isinstance(field, str) for field in record):
+                result["rejected"].append((line, invalid_record_error))
+                continue
+            name, designation, wants_accommodation = \
+                (tuple(record) + ("N",))[:3]
+            error = self.check_person_details(
+                designation, wants_accommodation)
+            if error:
+                result["rejected"].append((line, error))
+            else:
+                designation = designation.lower().strip()
+                counts[designation] += 1
+                accepted.append((line, name, designation,
+                                 wants_accommodation.lower()))
+
+        new_ids = {}
+        for designation, count in counts.items():
+            new_ids[designation] = iter(
+                self.id_allocator.reserve(designation, count))
+            if self.id_allocator.nearly_exhausted(designation):
+                self.notify("warning", id_space_warning.format(designation))
+
+        person_mapping = {"fellow": Fellow, "staff": Staff}
+        for line, name, designation, accommodation in accepted:
+            person = person_mapping[designation](name)
+            person.id = next(new_ids[designation], None)
+            if not person.id:
+                result["rejected"].append(
+                    (line, id_space_exhausted_error.format(designation)))
+                continue
+            self.place_person(person, accommodation)
+            result["added"].append(person)
+            if not person.office or (
+                    getattr(person, "wants_accommodation", 0) and
+                    not person.livingspace):
+                result["waitlisted"].append(person)
+        result["rejected"].sort()
+        return result
+
+    def issue_id(self, person):
+        """
+        This function gives a person a unique id from the id allocator
+        and warns when the ids of the designation are running out
+        """
+        if not person.generate_id(self.id_allocator):
+            self.notify("error", id_space_exhausted_error.format(
+                person.designation))
+        elif self.id_allocator.nearly_exhausted(person.designation):
+            self.notify("warning", id_space_warning.format(person.designation))
+        return person.id
 
     def check_room_name_exist(self, room_name):
         """
         This function checks if a room name passed already existed
         in the list of all rooms.
         """
-        return room_name in [room.name for room in self.all_rooms]
+        return room_name.title() in self.rooms_index
 
-    def get_available_rooms(self, room_type):
+    def get_room(self, room_name):
         """
-        This function gets the list of availble rooms
-        of a specified room type
+        This function gets the room with the name passed from the
+        room index or None if there is no such room
         """
-        available_room = []
-        for room in self.all_rooms:
-            room_available = (
-                room.total_space > len(self.allocated[room.name])
-                if room.name in self.allocated else True
-            )
+        return self.rooms_index.get(room_name.title())
 
-            if room_available and isinstance(room, room_type):
-                available_room.append(room)
-        return available_room
+    def get_room_type(self, room):
+        """ This function gets the room type name of a room """
+        return "office" if isinstance(room, Office) else "livingspace"
+
+    def update_room_availability(self, room):
+        """
+        This function adds a room to the pool of available rooms of its
+        type when it has spare space and removes it when it is full
+        """
+        room_type = self.get_room_type(room)
+        occupants = self.allocated.get(room.name.title(), [])
+        if room.total_space > len(occupants):
+            self.available_rooms[room_type].add(room)
+        else:
+            self.available_rooms[room_type].discard(room)
 
     def allocate_room(self, person, room_type):
         """
         This function randomly assign room to a person
-        from a list of rooms that are available_room
+        from the pool of rooms that are available
         """
         rooms_mapping = {Office: "office", LivingSpace: "livingspace"}
-        available_rooms = self.get_available_rooms(room_type)
-        if available_rooms:
-            room = random.choice(available_rooms)
-            if room.name not in self.allocated:
-                self.allocated[room.name] = []
-            self.allocated[room.name].append(person)
-            return room
+        room = self.available_rooms[rooms_mapping[room_type]].choice()
+        self.assign_room(person, rooms_mapping[room_type], room)
+        return room
+
+    def assign_room(self, person, room_type, room):
+        """
+        This function adds a person to the occupants of a room, or to the
+        waitlist of the room type when there is no room
+        """
+        if room:
+            self.add_room_to_allocated(room.name)
+            self.allocated[room.name.title()].append(person)
+            self.update_room_availability(room)
         else:
-            self.unallocated[rooms_mapping[room_type]].append(person.id)
+            self.unallocated[room_type].append(person.id)
 
-    def print_room(self, room_name):
+    @instrumented
+    def print_room(self, room_name, db_name=None):
         """"
         This function prints names of all allocated
-        members of the passed room
+        members of the passed room, from a saved database if
+        db_name is passed
         """
+        if db_name:
+            return self.print_saved_room(room_name, db_name)
         print_out = ""
         room_name = room_name.title()
-        if room_name in [room.name for room in self.all_rooms]:
-            if room_name in {room for room in self.allocated}:
+        if self.check_room_name_exist(room_name):
+            if room_name in self.allocated:
                 print_out = "\n".join(
                     [person.name.upper()
                      for person in self.allocated[room_name]])
@@ -157,26 +398,31 @@ class Dojo(object):
                 print_out
         else:
             print_out = "No such room as " + room_name
-        cprint(print_out, "green")
+        self.notify("info", print_out)
+        return print_out
 
-    def print_allocation(self, file_name=None):
+    @instrumented
+    def print_allocation(self, file_name=None, db_name=None):
         """
         This function prints out all allocated rooms
-        and their allocated members
+        and their allocated members, from a saved database if
+        db_name is passed. It returns the number of rooms printed.
         """
-        print_out = ""
-        for room in self.allocated:
-            names = []
-            for person in self.allocated[room]:
-                names.append(person.name)
-            names = ", ".join(names)
-            print_out += "\n".join([room, ("-" * len(names)), names, "\n"])
-        if not print_out:
-            cprint(empty_allocation_list, "yellow")
-        else:
-            self.write_to_file(print_out, file_name)
-            cprint(print_out.upper(), "green")
+        if db_name:
+            return self.print_saved_allocation(file_name, db_name)
+        return self.print_report(self.allocation_blocks(), file_name,
+                                 empty_allocation_list)
+
+    def allocation_blocks(self):
+        """
+        This function yields the report of each allocated room in turn,
+        the room name and the names of its members
+        """
+        for room, members in self.allocated.items():
+            names = ", ".join(person.name for person in members)
+            yield "\n".join([room, ("-" * len(names)), names, "\n"]).upper()
 
+    @instrumented
     def print_rooms(self):
         """ This function prints out all available rooms """
         room_type_mapping = {Office: "Office", LivingSpace: "Livingspace"}
@@ -186,57 +432,205 @@ class Dojo(object):
                 " - ".join([room.name, room_type_mapping[type(room)]]))
         room_names = "\n".join(room_names)
         if not room_names:
-            cprint(empty_room_list, "yellow")
+            self.notify("warning", empty_room_list)
         else:
-            cprint("List of all rooms\n" + room_names, "green")
+            self.notify("info", "List of all rooms\n" + room_names)
+        return room_names
 
-    def print_unallocated(self, file_name=None):
-        """ This function prints the list of unallocated persons"""
-        print_out = ""
+    @instrumented
+    def print_unallocated(self, file_name=None, db_name=None):
+        """
+        This function prints the list of unallocated persons, from a
+        saved database if db_name is passed. It returns the number of
+        lines printed.
+        """
+        if db_name:
+            return self.print_saved_unallocated(file_name, db_name)
+        return self.print_report(self.unallocated_lines(), file_name,
+                                 empty_unallocated_list,
+                                 "UNALLOCATED LIST\n\n")
+
+    def unallocated_lines(self):
+        """
+        This function yields a line for each room type each person is
+        waiting for
+        """
         for key in self.unallocated:
-            for id in self.unallocated[key]:
-                person = [person for person in
-                          (self.staff_list + self.fellow_list)
-                          if person.id.upper() == id.upper()][0]
-                print_out += person.name.upper() + " - NO " + \
+            for person_id in self.unallocated[key]:
+                yield self.get_person(person_id).name.upper() + " - NO " + \
                     key.upper() + "\n"
-        if not print_out:
-            cprint(empty_unallocated_list, "yellow")
-        else:
-            print_out = "UNALLOCATED LIST\n\n" + print_out
-            self.write_to_file(print_out, file_name)
-            cprint(print_out.upper(), "green")
-
-    def write_to_file(self, print_out, file_name):
-        """ This function write a string to the file_name specified"""
-        if file_name:
-            if os.path.isfile("data/%s.txt" % file_name):
-                option = ""
-                cprint(file_exist_error, "yellow")
-                cprint(file_operation_menu, "yellow")
-                while option.lower() not in ["a", "w", "c"]:
-                    option = input("a, w or c: ")
-                self.execute_write_to_file(
-                    print_out, file_name, option.lower())
-            else:
-                self.execute_write_to_file(print_out, file_name, "w")
-        else:
-            cprint(empty_file_name_info, "green")
 
-    def execute_write_to_file(self, print_out, file_name, option):
-        option_mapping = {"a": "appended", "w": "written"}
+    def open_saved_state(self, db_name):
+        """
+        This function opens a saved database read-only for the reports,
+        the state of the dojo is left as it is. It returns None when the
+        database cannot be read.
+        """
+        import sqlite3
+        from data.database import DB
+        if not DB().db_exists(db_name):
+            self.notify("error", "File not found")
+            return
+        try:
+            conn = DB().open_read_only(db_name)
+        except sqlite3.DatabaseError as error:
+            self.notify("error", saved_state_unreadable_error.format(
+                db_name, error))
+            return
+        return conn
+
+    def print_saved_room(self, room_name, db_name):
+        """
+        This function prints the names of the members of a room of a
+        saved database as they are read. It returns the text printed, as
+        print_room does, or "" when the database cannot be opened.
+        """
+        from data.database import DB
+        conn = self.open_saved_state(db_name)
+        if not conn:
+            return ""
+        database = DB()
+        try:
+            room = database.query_room(conn, room_name.title())
+            if not room:
+                print_out = "No such room as " + room_name.title()
+                self.notify("info", print_out)
+                return print_out
+            lines = [room[1].upper() + "\n" + ("-" * 30)]
+            self.notify("info", lines[0])
+            for name in database.query_occupants(conn, room[0], room[2]):
+                lines.append(name.upper())
+                self.notify("info", lines[-1])
+            if len(lines) == 1:
+                lines.append("No allocation for this room")
+                self.notify("info", lines[-1])
+            return "\n".join(lines)
+        finally:
+            conn.close()
+
+    def print_saved_allocation(self, file_name, db_name):
+        """
+        This function prints out the allocated rooms of a saved database
+        and their allocated members. It returns the number of rooms
+        printed, 0 when the database cannot be opened.
+        """
+        from data.database import DB
+        conn = self.open_saved_state(db_name)
+        if not conn:
+            return 0
+        try:
+            blocks = (
+                "\n".join([room, ("-" * len(", ".join(names))),
+                           ", ".join(names), "\n"]).upper()
+                for room, names in DB().query_allocations(conn))
+            return self.print_report(blocks, file_name,
+                                     empty_allocation_list)
+        finally:
+            conn.close()
+
+    def print_saved_unallocated(self, file_name, db_name):
+        """
+        This function prints the list of unallocated persons of a saved
+        database. It returns the number of lines printed, 0 when the
+        database cannot be opened.
+        """
+        from data.database import DB
+        conn = self.open_saved_state(db_name)
+        if not conn:
+            return 0
+        try:
+            lines = (name.upper() + " - NO " + room_type.upper() + "\n"
+                     for name, room_type in DB().query_unallocated(conn))
+            return self.print_report(lines, file_name,
+                                     empty_unallocated_list,
+                                     "UNALLOCATED LIST\n\n")
+        finally:
+            conn.close()
+
+    def print_report(self, blocks, file_name, empty_message, title=""):
+        """
+        This function prints the blocks of a report as they are produced
+        and writes them to file_name at the same time, so the report is
+        never held in memory as a whole. It returns the number of blocks.
+        """
+        blocks = peek(blocks)
+        if not blocks:
+            self.notify("warning", empty_message)
+            return 0
+        if not file_name:
+            self.notify("info", empty_file_name_info)
+            return self.show_report(blocks, title)
+        return self.write_to_file(blocks, file_name, title)
+
+    def show_report(self, blocks, title="", sinks=()):
+        """
+        This function writes a report to the report_sinks of the dojo and
+        to the sinks passed, through buffers
+        """
+        return render_report(blocks, self.report_sinks() + list(sinks),
+                             title)
+
+    def report_sinks(self):
+        """
+        This function gives the sinks reports are shown on, the core shows
+        them nowhere and the console layer on the terminal
+        """
+        return []
+
+    @instrumented
+    def write_to_file(self, blocks, file_name, title=""):
+        """
+        This function writes the blocks of a report to the file_name
+        specified while showing them. The file is created in one atomic
+        step so that two sessions cannot both take it for a new file.
+        When file_exist_option is set it is used for a file that exists
+        instead of choose_file_option.
+        """
+        path = "data/%s.txt" % file_name
+        option = "w"
+        if not create_exclusive(path):
+            option = self.file_exist_option or self.choose_file_option()
         if option == "c":
-            cprint(file_cancelled_message, "yellow")
-        else:
-            file = open("data/%s.txt" % file_name, "{}".format(option))
-            file.write("\n" + print_out.upper())
-            file.close()
-            cprint(write_to_file_success.format(option_mapping[option],
-                                                file_name), "green")
+            self.notify("warning", file_cancelled_message)
+            return self.show_report(blocks, title)
+        option_mapping = {"a": "appended", "w": "written"}
+        with atomic_writer(path, append=option == "a") as report_file:
+            report_file.write("\n")
+            count = self.show_report(blocks, title, [report_file])
+        self.notify("info", write_to_file_success.format(
+            option_mapping[option], file_name))
+        return count
+
+    def choose_file_option(self):
+        """
+        This function chooses what to do with a report file that exists,
+        a to append, w to overwrite or c to cancel. The core cancels, the
+        console layer asks the user.
+        """
+        return "c"
 
     def reset(self):
-        """ This function reset Dojo to it initializatio stage"""
-        self.__init__()
+        """
+        This function reset Dojo to it initializatio stage. The journal
+        and the autosave are kept on, the reset is written to the journal,
+        and the notices are kept.
+        """
+        with self.lock:
+            if self.lazy_store:
+                self.lazy_store.close()
+            lock, autosaver = self.lock, self.autosaver
+            journal, snapshot_name = self.journal, self.snapshot_name
+            notices, owned_states = self.notices, self.owned_states
+            command_running = self.command_running
+            self.__init__()
+            self.lock, self.autosaver = lock, autosaver
+            self.command_running = command_running
+            self.journal, self.snapshot_name = journal, snapshot_name
+            self.notices, self.owned_states = notices, owned_states
+            if autosaver:
+                autosaver.reset()
+            if journal:
+                journal.append({"op": "reset"})
 
     def check_valid_id(self, input_val):
         """ This function checks validity of the id supplied.
@@ -253,80 +647,90 @@ class Dojo(object):
         return output
 
     def get_person(self, person_id):
-        """ This function gets the index of the person_id on
-            the staff list or fellow list
+        """ This function gets the person with the person_id from
+            the index of all persons or None if there is no such person
         """
+        return self.people.get(person_id.upper())
 
-        person_list = (
-            self.fellow_list if person_id.startswith('F') else self.staff_list
-        )
-        for index, person in enumerate(person_list):
-            if person_id == person.id:
-                return person
-        else:
-            return None
-
+    @instrumented
     def reallocate_person(self, person_id, new_room_name):
-        """ This function reallocates a person to a given room. """
+        """
+        This function reallocates a person to a given room, it returns
+        True when the person has been moved
+        """
         person_id = person_id.upper()
         if self.check_valid_id(person_id):
             person = self.get_person(person_id)
             if person:
                 new_room_name = new_room_name.title()
-                if new_room_name in [room.name for room in self.all_rooms]:
-                    room = [room for room in self.all_rooms if room.name ==
-                            new_room_name][0]
+                room = self.get_room(new_room_name)
+                if room:
                     if new_room_name not in self.allocated or \
                             room.total_space > \
                             len(self.allocated[new_room_name]):
-                        self.move_person(person, new_room_name)
+                        return self.move_person(person, new_room_name)
                     else:
-                        cprint(room_full_error, "yellow")
+                        self.notify("warning", room_full_error)
                 else:
-                    cprint("Room not found", "red")
+                    self.notify("error", "Room not found")
             else:
-                cprint(missing_id_error, "red")
+                self.notify("error", missing_id_error)
         else:
-            cprint(invalid_id, "red")
+            self.notify("error", invalid_id)
 
     def move_person(self, person_obj, new_room_name):
         """ This function move a person to the new room"""
         person_id = person_obj.id
         person = "Staff" if person_id.startswith("S") else "Fellow"
-        room = [room for room in self.all_rooms if room.name ==
-                new_room_name][0]
+        room = self.get_room(new_room_name)
         if isinstance(room, LivingSpace) and person_id.startswith("S"):
-            cprint(staff_livingspace_error, "red")
+            self.notify("error", staff_livingspace_error)
         else:
             room_type_attr_mapping = {True: "livingspace", False: "office"}
-            room_instance_mapping = {
-                "office": Office, "livingspace": LivingSpace
-            }
             room_type = ""
             if isinstance(room, LivingSpace):
                 if person_obj.wants_accommodation:
                     room_type = room_type_attr_mapping[True]
                 else:
-                    cprint(livingspace_not_request, "red")
+                    self.notify("error", livingspace_not_request)
                     return
             else:
                 room_type = room_type_attr_mapping[False]
 
-            if getattr(person_obj, room_type):
-                current_room = getattr(person_obj, room_type)
-                if current_room.name != new_room_name:
-                    self.remove_from_allocated(
-                        person_id, room_instance_mapping[room_type])
-                else:
-                    cprint(same_room_error.format(person, room_type), "yellow")
-                    return
-            setattr(person_obj, room_type, room)
-            self.add_room_to_allocated(new_room_name)
-            if person_id in self.unallocated[room_type]:
-                self.unallocated[room_type].remove(person_id)
-            self.allocated[new_room_name].append(person_obj)
-            cprint(room_reallocate_success.format(person, room_type) +
-                   new_room_name, "green")
+            current_room = getattr(person_obj, room_type)
+            if current_room and current_room.name == new_room_name:
+                self.notify("warning",
+                            same_room_error.format(person, room_type))
+                return
+            self.relocate_person(person_obj, room_type, room)
+            self.notify("info", room_reallocate_success.format(
+                person, room_type) + new_room_name)
+            return True
+
+    def relocate_person(self, person, room_type, room):
+        """
+        This function moves a person out of the current room of the room
+        type, if any, into the room and records the move in the journal
+        """
+        room_instance_mapping = {"office": Office, "livingspace": LivingSpace}
+        with self.lock:
+            if getattr(person, room_type):
+                self.remove_from_allocated(
+                    person.id, room_instance_mapping[room_type])
+            setattr(person, room_type, room)
+            self.unallocated[room_type].discard(person.id)
+            self.assign_room(person, room_type, room)
+            self.mark_person_changed(person)
+            self.record({"op": "move", "id": person.id, "room": room.name})
+
+    def mark_person_changed(self, person):
+        """
+        This function records that a person has changed since the last
+        save and, when the state is loaded lazily, writes the person back
+        """
+        self.dirty_people[person.id] = None
+        if self.lazy_store:
+            self.lazy_store.save_person(person)
 
     def add_room_to_allocated(self, room_name):
         """ this function add a new room to the room allocated list """
@@ -335,133 +739,595 @@ class Dojo(object):
 
     def remove_from_allocated(self, person_id, room_type):
         """ This function remove a person from previously allocated room"""
-        person = next((person for person in self.staff_list + self.fellow_list
-                       if person.id.upper() == person_id.upper()), None)
+        person = self.get_person(person_id)
         if person:
-            key = person.office.name.title() if room_type == Office else \
-                person.livingspace.name.title()
-            self.allocated[key].remove(person)
+            room = person.office if room_type == Office else \
+                person.livingspace
+            self.allocated[room.name.title()].remove(person)
+            self.update_room_availability(room)
             return True
 
-    def print_person_list(self, staff_or_fellow):
-        """This function print a list of staff or fellow and their details"""
-        person_mapping = {"staff": [self.staff_list, "Staff List\n"],
-                          "fellow": [self.fellow_list, "Fellow List\n"]}
-        person_list, list_header = person_mapping[staff_or_fellow]
+    @instrumented
+    def remove_person(self, person_id):
+        """
+        This function removes a person from the dojo, freeing the rooms
+        allocated to the person and taking the person off the waitlists
+        """
+        person_id = person_id.upper()
+        person = self.get_person(person_id)
+        if not person:
+            self.notify("error", missing_id_error)
+            return
+        self.discard_person(person)
+        self.notify("info", person_removed_info.format(
+            person.designation.title(), person.name.title(), person_id))
+        return person
 
+    def discard_person(self, person):
+        """
+        This function takes a person out of every room, waitlist and list
+        of the dojo and records the removal in the journal
+        """
+        with self.lock:
+            person_id = person.id.upper()
+            if person.office:
+                self.remove_from_allocated(person_id, Office)
+            if getattr(person, "livingspace", None):
+                self.remove_from_allocated(person_id, LivingSpace)
+            for waitlist in self.unallocated.values():
+                waitlist.discard(person_id)
+            if isinstance(person, Fellow):
+                self.fellow_list.remove(person)
+            else:
+                self.staff_list.remove(person)
+            del self.people[person_id]
+            self.id_allocator.retire(person_id)
+            self.dirty_people.pop(person_id, None)
+            self.deleted_people[person_id] = None
+            self.record({"op": "remove", "id": person_id})
+
+    @instrumented
+    def print_person_list(self, staff_or_fellow):
+        """
+        This function print a list of staff or fellow and their details,
+        it returns the number of people printed
+        """
+        list_header = {"staff": "Staff List\n",
+                       "fellow": "Fellow List\n"}[staff_or_fellow]
         list_header += "id\t\tNAME\t\tOFFICE NAME\tLIVINGSPACE\n"
-        print_out = list_header + ("-" * 70) + "\n"
+        lines = peek(self.person_list_lines(staff_or_fellow))
+        if not lines:
+            self.notify("warning", empty_person_list)
+            return 0
+        return self.show_report(lines, list_header + ("-" * 70) + "\n")
+
+    def person_list_lines(self, staff_or_fellow):
+        """ This function yields a line of details for each staff or fellow """
+        person_list = {"staff": self.staff_list,
+                       "fellow": self.fellow_list}[staff_or_fellow]
         for person in person_list:
             office_name = person.office.name if person.office else "-"
             livingspace_name = person.livingspace.name \
                 if staff_or_fellow == "fellow" and person.livingspace else "-"
-            print_out += "{}\t\t{}\t\t{}\t\t{}\n".format(
+            yield "{}\t\t{}\t\t{}\t\t{}\n".format(
                 person.id, person.name.upper(), office_name.upper(),
                 livingspace_name.upper())
-        if len(print_out) > 125:
-            cprint(print_out, "green")
-        else:
-            cprint(empty_person_list, "yellow")
-
-    def get_file_content(self, file_name):
-        if os.path.isfile("data/{}.txt".format(file_name)):
-            file = open("data/{}.txt".format(file_name), "r")
-            content = file.read()
-            file.close()
-            if content.strip():
-                content = content.split("\n")
-                return content
-            else:
-                cprint(empty_file_error, "yellow")
-        else:
-            cprint("File not found", "yellow")
 
-    def load_people(self, file_name):
-        content = self.get_file_content(file_name)
-        error = 0
-        if not content:
-            return
-        for index, person_detail in enumerate(content):
+    @instrumented
+    def load_people(self, file_name, workers=None):
+        """
+        This function adds the people listed in a file. The file is read
+        and allocated line by line so memory use does not grow with the
+        size of the file. The file can be a path, the name of a .txt file
+        in the data folder, a gzip or bz2 file or '-' for the stdin.
+        When more than one worker is requested, lines of plain files are
+        parsed and validated in a pool of processes. It returns a
+        dictionary of the number of people loaded, the (line, error) of
+        every line not loaded and the error that stopped the load.
+        """
+        if file_name != "-" and not get_people_file_path(file_name):
+            return self.failed("File not found", loaded=0, rejected=[])
+        if workers and workers > 1 and can_load_in_parallel(file_name):
+            return self.load_people_in_parallel(file_name, workers)
+        result = {"loaded": 0, "rejected": [], "error": None}
+        line_count = 0
+        for index, person_detail in enumerate(read_people_lines(file_name)):
+            line_count = index + 1 + person_detail.endswith("\n")
             if person_detail.strip():
-                person_detail = person_detail.strip().split()
-                name = person_detail[0] + " " + person_detail[1]
-                if len(person_detail) in [3, 4]:
-                    person_detail.append("N")\
-                        if len(person_detail) == 3 else person_detail
-                    person = self.add_person(name, person_detail[2],
-                                             person_detail[3])
-                    if not person:
-                        cprint(line_not_loaded_error.format(index + 1), "red")
-                        error += 1
+                person_detail = parse_person_line(person_detail)
+                if person_detail:
+                    person = self.add_person(*person_detail)
+                    error = None if person else \
+                        line_not_loaded_error.format(index + 1)
                 else:
-                    cprint(line_parameter_error.format(index + 1), "red")
-                    error += 1
-        self.print_load_people_message(error, content)
+                    error = line_parameter_error.format(index + 1)
+                self.count_loaded_line(result, index + 1, error)
+        return self.finish_load_people(result, line_count)
 
-    def print_load_people_message(self, error, content):
+    def load_people_in_parallel(self, file_name, workers):
+        """
+        This function adds the people of a file whose lines are parsed and
+        validated by parse_people_in_parallel, the people are allocated
+        here one at a time in the original order of the file
+        """
+        result = {"loaded": 0, "rejected": [], "error": None}
+        line_count = 0
+        path = get_people_file_path(file_name)
+        for line, kind, value in parse_people_in_parallel(path, workers):
+            if kind is None:
+                line_count = line
+                continue
+            if kind == "parameters":
+                self.count_loaded_line(result, line,
+                                       line_parameter_error.format(line))
+                continue
+            if kind == "invalid":
+                self.notify("error", value)
+                person = None
+            elif value[1].lower().strip() == "fellow":
+                person = self.add_fellow(value[0], value[2].lower())
+            else:
+                person = self.add_staff(value[0])
+            self.count_loaded_line(
+                result, line,
+                None if person else line_not_loaded_error.format(line))
+        return self.finish_load_people(result, line_count)
+
+    def count_loaded_line(self, result, line, error):
+        """
+        This function adds a line of the people file to the result of the
+        load, error is None when the person on the line was added
+        """
+        if error:
+            self.notify("error", error)
+            result["rejected"].append((line, error))
+        else:
+            result["loaded"] += 1
+
+    def finish_load_people(self, result, line_count):
+        """
+        This function reports how much of the people file was loaded and
+        returns the result of the load
+        """
+        if not result["loaded"] and not result["rejected"]:
+            return self.failed(empty_file_error, **result)
         response_mapping = ["Everyone", "Some people", "Nobody"]
+        error = len(result["rejected"])
         if error:
-            error = 2 if error >= len(content) - 1 else 1
-        load_ran = response_mapping[error]
-        cprint(people_loaded_info.format(load_ran), "green")
+            error = 2 if error >= line_count - 1 else 1
+        self.notify("info", people_loaded_info.format(
+            response_mapping[error]))
+        return result
 
-    def save_state(self, db_name):
+    @instrumented
+    def save_state(self, db_name, incremental=False, binary=False):
         """
         This function save state by storing data from the
         application's data structure into a database
         """
+        from data.backends import get_backend
+        if incremental:
+            return self.save_state_incremental(db_name)
+        if binary:
+            return self.save_state_binary(db_name)
         person_list = self.staff_list + self.fellow_list
-        if self.all_rooms or person_list:
-            db_name = "" if not db_name else db_name
-            new_db = DB()
-            log = new_db.save_state(db_name, self.all_rooms, person_list)
-            cprint(log, "yellow")
+        if not self.all_rooms and not person_list:
+            return self.failed("There is no data to be saved in the database",
+                               rows=0, location=None)
+        backend, db_name = get_backend(db_name or "")
+        row_count, db_name, log = backend.save_state(
+            db_name, self.all_rooms, person_list)
+        if row_count is None:
+            return self.failed(log, rows=0, location=None)
+        self.owned_states.add(backend.location.format(db_name))
+        self.notify("info", log)
+        return {"rows": row_count,
+                "location": backend.location.format(db_name), "error": None}
+
+    def claim_state(self, backend, name):
+        """
+        This function checks a database may be rewritten whole by an
+        incremental save or autosave. That is a database saved or loaded
+        in this session, or a new one, which is created at once so that no
+        other session takes the name. It returns the error message when
+        the database belongs to someone else, None otherwise.
+        """
+        location = backend.location.format(name)
+        if location in self.owned_states:
+            return None
+        if not backend.claim(name):
+            return incremental_exist_error.format(location)
+        self.owned_states.add(location)
+
+    def get_state_backend(self, db_name, purpose,
+                          schemes=("", "sqlite", "memory")):
+        """
+        This function resolves a database name, which can be named with
+        the storage backend as in memory:name, to the backend and the name
+        of the state. A plain name has the scheme "". When the scheme is
+        not one of schemes the backend returned is None and the error
+        message is returned as well.
+        """
+        from data.backends import get_backend
+        backend, name = get_backend(db_name)
+        scheme = db_name.partition(":")[0] if name != db_name else ""
+        if scheme not in schemes:
+            return None, name, unsupported_backend_error.format(
+                backend.location.format(name), purpose)
+        return backend, name, None
+
+    def save_state_binary(self, db_name):
+        """
+        This function saves the state into a binary columnar snapshot
+        file that can be loaded much faster than a database
+        """
+        from data.database import DB
+        from data.snapshot import save_snapshot
+        backend, db_name, error = self.get_state_backend(
+            (db_name or "").strip(), "binary snapshots", ("",))
+        if error:
+            return self.failed(error, rows=0, location=None)
+        if not db_name:
+            db_name = DB().generate_name()
+            while not create_exclusive("data/{}.dojo".format(db_name)):
+                db_name = str(int(db_name) + 1)
+        elif not create_exclusive("data/{}.dojo".format(db_name)):
+            return self.failed(binary_state_exist_error, rows=0,
+                               location=None)
+        path = "data/{}.dojo".format(db_name)
+        start_time = time.time()
+        try:
+            row_count = save_snapshot(path, self.all_rooms,
+                                      self.staff_list + self.fellow_list)
+        except ValueError as error:
+            os.remove(path)
+            return self.failed(str(error), rows=0, location=None)
+        duration = max(time.time() - start_time, 1e-6)
+        self.notify("info",
+                    "{} rows saved in {:.3f}s ({:.0f} rows/sec)\n".format(
+                        row_count, duration, row_count / duration) +
+                    binary_state_saved_info.format(db_name))
+        return {"rows": row_count, "location": "{}.dojo".format(db_name),
+                "error": None}
+
+    def save_state_incremental(self, db_name):
+        """
+        This function saves only the rooms and people changed since the
+        last save into a database that is kept between saves. The first
+        save into a database, or after a reset or a load of another
+        database, writes the whole state instead, which is refused for an
+        existing database not saved or loaded in this session.
+        """
+        if not db_name or not db_name.strip():
+            return self.failed(incremental_name_error, rows=0, location=None)
+        row_count, log = self.checkpoint(db_name.strip())
+        if row_count is None:
+            return self.failed(log, rows=0, location=None)
+        self.notify("info", log)
+        return {"rows": row_count, "location": self.checkpoint_db,
+                "error": None}
+
+    @instrumented
+    def checkpoint(self, db_name):
+        """
+        This function writes the changes since the last save into db_name,
+        or the whole state when db_name is not the last database saved to.
+        It returns the number of rows written, or None, and the message.
+        """
+        from data.backends import get_backend
+        backend, name = get_backend(db_name)
+        if backend.scheme == "jsonl":
+            return None, unsupported_backend_error.format(
+                backend.location.format(name), "incremental saves")
+        db_name = backend.location.format(name)
+        full = self.checkpoint_db != db_name
+        if full:
+            error = self.claim_state(backend, name)
+            if error:
+                return None, error
+            rooms = self.all_rooms
+            person_list = self.staff_list + self.fellow_list
+        else:
+            rooms = [self.rooms_index[name] for name in self.dirty_rooms]
+            person_list = [self.people[person_id]
+                           for person_id in self.dirty_people]
+        row_count, log = backend.save_incremental(
+            name, rooms, person_list, self.deleted_people, full)
+        if row_count is not None:
+            self.clear_dirty(db_name)
+        return row_count, log
+
+    def clear_dirty(self, db_name):
+        """
+        This function records that the state is fully saved in db_name,
+        the location of the database such as foo.sqlite, and clears the
+        rooms and people changed since the last save
+        """
+        self.checkpoint_db = db_name
+        self.dirty_rooms = {}
+        self.dirty_people = {}
+        self.deleted_people = {}
+
+    def start_autosave(self, db_name, interval=60, change_limit=1000):
+        """
+        This function starts saving the state into db_name in the
+        background every interval seconds or change_limit changes. An
+        existing database not saved or loaded in this session is refused
+        as the first autosave rewrites it whole.
+        """
+        from data.autosave import AutoSaver
+        backend, name, error = self.get_state_backend(db_name, "autosaves")
+        if not error:
+            error = self.claim_state(backend, name)
+        if error:
+            self.notify("error", error)
+            return
+        self.stop_autosave()
+        self.autosaver = AutoSaver(self, db_name, interval, change_limit)
+        self.autosaver.start()
+        self.notify("info", autosave_started_info.format(
+            backend.location.format(name), interval, change_limit))
+
+    def stop_autosave(self):
+        """
+        This function stops the autosave after saving the changes not
+        saved yet
+        """
+        if self.autosaver:
+            autosaver, self.autosaver = self.autosaver, None
+            autosaver.stop()
+            self.notify("info", autosave_stopped_info.format(
+                autosaver.backend.location.format(autosaver.name)))
+            return autosaver
+
+    def print_autosave_status(self):
+        """ This function prints the status of the autosave """
+        autosaver = self.autosaver
+        if not autosaver:
+            self.notify("warning", autosave_off_info)
+            return
+        print_out = autosave_started_info.format(
+            autosaver.backend.location.format(autosaver.name),
+            autosaver.interval, autosaver.change_limit)
+        if autosaver.last_save:
+            print_out += "\n" + autosave_status_info.format(
+                time.strftime("%H:%M:%S", time.localtime(autosaver.last_save)),
+                autosaver.last_duration, autosaver.last_rows,
+                autosaver.save_count)
         else:
-            cprint("There is no data to be saved in the database", "yellow")
+            print_out += "\nNo autosave yet"
+        if autosaver.last_error:
+            print_out += "\n" + autosaver.last_error
+        if not autosaver.is_running():
+            print_out += "\n" + autosave_not_running_error
+        level = "error" if autosaver.last_error or \
+            not autosaver.is_running() else "info"
+        self.notify(level, print_out)
 
-    def load_state(self, db_name):
+    @instrumented
+    def load_state(self, db_name, binary=False, lazy=False):
         """
         This function retrieves data from the database and assign them
-        to the appropraite variables to store them
+        to the appropraite variables to store them. The database can
+        be named with the storage backend, as in memory:name.
+        """
+        import sqlite3
+        from data.backends import get_backend
+        if binary:
+            return self.load_state_binary(db_name)
+        if lazy:
+            return self.load_state_lazy(db_name)
+        backend, name = get_backend(db_name)
+        if not backend.db_exists(name):
+            return self.failed("File not found", rows=0, location=None)
+        try:
+            app_data = backend.load_state(name)
+        except sqlite3.DatabaseError as error:
+            return self.failed(state_not_loaded_error.format(
+                backend.location.format(name), error), rows=0, location=None)
+        with self.lock:
+            self.reset()
+            self.apply_app_data(app_data)
+            return self.finish_load_state(
+                backend.location.format(name), len(self.all_rooms) +
+                len(self.staff_list) + len(self.fellow_list))
+
+    def load_state_lazy(self, db_name):
+        """
+        This function loads the rooms and room occupancy of a database and
+        leaves the people in it. People are fetched when needed and every
+        change to them is written back to the database.
+        """
+        import sqlite3
+        from data.lazy_store import LazyAllocations, LazyPersonList, LazyStore
+        backend, name, error = self.get_state_backend(db_name, "lazy loads")
+        if error:
+            return self.failed(error, rows=0, location=None)
+        if not backend.db_exists(name):
+            return self.failed("File not found", rows=0, location=None)
+        store = LazyStore(name, backend=backend)
+        try:
+            rooms = store.load_rooms()
+            occupancy = store.load_occupancy()
+            waitlists = store.load_waitlists()
+        except sqlite3.DatabaseError as error:
+            store.close()
+            return self.failed(state_not_loaded_error.format(
+                backend.location.format(name), error), rows=0, location=None)
+        with self.lock:
+            self.reset()
+            self.all_rooms = rooms
+            self.rooms_index = store.rooms_index
+            self.people = store
+            self.staff_list = LazyPersonList(store, "staff")
+            self.fellow_list = LazyPersonList(store, "fellow")
+            self.allocated = LazyAllocations(store, occupancy)
+            self.unallocated = waitlists
+            self.id_allocator = IdAllocator(
+                is_taken=store.__contains__,
+                stored={designation: store.count_people(designation)
+                        for designation in ["fellow", "staff"]})
+            for room in self.all_rooms:
+                self.update_room_availability(room)
+            self.lazy_store = store
+            return self.finish_load_state(backend.location.format(name),
+                                          len(self.all_rooms) + len(store))
+
+    def load_state_binary(self, db_name):
+        """
+        This function loads the state from a binary snapshot file, its
+        checksum is verified before anything in the dojo is replaced
         """
-        if os.path.isfile("data/{}.sqlite".format(db_name)):
+        from data.snapshot import Snapshot
+        backend, db_name, error = self.get_state_backend(
+            db_name, "binary snapshots", ("",))
+        if error:
+            return self.failed(error, rows=0, location=None)
+        path = "data/{}.dojo".format(db_name)
+        if not os.path.isfile(path):
+            return self.failed("File not found", rows=0, location=None)
+        try:
+            snapshot = Snapshot(path)
+        except ValueError as error:
+            return self.failed(str(error), rows=0, location=None)
+        with self.lock:
             self.reset()
-            new_db = DB()
-            app_data = new_db.load_state(db_name)
-            self.all_rooms = app_data["all_rooms"]
-            self.staff_list = app_data["staff_list"]
-            self.fellow_list = app_data["fellow_list"]
-            allocations = self.get_allocations()
-            self.allocated = allocations["allocated"]
-            self.unallocated = allocations["unallocated"]
-            cprint(state_loaded_info.format(db_name), "green")
+            self.apply_app_data(snapshot.to_app_data())
+            snapshot.close()
+            return self.finish_load_state(
+                "{}.dojo".format(db_name), len(self.all_rooms) +
+                len(self.staff_list) + len(self.fellow_list),
+                checkpoint_db=False)
+
+    def finish_load_state(self, location, row_count, checkpoint_db=True):
+        """
+        This function records the state loaded from location as saved
+        there, snapshots it for the journal and returns the result of the
+        load. A binary snapshot is not a database incremental saves can
+        continue, so checkpoint_db is False for it.
+        """
+        self.clear_dirty(location if checkpoint_db else None)
+        if checkpoint_db:
+            self.owned_states.add(location)
+        if self.journal:
+            self.take_snapshot()
+        self.notify("info", state_loaded_info.format(location))
+        return {"rows": row_count, "location": location, "error": None}
+
+    def apply_app_data(self, app_data):
+        """
+        This function replaces the rooms, people and allocations of the
+        dojo with the data loaded from a saved state
+        """
+        self.all_rooms = app_data["all_rooms"]
+        self.rooms_index = {
+            room.name.title(): room for room in self.all_rooms}
+        self.staff_list = app_data["staff_list"]
+        self.fellow_list = app_data["fellow_list"]
+        for person in chain(self.staff_list, self.fellow_list):
+            self.people[person.id.upper()] = person
+            self.id_allocator.register(person.id)
+        self.allocated = app_data["allocated"]
+        self.unallocated = app_data["unallocated"]
+        for room in self.all_rooms:
+            self.update_room_availability(room)
+
+    def record(self, entry):
+        """
+        This function appends an entry to the journal, when journaling is
+        on, and takes a snapshot once enough entries have been written.
+        The change is also noted for the autosave, when it is on.
+        """
+        if self.autosaver:
+            self.autosaver.note(entry)
+        if self.journal:
+            self.journal.append(entry)
+            if self.journal.record_count >= self.snapshot_interval:
+                self.take_snapshot()
+
+    def take_snapshot(self):
+        """
+        This function saves the changes since the last snapshot into the
+        snapshot database and empties the journal. After a load the whole
+        state is saved as the snapshot is not the database loaded.
+        """
+        row_count, log = self.checkpoint(self.snapshot_name)
+        if row_count is None:
+            self.notify("error", log)
         else:
-            cprint("File not found", "yellow")
-
-    def get_allocations(self):
-        """
-        This function extracts the allocated and unallocated
-        collection from the data retrieved from the database
-        """
-        allocated = {}
-        unallocated = {"office": [], "livingspace": []}
-        for person in (self.staff_list + self.fellow_list):
-            office = person.office
-            if office:
-                office_name = office.name.title()
-                if office_name not in allocated:
-                    allocated[office_name] = []
-                allocated[office_name].append(person)
-            else:
-                unallocated["office"].append(person.id)
-            if hasattr(person, "livingspace"):
-                livingspace = person.livingspace
-                if livingspace:
-                    livingspace_name = livingspace.name.title()
-                    if livingspace_name not in allocated:
-                        allocated[livingspace_name] = []
-                    allocated[livingspace_name].append(person)
-                else:
-                    if person.wants_accommodation:
-                        unallocated["livingspace"].append(person.id.upper())
-        return {"allocated": allocated, "unallocated": unallocated}
+            self.journal.truncate()
+
+    @instrumented
+    def start_journal(self, name):
+        """
+        This function recovers the state saved under a journal name by
+        loading the latest snapshot and replaying the journal written
+        after it, then journals every further change to the dojo.
+        Without a snapshot the current state is kept and checkpointed as
+        the first snapshot. A journal in use by another session, or one
+        whose snapshot cannot be loaded, is left alone.
+        """
+        from data.database import DB
+        from data.journal import Journal
+        self.stop_journal()
+        try:
+            journal = Journal(name)
+        except OSError:
+            self.notify("error", journal_in_use_error.format(name))
+            return
+        snapshot_name = name + "_snapshot"
+        snapshot_exists = DB().db_exists(snapshot_name)
+        if snapshot_exists and self.load_state(snapshot_name)["error"]:
+            journal.close()
+            self.notify("error", journal_snapshot_error.format(name))
+            return
+        replayed = 0
+        for entry in Journal.read(name):
+            self.replay_record(entry)
+            replayed += 1
+        self.journal = journal
+        self.snapshot_name = snapshot_name
+        if replayed or not snapshot_exists:
+            self.take_snapshot()
+        self.notify("info", journal_started_info.format(name, replayed))
+
+    def stop_journal(self):
+        """ This function stops journaling the changes to the dojo """
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+            self.snapshot_name = None
+
+    def replay_record(self, entry):
+        """
+        This function applies a journal entry to the dojo. The rooms
+        recorded are used instead of random allocation and entries that
+        are already part of the state are skipped.
+        """
+        operation = entry["op"]
+        person = self.get_person(entry["id"]) if "id" in entry else None
+        if operation == "reset":
+            self.reset()
+        elif operation == "add_room":
+            if not self.check_room_name_exist(entry["name"]):
+                room_mapping = {"office": Office, "livingspace": LivingSpace}
+                self.register_room(room_mapping[entry["type"]](entry["name"]))
+        elif operation == "add_person" and not person:
+            person = Fellow(entry["name"]) if entry["id"].startswith("F") \
+                else Staff(entry["name"])
+            person.id = entry["id"]
+            self.id_allocator.register(person.id)
+            person.office = self.get_room(entry["office"] or "")
+            self.assign_room(person, "office", person.office)
+            if entry["wants"]:
+                person.wants_accommodation = 1
+                person.livingspace = self.get_room(entry["livingspace"] or "")
+                self.assign_room(person, "livingspace", person.livingspace)
+            self.register_person(person)
+        elif operation == "move" and person:
+            room = self.get_room(entry["room"])
+            room_type = self.get_room_type(room) if room else None
+            if room and getattr(person, room_type) is not room:
+                self.relocate_person(person, room_type, room)
+        elif operation == "remove" and person:
+            self.discard_person(person)
@@ -0,0 +1,46 @@
+import random
+
+
+class RoomPool(object):
+    """
+    This class holds the rooms of a type that still have spare space.
+    Rooms are kept in a list with a room to position mapping so that
+    adding, removing and picking a random room are all constant-time.
+    """
+
+    def __init__(self, rooms=None):
+        self.rooms = []
+        self.positions = {}
+        for room in rooms or []:
+            self.add(room)
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def __iter__(self):
+        return iter(self.rooms)
+
+    def __contains__(self, room):
+        return room in self.positions
+
+    def add(self, room):
+        """ This function adds a room to the pool if not already there """
+        if room not in self.positions:
+            self.positions[room] = len(self.rooms)
+            self.rooms.append(room)
+
+    def discard(self, room):
+        """
+        This function removes a room from the pool by swapping it with
+        the last room in the list before popping it
+        """
+        index = self.positions.pop(room, None)
+        if index is not None:
+            last_room = self.rooms.pop()
+            if last_room is not room:
+                self.rooms[index] = last_room
+                self.positions[last_room] = index
+
+    def choice(self):
+        """ This function picks a random room or None if pool is empty """
+        return random.choice(self.rooms) if self.rooms else None
@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from docopt import docopt, DocoptExit
+
+from utils.command_parser import CommandParser
+
+usages = [
+    """Usage: create_room <room_type> <room_name>...  """,
+    """Usage: add_person <first_name> <last_name> (fellow | staff)"""
+    """ [<wants_accommodation>]""",
+    """Usage: save_state [--db=sqlite_database] [--incremental | --binary]""",
+    """
+    Usage:
+        autosave start <sqlite_database> [--interval=<seconds>]"""
+    """ [--changes=<count>]
+        autosave stop
+        autosave status
+    """,
+]
+
+
+class TestCommandParser(TestCase):
+    def assert_same_as_docopt(self, doc, argv):
+        try:
+            expected = docopt(doc, argv)
+        except DocoptExit as error:
+            with self.assertRaises(DocoptExit) as context:
+                CommandParser(doc).parse(argv)
+            self.assertEqual(str(context.exception), str(error))
+        else:
+            self.assertEqual(CommandParser(doc).parse(argv), expected)
+
+    def test_matches_docopt(self):
+        """ This function test the parser gives the values of docopt """
+        for doc, argv in [
+                (usages[0], "office Blue Green"),
+                (usages[0], "office"),
+                (usages[1], "Ada Obi fellow Y"),
+                (usages[1], "Ada Obi staff"),
+                (usages[1], "Ada fellow"),
+                (usages[2], "--db=pressure --binary"),
+                (usages[2], "--incremental --binary"),
+                (usages[2], "--unknown"),
+                (usages[3], "start pressure --changes=10"),
+                (usages[3], "status"),
+                (usages[3], "restart")]:
+            self.assert_same_as_docopt(doc, argv)
+
+    def test_parser_reused(self):
+        """ This function test a parser gives fresh values on every use """
+        parser = CommandParser(usages[0])
+        parser.parse("office Blue Green")["<room_name>"].append("Red")
+        self.assertEqual(parser.parse("office Black")["<room_name>"],
+                         ["Black"])
+        with self.assertRaises(DocoptExit):
+            parser.parse("")
+        self.assertEqual(parser.parse("livingspace Brown")["<room_type>"],
+                         "livingspace")
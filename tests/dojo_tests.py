@@ -1,18 +1,62 @@
+import gzip
+import json
+import sqlite3
 import sys
+import time
 import os
+import shutil
+import subprocess
+import tempfile
 from unittest import TestCase
 
+from data.backends import MemoryDB
+from data.database import DB, StorageBackend
+from rooms.console import ConsoleDojo
 from rooms.dojo import Dojo
 from persons.staffs import Staff
 from persons.fellows import Fellow
 from persons.persons import Person
+from rooms.livingspace import LivingSpace
+from utils import instrumentation
+from utils.people_file import parse_people_in_parallel
 import re
 ansi_escape = re.compile(r'\x1b[^m]*m')
+# the files the tests save in the data folder are named after the process
+# so that test runs can go on in parallel
+PRESSURE = "pressure_{}".format(os.getpid())
+CRASH = "crash_{}".format(os.getpid())
+REPORT = "report_{}".format(os.getpid())
+
+
+def temp_path(test, file_name):
+    """ This function gives a path in a temporary folder of the test """
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    return os.path.join(directory, file_name)
+
+
+def write_version_1_state(path):
+    """ This function writes a database of the original schema """
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE room_table (name TEXT, type TEXT, capacity TEXT);"
+        "CREATE TABLE person_table (id TEXT, name TEXT, "
+        "designation TEXT, office TEXT);"
+        "CREATE TABLE livingspace_table (ids TEXT, "
+        "wants_accommodation INTEGER, livingspace TEXT);"
+        "INSERT INTO room_table VALUES ('Hall', 'office', '10');"
+        "INSERT INTO room_table VALUES ('Den', 'livingspace', '4');"
+        "INSERT INTO person_table VALUES "
+        "('F-ABCDE', 'Ada Obi', 'fellow', 'Hall');"
+        "INSERT INTO person_table VALUES "
+        "('S-ABCDE', 'Bola Obi', 'staff', '');"
+        "INSERT INTO livingspace_table VALUES ('F-ABCDE', 1, 'Den');")
+    conn.close()
 
 
 class TestCreateRoom(TestCase):
     def setUp(self):
-        self.ndojo = Dojo()
+        self.ndojo = ConsoleDojo()
 
     def tearDown(self):
         self.ndojo.reset()
@@ -84,12 +128,12 @@ class TestCreateRoom(TestCase):
 
 class TestPrintFunctions(TestCase):
     def setUp(self):
-        self.ndojo = Dojo()
+        self.ndojo = ConsoleDojo()
 
     def tearDown(self):
         self.ndojo.reset()
-        if os.path.isfile("data/test_file.txt"):
-            os.remove("data/test_file.txt")
+        if os.path.isfile("data/{}.txt".format(REPORT)):
+            os.remove("data/{}.txt".format(REPORT))
 
     def test_print_rooms(self):
         """ This function test the printing of rooms currently available """
@@ -148,8 +192,8 @@ class TestPrintFunctions(TestCase):
         self.ndojo.create_room(["Blue"], "office")
         self.ndojo.add_person("Hassan El-Saheed", "fellow", "Y")
         self.ndojo.add_person("Mike Tyson", "staff")
-        self.ndojo.print_allocation("test_file")
-        file = open("data/test_file.txt", "r")
+        self.ndojo.print_allocation(REPORT)
+        file = open("data/{}.txt".format(REPORT), "r")
         names = file.readlines()
         file.close()
         self.assertEqual(names[3][:-1], "HASSAN EL-SAHEED, MIKE TYSON")
@@ -174,8 +218,8 @@ class TestPrintFunctions(TestCase):
     def test_print_unallocated_to_file(self):
         """ This function test the printing of unallocated persons to file"""
         self.ndojo.add_person("Mike Tyson", "staff")
-        self.ndojo.print_unallocated("test_file")
-        file = open("data/test_file.txt", "r")
+        self.ndojo.print_unallocated(REPORT)
+        file = open("data/{}.txt".format(REPORT), "r")
         names = file.readlines()
         file.close()
         self.assertEqual(names[3], "MIKE TYSON - NO OFFICE\n")
@@ -183,7 +227,7 @@ class TestPrintFunctions(TestCase):
 
 class TestAddPersons(TestCase):
     def setUp(self):
-        self.dojo = Dojo()
+        self.dojo = ConsoleDojo()
 
     def tearDown(self):
         self.dojo.reset()
@@ -253,10 +297,53 @@ class TestAddPersons(TestCase):
                          "Invalid option for accommodation, "
                          "availble options are; Y, N, Yes and No")
 
+    def test_get_person(self):
+        """ This function test retrieving a person by id """
+        new_staff = self.dojo.add_person("Andy Carroll", "staff")
+        new_fellow = self.dojo.add_person("Jeremy Johnson", "fellow", "Y")
+        self.assertIs(self.dojo.get_person(new_staff.id), new_staff)
+        self.assertIs(self.dojo.get_person(new_fellow.id.lower()),
+                      new_fellow)
+        self.assertIsNone(self.dojo.get_person("F-AAAAA"))
+
+    def test_add_people(self):
+        """ This function test adding many people in one pass """
+        self.dojo.create_room(["Blue"], "office")
+        result = self.dojo.add_people([
+            ("Andy Carroll", "staff"),
+            ("Jeremy Johnson", "fellow", "Y"),
+            ("Samora Dake", "type", "Y"),
+            ("Mike Tyson", "staff", "Y")])
+        self.assertEqual([person.name for person in result["added"]],
+                         ["Andy Carroll", "Jeremy Johnson"])
+        self.assertEqual([person.name for person in result["waitlisted"]],
+                         ["Jeremy Johnson"])
+        self.assertEqual(result["rejected"], [
+            (3, "Person cannot be created due to invalid designation!"),
+            (4, "Staff cannot request for a livingspace!")])
+        self.assertEqual(len(self.dojo.allocated["Blue"]), 2)
+        self.assertIs(self.dojo.get_person(result["added"][1].id),
+                      result["added"][1])
+
+    def test_add_people_bad_records(self):
+        """ This function test records of the wrong shape are rejected """
+        result = self.dojo.add_people([
+            ("Solo",),
+            ("Ada Obi", "fellow", None),
+            ("Bola Obi", "staff"),
+            "Chidi Obi staff",
+            ("Dayo Obi", "fellow", "N", "extra")])
+        self.assertEqual([person.name for person in result["added"]],
+                         ["Bola Obi"])
+        message = ("Person cannot be created, a name, a designation and an "
+                   "optional accommodation option must be supplied as text!")
+        self.assertEqual(result["rejected"], [
+            (1, message), (2, message), (4, message), (5, message)])
+
 
 class TestReallocate(TestCase):
     def setUp(self):
-        self.dojo = Dojo()
+        self.dojo = ConsoleDojo()
 
     def tearDown(self):
         self.dojo.reset()
@@ -405,22 +492,100 @@ class TestReallocate(TestCase):
             "The room selected is full")
 
 
+class TestRoomAvailability(TestCase):
+    def setUp(self):
+        self.dojo = ConsoleDojo()
+
+    def tearDown(self):
+        self.dojo.reset()
+
+    def test_full_room_leaves_available_rooms(self):
+        """ This function test that a full room is no longer available """
+        self.dojo.create_room(["Green"], "livingspace")
+        for name in ["Ada Obi", "Bola Obi", "Chidi Obi", "Dayo Obi"]:
+            self.dojo.add_person(name, "fellow", "Y")
+        self.assertEqual(list(self.dojo.available_rooms["livingspace"]), [])
+        new_fellow = self.dojo.add_person("Emeka Obi", "fellow", "Y")
+        self.assertIsNone(new_fellow.livingspace)
+        self.assertIn(new_fellow.id, self.dojo.unallocated["livingspace"])
+
+    def test_room_available_after_reallocation(self):
+        """ This function test that a room regains space on reallocation """
+        self.dojo.create_room(["Green"], "livingspace")
+        fellows = [self.dojo.add_person(name, "fellow", "Y") for name in
+                   ["Ada Obi", "Bola Obi", "Chidi Obi", "Dayo Obi"]]
+        self.dojo.create_room(["Brown"], "livingspace")
+        self.dojo.reallocate_person(fellows[0].id, "Brown")
+        available = [room.name for room in
+                     self.dojo.available_rooms["livingspace"]]
+        self.assertEqual(sorted(available), ["Brown", "Green"])
+
+
+class TestRoomIndex(TestCase):
+    def setUp(self):
+        self.dojo = ConsoleDojo()
+        self.dojo.create_room(["Blue"], "office")
+
+    def tearDown(self):
+        self.dojo.reset()
+        if MemoryDB().db_exists("pressure"):
+            MemoryDB().discard("pressure")
+
+    def test_room_lookup_ignores_case(self):
+        """ This function test rooms are found by name in any case """
+        room = self.dojo.get_room("Blue")
+        self.assertIs(self.dojo.get_room("bLUE"), room)
+        self.assertTrue(self.dojo.check_room_name_exist("BLUE"))
+        self.assertIsNone(self.dojo.get_room("Green"))
+        self.assertEqual(self.dojo.print_room("blue"),
+                         "BLUE\n" + "-" * 30 + "\nNo allocation for this room")
+
+    def test_duplicate_room_names(self):
+        """ This function test a name is only given to one room """
+        created = self.dojo.create_room(["Red", "red", "BLUE"], "livingspace")
+        self.assertEqual([room.name for room in created], ["Red"])
+        self.assertEqual(self.dojo.notices[-1].message,
+                         "The livingspace name 'Red' already existed."
+                         "The livingspace name 'Blue' already existed.")
+        self.assertIsInstance(self.dojo.get_room("red"), LivingSpace)
+        self.assertEqual(len(self.dojo.rooms_index), 2)
+
+    def test_room_lookup_after_removed_people(self):
+        """ This function test a room found by name frees removed people """
+        self.dojo.get_room("Blue").total_space = 1
+        staff = self.dojo.add_person("Ada Obi", "staff")
+        self.dojo.create_room(["Green"], "office")
+        other_staff = self.dojo.add_person("Bola Obi", "staff")
+        self.dojo.remove_person(staff.id)
+        self.assertEqual(self.dojo.print_room("Blue"),
+                         "BLUE\n" + "-" * 30 + "\n")
+        self.assertTrue(self.dojo.reallocate_person(other_staff.id, "blue"))
+        self.assertIs(other_staff.office, self.dojo.get_room("Blue"))
+
+    def test_room_index_after_reset_and_load(self):
+        """ This function test the index follows reset and load_state """
+        self.dojo.save_state("memory:pressure")
+        self.dojo.reset()
+        self.assertIsNone(self.dojo.get_room("Blue"))
+        self.dojo.load_state("memory:pressure")
+        self.assertIs(self.dojo.get_room("blue"), self.dojo.all_rooms[0])
+
+
 class TestLoadPeople(TestCase):
     def setUp(self):
-        self.dojo = Dojo()
+        self.dojo = ConsoleDojo()
+        self.people_file = temp_path(self, "people.txt")
 
     def tearDown(self):
         self.dojo.reset()
-        if os.path.isfile("data/people.txt"):
-            os.remove("data/people.txt")
 
     def test_file_empty(self):
         """ This function test if the file supplied is empty """
         file_content = ""
-        file = open("data/people.txt", "w")
+        file = open(self.people_file, "w")
         file.write(file_content.upper())
         file.close()
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(
@@ -432,10 +597,10 @@ class TestLoadPeople(TestCase):
         file_content = "OLUWAFEMI SULE FELLOW Y\n\
                         SIMON PATTERSON PIPER\n\
                         DOMINIC WALTERS STAFF Y\n"
-        file = open("data/people.txt", "w")
+        file = open(self.people_file, "w")
         file.write(file_content.upper())
         file.close()
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(
@@ -459,10 +624,10 @@ class TestLoadPeople(TestCase):
         file_content = "OLUWAFEMI SULE FELLOW Y\n\
                         DOMINIC WALTERS STAFF Y FREAK\n\
                         SIMON PATTERSON FELLOW Y\n"
-        file = open("data/people.txt", "w")
+        file = open(self.people_file, "w")
         file.write(file_content.upper())
         file.close()
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(
@@ -481,10 +646,10 @@ class TestLoadPeople(TestCase):
                         LEIGH RILEY STAFF\n\
                         TANA LOPEZ FELLOW Y\n\
                         KELLY McGUIRE STAFF"
-        file = open("data/people.txt", "w")
+        file = open(self.people_file, "w")
         file.write(file_content.upper())
         file.close()
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(
@@ -493,9 +658,87 @@ class TestLoadPeople(TestCase):
         self.assertEqual(len(self.dojo.staff_list), 3)
         self.assertEqual(len(self.dojo.fellow_list), 4)
 
+    def test_load_people_result(self):
+        """ This function test every line not loaded is returned """
+        with open(self.people_file, "w") as people_file:
+            people_file.write("OLUWAFEMI SULE FELLOW Y\n")
+            people_file.write("DOMINIC WALTERS STAFF Y\n" * 150)
+        result = self.dojo.load_people(self.people_file)
+        self.assertEqual(result["loaded"], 1)
+        self.assertIsNone(result["error"])
+        self.assertEqual(len(result["rejected"]), 150)
+        self.assertEqual(result["rejected"][-1], (
+            151, "line 151 was not loaded because of the above^^ reason"))
+        self.assertEqual(self.dojo.load_people("missing")["error"],
+                         "File not found")
+
+    def test_load_compressed_file_by_path(self):
+        """ This function test loading a gzip file from a path """
+        file = gzip.open(self.people_file + ".gz", "wt")
+        file.write("OLUWAFEMI SULE FELLOW Y\nDOMINIC WALTERS STAFF\n")
+        file.close()
+        self.dojo.load_people(self.people_file + ".gz")
+        os.remove(self.people_file + ".gz")
+        output = sys.stdout.getvalue().strip()
+        output = output.split("\n")
+        self.assertEqual(
+            ansi_escape.sub("", output[len(output) - 1]),
+            "Everyone on the list have been successfully loaded")
+        self.assertEqual(len(self.dojo.staff_list), 1)
+        self.assertEqual(len(self.dojo.fellow_list), 1)
+
+    def test_load_in_parallel(self):
+        """ This function test parallel loading reports the same lines """
+        file_content = "OLUWAFEMI SULE FELLOW Y\n\n\
+                        SIMON PATTERSON PIPER\n\
+                        DOMINIC WALTERS STAFF Y FREAK\n\
+                        DOMINIC WALTERS STAFF Y\n\
+                        LEIGH RILEY STAFF\n"
+        file = open(self.people_file, "w")
+        file.write(file_content.upper())
+        file.close()
+        self.dojo.load_people(self.people_file)
+        sequential_output = sys.stdout.getvalue()
+        self.dojo.load_people(self.people_file, workers=2)
+        parallel_output = sys.stdout.getvalue()[len(sequential_output):]
+        self.assertEqual(parallel_output, sequential_output)
+        self.assertEqual(len(self.dojo.staff_list), 2)
+        self.assertEqual(len(self.dojo.fellow_list), 2)
+
+    def test_parse_people_in_chunks(self):
+        """ This function test line numbers across parsed chunks """
+        file = open(self.people_file, "w")
+        file.write("OLUWAFEMI SULE FELLOW Y\n\nSIMON PATTERSON\n"
+                   "LEIGH RILEY STAFF")
+        file.close()
+        entries = list(parse_people_in_parallel(self.people_file, 2, 1))
+        self.assertEqual(entries, [
+            (1, "person", ("OLUWAFEMI SULE", "FELLOW", "Y")),
+            (3, "parameters", None),
+            (4, "person", ("LEIGH RILEY", "STAFF", "N")),
+            (4, None, None)])
+
+    def test_parallel_load_decodes_like_serial_load(self):
+        """ This function test both loads read the same names """
+        with open(self.people_file, "w", encoding="utf-8") as people_file:
+            people_file.write("ÀDÁ ÒBÍ FELLOW Y\nŞULE ÖZİL STAFF\n" * 5)
+        self.dojo.load_people(self.people_file)
+        serial_names = [person.name for person in
+                        self.dojo.staff_list + self.dojo.fellow_list]
+        self.dojo.reset()
+        entries = list(parse_people_in_parallel(self.people_file, 1, 1))
+        self.assertEqual(entries[-1], (11, None, None))
+        self.assertEqual([line for line, _, _ in entries[:-1]],
+                         list(range(1, 11)))
+        self.dojo.load_people(self.people_file, workers=2)
+        self.assertEqual([person.name for person in
+                          self.dojo.staff_list + self.dojo.fellow_list],
+                         serial_names)
+        self.assertIn("ÀDÁ ÒBÍ", serial_names)
+
     def test_file_exist(self):
         """ This function test file existing or not"""
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
@@ -504,7 +747,8 @@ class TestLoadPeople(TestCase):
 
 class TestDatabase(TestCase):
     def setUp(self):
-        self.dojo = Dojo()
+        self.dojo = ConsoleDojo()
+        self.people_file = temp_path(self, "people.txt")
         self.dojo.create_room(["Blue", "Green"], "office")
         self.dojo.create_room(["Black", "Brown"], "livingspace")
         file_content = "OLUWAFEMI SULE FELLOW Y\n\
@@ -514,26 +758,30 @@ class TestDatabase(TestCase):
                         LEIGH RILEY STAFF\n\
                         TANA LOPEZ FELLOW Y\n\
                         KELLY McGUIRE STAFF"
-        file = open("data/people.txt", "w")
+        file = open(self.people_file, "w")
         file.write(file_content.upper())
         file.close()
-        self.dojo.load_people("people")
+        self.dojo.load_people(self.people_file)
 
     def tearDown(self):
         self.dojo.reset()
-        if os.path.isfile("data/pressure.sqlite"):
-            os.remove("data/pressure.sqlite")
+        for suffix in [".sqlite", ".sqlite-wal", ".sqlite-shm",
+                       ".sqlite.v1.bak", ".dojo"]:
+            if os.path.isfile("data/" + PRESSURE + suffix):
+                os.remove("data/" + PRESSURE + suffix)
+        if MemoryDB().db_exists("pressure"):
+            MemoryDB().discard("pressure")
 
     def test_save_state_named(self):
         """ This function test saving state with the name supplied """
-        self.dojo.save_state("pressure")
+        self.dojo.save_state("memory:pressure")
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
                          "The state has been "
-                         "successfully saved in pressure.sqlite")
-        self.assertTrue(os.path.isfile("data/pressure.sqlite"))
-        self.dojo.save_state("pressure")
+                         "successfully saved in memory:pressure")
+        self.assertFalse(os.path.isfile("data/{}.sqlite".format(PRESSURE)))
+        self.dojo.save_state("memory:pressure")
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
@@ -542,16 +790,16 @@ class TestDatabase(TestCase):
 
     def test_save_state_unnamed(self):
         """ This function test saving state with the name generated """
-        self.dojo.save_state("")
+        self.dojo.save_state("memory:")
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertGreaterEqual(ansi_escape.sub("", output[len(output) - 1]),
                                 "The state has " +
-                                "been successfully saved in 2017.sqlite")
+                                "been successfully saved in memory:2017")
 
     def test_load_state_file_not_exist(self):
         """ This function test if the file supplied exist """
-        self.dojo.load_state("pressure")
+        self.dojo.load_state("memory:pressure")
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
@@ -562,15 +810,744 @@ class TestDatabase(TestCase):
         This function test if the load state is successful
         when file exist
         """
-        self.dojo.save_state("pressure")
+        self.dojo.save_state("memory:pressure")
         self.dojo.reset()
-        self.dojo.load_state("pressure")
+        self.dojo.load_state("memory:pressure")
         output = sys.stdout.getvalue().strip()
         output = output.split("\n")
         self.assertEqual(
             ansi_escape.sub("", output[len(output) - 1]),
-            "Data in pressure.sqlite have been successfully loaded")
+            "Data in memory:pressure have been successfully loaded")
         self.assertEqual(len(self.dojo.staff_list), 3)
         self.assertEqual(len(self.dojo.fellow_list), 4)
         self.assertEqual(len(self.dojo.all_rooms), 4)
         self.assertTrue("Green" in [room.name for room in self.dojo.all_rooms])
+
+    def test_results_of_saves_and_loads(self):
+        """ This function test saves and loads return their results """
+        result = self.dojo.save_state("memory:pressure")
+        self.assertEqual(result, {"rows": 11, "location": "memory:pressure",
+                                  "error": None})
+        self.assertEqual(len(self.dojo.notices), 0)
+        result = self.dojo.save_state("memory:pressure")
+        self.assertEqual(result["rows"], 0)
+        self.assertEqual(result["error"], "Database name already existed! "
+                         "Kindly choose another name.")
+        self.assertEqual(self.dojo.notices[-1].level, "error")
+        self.assertEqual(self.dojo.load_state("memory:pressure"), {
+            "rows": 11, "location": "memory:pressure", "error": None})
+        self.assertEqual(self.dojo.load_state("memory:missing")["error"],
+                         "File not found")
+        self.assertEqual(self.dojo.save_state("jsonl:" + PRESSURE,
+                                              incremental=True)["error"],
+                         "{}.jsonl cannot be used for incremental "
+                         "saves".format(PRESSURE))
+
+    def test_load_state_unreadable(self):
+        """ This function test a file that cannot be loaded changes nothing """
+        with open("data/{}.sqlite".format(PRESSURE), "w") as state_file:
+            state_file.write("not a database")
+        for lazy in [False, True]:
+            result = self.dojo.load_state(PRESSURE, lazy=lazy)
+            self.assertEqual(result["error"], "{}.sqlite could not be "
+                             "loaded: file is not a database".format(PRESSURE))
+        os.remove("data/{}.sqlite".format(PRESSURE))
+        conn = sqlite3.connect("data/{}.sqlite".format(PRESSURE))
+        conn.execute("PRAGMA user_version = 99")
+        conn.close()
+        self.assertIn("schema version 99 is newer",
+                      self.dojo.load_state(PRESSURE)["error"])
+        self.assertEqual(len(self.dojo.all_rooms), 4)
+        self.assertEqual(len(self.dojo.staff_list), 3)
+
+    def test_load_state_without_saved_state(self):
+        """ This function test empty and foreign databases are not loaded """
+        path = "data/{}.sqlite".format(PRESSURE)
+        open(path, "w").close()
+        for lazy in [False, True]:
+            result = self.dojo.load_state(PRESSURE, lazy=lazy)
+            self.assertEqual(result["error"], "{}.sqlite could not be "
+                             "loaded: the file holds no saved state".format(
+                                 PRESSURE))
+        self.assertEqual(os.path.getsize(path), 0)
+        os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE foo (bar TEXT)")
+        conn.close()
+        result = self.dojo.load_state(PRESSURE)
+        self.assertEqual(result["error"], "{}.sqlite could not be loaded: "
+                         "the file holds no saved state".format(PRESSURE))
+        self.assertEqual(result["rows"], 0)
+        conn = sqlite3.connect(path)
+        self.assertEqual(conn.execute(
+            "SELECT name FROM sqlite_master").fetchall(), [("foo",)])
+        conn.close()
+        self.assertEqual(len(self.dojo.all_rooms), 4)
+        self.assertEqual(len(self.dojo.staff_list), 3)
+
+    def test_load_state_leaves_file(self):
+        """ This function test a plain load does not write to the file """
+        self.dojo.save_state(PRESSURE)
+        with open("data/{}.sqlite".format(PRESSURE), "rb") as state_file:
+            saved = state_file.read()
+        self.assertEqual(self.dojo.load_state(PRESSURE)["rows"], 11)
+        with open("data/{}.sqlite".format(PRESSURE), "rb") as state_file:
+            self.assertEqual(state_file.read(), saved)
+        self.assertFalse(os.path.isfile("data/{}.sqlite-wal".format(PRESSURE)))
+
+    def test_save_state_quoted_name(self):
+        """ This function test saving a name containing quotes """
+        self.dojo.add_person("Shaquille O'Neal", "staff")
+        self.dojo.save_state("memory:pressure")
+        output = sys.stdout.getvalue().strip()
+        output = output.split("\n")
+        self.assertRegex(ansi_escape.sub("", output[len(output) - 2]),
+                         r"^12 rows saved in .* rows/sec\)$")
+        self.dojo.load_state("memory:pressure")
+        self.assertIn("Shaquille O'Neal",
+                      [person.name for person in self.dojo.staff_list])
+
+    def test_load_state_allocations(self):
+        """ This function test allocations are rebuilt on load state """
+        for name in ["Ada Obi", "Bola Obi", "Chidi Obi", "Dayo Obi",
+                     "Emeka Obi"]:
+            self.dojo.add_person(name, "fellow", "Y")
+        allocated = {room: sorted(person.id for person in people)
+                     for room, people in self.dojo.allocated.items()}
+        waitlist = list(self.dojo.unallocated["livingspace"])
+        self.assertEqual(len(waitlist), 1)
+        self.dojo.save_state("memory:pressure")
+        self.dojo.load_state("memory:pressure")
+        self.assertEqual(
+            {room: sorted(person.id for person in people)
+             for room, people in self.dojo.allocated.items()}, allocated)
+        self.assertEqual(list(self.dojo.unallocated["livingspace"]),
+                         waitlist)
+        self.assertIs(self.dojo.get_person(waitlist[0]).livingspace, None)
+
+    def test_save_state_incremental(self):
+        """ This function test saving only the changes since last save """
+        self.dojo.save_state("memory:pressure", incremental=True)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertTrue(ansi_escape.sub("", output[len(output) - 2])
+                        .startswith("11 changed rows saved"))
+        staff = self.dojo.staff_list[0]
+        fellow = self.dojo.fellow_list[0]
+        new_office = "Green" if staff.office.name == "Blue" else "Blue"
+        self.dojo.reallocate_person(staff.id, new_office)
+        self.dojo.remove_person(fellow.id)
+        self.dojo.save_state("memory:pressure", incremental=True)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertTrue(ansi_escape.sub("", output[len(output) - 2])
+                        .startswith("1 changed rows saved"))
+        self.dojo.load_state("memory:pressure")
+        self.assertEqual(self.dojo.get_person(staff.id).office.name,
+                         new_office)
+        self.assertIsNone(self.dojo.get_person(fellow.id))
+        self.assertEqual(len(self.dojo.fellow_list), 3)
+
+    def test_save_state_incremental_without_upsert(self):
+        """ This function test incremental saves on SQLite before 3.24 """
+        self.addCleanup(setattr, DB, "supports_upsert", DB.supports_upsert)
+        DB.supports_upsert = False
+        self.dojo.save_state(PRESSURE, incremental=True)
+        staff = self.dojo.staff_list[0]
+        self.dojo.create_room(["Purple"], "office")
+        self.dojo.reallocate_person(staff.id, "Purple")
+        livingspace = self.dojo.fellow_list[0].livingspace.name
+        self.dojo.get_room(livingspace).total_space = 6
+        self.dojo.dirty_rooms[livingspace] = None
+        people = [person.id for person in
+                  self.dojo.staff_list + self.dojo.fellow_list]
+        occupants = sorted(person.id for person in
+                           self.dojo.allocated[livingspace])
+        self.assertIsNone(self.dojo.save_state(
+            PRESSURE, incremental=True)["error"])
+        conn = sqlite3.connect("data/{}.sqlite".format(PRESSURE))
+        self.assertEqual(
+            conn.execute("SELECT name FROM rooms ORDER BY id").fetchall(),
+            [("Blue",), ("Green",), ("Black",), ("Brown",), ("Purple",)])
+        conn.close()
+        self.dojo.load_state(PRESSURE)
+        self.assertEqual(self.dojo.get_person(staff.id).office.name,
+                         "Purple")
+        self.assertEqual(self.dojo.get_room(livingspace).total_space, 6)
+        self.assertEqual(sorted(person.id for person in
+                                self.dojo.allocated[livingspace]), occupants)
+        self.assertEqual([person.id for person in
+                          self.dojo.staff_list + self.dojo.fellow_list],
+                         people)
+
+    def test_incremental_save_keeps_other_databases(self):
+        """ This function test databases of other sessions are not rewritten """
+        other = ConsoleDojo()
+        other.create_room(["Hall"], "office")
+        other.save_state(PRESSURE)
+        message = ("{}.sqlite already existed and was not saved or loaded "
+                   "in this session! Kindly choose another name.".format(
+                       PRESSURE))
+        self.assertEqual(self.dojo.save_state(
+            PRESSURE, incremental=True)["error"], message)
+        self.dojo.start_autosave(PRESSURE)
+        self.assertIsNone(self.dojo.autosaver)
+        self.assertEqual(self.dojo.notices[-1].message, message)
+        self.assertIsNone(other.save_state(
+            PRESSURE, incremental=True)["error"])
+        self.dojo.load_state(PRESSURE)
+        self.assertEqual([room.name for room in self.dojo.all_rooms],
+                         ["Hall"])
+        self.dojo.create_room(["Blue"], "office")
+        self.assertIsNone(self.dojo.save_state(
+            PRESSURE, incremental=True)["error"])
+        other.reset()
+
+    def test_binary_state(self):
+        """ This function test saving and loading a binary snapshot """
+        self.dojo.add_person("Shaquille O'Neal", "staff")
+        state = (sorted((room.name, room.total_space)
+                        for room in self.dojo.all_rooms),
+                 sorted((person.id, person.name,
+                         person.office.name if person.office else None)
+                        for person in self.dojo.staff_list))
+        self.dojo.save_state(PRESSURE, binary=True)
+        self.dojo.reset()
+        self.dojo.load_state(PRESSURE, binary=True)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "Data in {}.dojo have been successfully "
+                         "loaded".format(PRESSURE))
+        self.assertEqual((sorted((room.name, room.total_space)
+                                 for room in self.dojo.all_rooms),
+                          sorted((person.id, person.name,
+                                  person.office.name if person.office
+                                  else None)
+                                 for person in self.dojo.staff_list)), state)
+        self.assertEqual(len(self.dojo.fellow_list), 4)
+
+    def test_binary_state_corrupted(self):
+        """ This function test loading a corrupted binary snapshot """
+        self.dojo.save_state(PRESSURE, binary=True)
+        with open("data/{}.dojo".format(PRESSURE), "r+b") as snapshot_file:
+            snapshot_file.seek(-3, 2)
+            snapshot_file.write(b"XYZ")
+        self.dojo.load_state(PRESSURE, binary=True)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "data/{}.dojo is corrupted".format(PRESSURE))
+        self.assertEqual(len(self.dojo.staff_list), 3)
+        for length in [9, 0]:
+            with open("data/{}.dojo".format(PRESSURE), "r+b") as snapshot_file:
+                snapshot_file.truncate(length)
+            self.assertEqual(
+                self.dojo.load_state(PRESSURE, binary=True)["error"],
+                "data/{}.dojo is corrupted".format(PRESSURE))
+        self.assertEqual(len(self.dojo.staff_list), 3)
+
+    def test_binary_state_checks_ids(self):
+        """ This function test ids the snapshot cannot hold are refused """
+        for person_id in ["S-ABC", "S-ÀBCDE"]:
+            self.dojo.staff_list[0].id = person_id
+            result = self.dojo.save_state(PRESSURE, binary=True)
+            self.assertEqual(result["error"], "The id {} cannot be saved in "
+                             "a snapshot, ids must be 7 ascii "
+                             "characters".format(person_id))
+            self.assertFalse(
+                os.path.isfile("data/{}.dojo".format(PRESSURE)))
+
+    def test_load_state_lazy(self):
+        """ This function test loading a state lazily and writing back """
+        self.dojo.save_state("memory:pressure")
+        staff = self.dojo.staff_list[0]
+        new_office = "Green" if staff.office.name == "Blue" else "Blue"
+        occupants = len(self.dojo.allocated[new_office])
+        self.dojo.load_state("memory:pressure", lazy=True)
+        self.assertEqual(len(self.dojo.all_rooms), 4)
+        self.assertEqual(len(self.dojo.staff_list), 3)
+        self.assertEqual(len(self.dojo.allocated[new_office]), occupants)
+        self.dojo.reallocate_person(staff.id, new_office)
+        self.assertEqual(len(self.dojo.allocated[new_office]), occupants + 1)
+        self.assertIn(staff.id, [person.id for person in
+                                 self.dojo.allocated[new_office]])
+        new_fellow = self.dojo.add_person("Ada Obi", "fellow", "Y")
+        self.dojo.reset()
+        self.dojo.load_state("memory:pressure")
+        self.assertEqual(self.dojo.get_person(staff.id).office.name,
+                         new_office)
+        self.assertEqual(self.dojo.get_person(new_fellow.id).name, "Ada Obi")
+        self.assertEqual(len(self.dojo.fellow_list), 5)
+
+    def test_load_state_lazy_writes_in_wal_mode(self):
+        """ This function test lazy writes go through the WAL log """
+        self.dojo.save_state(PRESSURE)
+        self.dojo.load_state(PRESSURE, lazy=True)
+        for person_name, journal_mode in [("Ada Obi", "delete"),
+                                          ("Bola Obi", "wal")]:
+            conn = sqlite3.connect("data/{}.sqlite".format(PRESSURE))
+            self.assertEqual(conn.execute(
+                "PRAGMA journal_mode").fetchone()[0], journal_mode)
+            conn.close()
+            self.dojo.add_person(person_name, "staff")
+        self.dojo.reset()
+        self.dojo.load_state(PRESSURE)
+        self.assertEqual(len(self.dojo.staff_list), 5)
+
+    def test_load_state_lazy_retires_removed_ids(self):
+        """ This function test ids removed lazily are not issued again """
+        self.dojo.save_state("memory:pressure")
+        staff_id = self.dojo.staff_list[0].id
+        self.dojo.load_state("memory:pressure", lazy=True)
+        self.assertEqual(self.dojo.id_allocator.count_used("S"), 3)
+        self.dojo.remove_person(staff_id)
+        self.assertNotIn(staff_id, self.dojo.people)
+        self.assertIn(staff_id, self.dojo.id_allocator.issued["S"])
+        self.assertEqual(self.dojo.id_allocator.count_used("S"), 3)
+
+    def test_print_reports_from_saved_state(self):
+        """ This function test printing reports of a saved database """
+        self.dojo.save_state(PRESSURE)
+        staff = self.dojo.staff_list[0]
+        reports = []
+        for dojo, db_name in [(self.dojo, None), (ConsoleDojo(), PRESSURE)]:
+            start = len(sys.stdout.getvalue())
+            dojo.print_room(staff.office.name, db_name)
+            dojo.print_allocation(None, db_name)
+            dojo.print_unallocated(None, db_name)
+            output = ansi_escape.sub("", sys.stdout.getvalue()[start:])
+            reports.append(sorted(", ".join(sorted(line.split(", ")))
+                                  for line in output.split("\n")))
+        self.assertEqual(reports[0], reports[1])
+        self.assertEqual(len(dojo.all_rooms), 0)
+        self.assertIn(staff.name.upper(), reports[1])
+
+    def test_print_reports_from_old_schema(self):
+        """ This function test reports of the original schema read only """
+        path = "data/{}.sqlite".format(PRESSURE)
+        write_version_1_state(path)
+        with open(path, "rb") as state_file:
+            saved = state_file.read()
+        self.dojo.reset()
+        self.dojo.create_room(["Blue"], "office")
+        self.assertEqual(self.dojo.print_room("Hall", PRESSURE),
+                         "HALL\n" + "-" * 30 + "\nADA OBI")
+        self.assertEqual(self.dojo.print_allocation(None, PRESSURE), 2)
+        self.assertEqual(self.dojo.print_unallocated(None, PRESSURE), 1)
+        self.assertEqual(self.dojo.notices, [])
+        with open(path, "rb") as state_file:
+            self.assertEqual(state_file.read(), saved)
+        self.assertEqual([room.name for room in self.dojo.all_rooms],
+                         ["Blue"])
+
+    def test_print_reports_from_unreadable_state(self):
+        """ This function test reports of a file that cannot be read """
+        with open("data/{}.sqlite".format(PRESSURE), "w") as state_file:
+            state_file.write("not a database")
+        self.assertEqual(self.dojo.print_room("Blue", PRESSURE), "")
+        self.assertEqual(self.dojo.print_allocation(None, PRESSURE), 0)
+        self.assertEqual(self.dojo.notices[-1].message, "{}.sqlite cannot "
+                         "be read: file is not a database".format(PRESSURE))
+        os.remove("data/{}.sqlite".format(PRESSURE))
+        conn = sqlite3.connect("data/{}.sqlite".format(PRESSURE))
+        conn.execute("PRAGMA user_version = 99")
+        conn.close()
+        self.assertEqual(self.dojo.print_unallocated(None, PRESSURE), 0)
+        self.assertEqual(self.dojo.notices[-1].message, "{}.sqlite cannot "
+                         "be read: schema version 99 is newer than this "
+                         "application supports".format(PRESSURE))
+
+    def test_save_state_name_claimed_once(self):
+        """ This function test only one session can claim a name """
+        self.assertTrue(DB().claim(PRESSURE))
+        self.assertFalse(DB().claim(PRESSURE))
+        self.dojo.save_state(PRESSURE)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "Database name already existed! "
+                         "Kindly choose another name.")
+
+    def test_lock_keeps_sqlite_locks(self):
+        """ This function test the lock leaves a write transaction held """
+        self.dojo.save_state(PRESSURE)
+        conn = DB().connect(PRESSURE)
+        conn.execute("BEGIN IMMEDIATE")
+        with DB().lock(PRESSURE):
+            pass
+        other_writer = subprocess.run(
+            [sys.executable, "-c", "import sqlite3\n"
+             "conn = sqlite3.connect('data/{}.sqlite', timeout=0, "
+             "isolation_level=None)\n"
+             "conn.execute('BEGIN IMMEDIATE')".format(PRESSURE)],
+            stderr=subprocess.PIPE, universal_newlines=True)
+        conn.execute("ROLLBACK")
+        conn.close()
+        self.assertNotEqual(other_writer.returncode, 0)
+        self.assertIn("database is locked", other_writer.stderr)
+
+    def test_autosave(self):
+        """ This function test the autosave writes the changes on stop """
+        self.dojo.start_autosave("memory:pressure", 3600)
+        new_staff = self.dojo.add_person("Ada Obi", "staff")
+        autosaver = self.dojo.stop_autosave()
+        self.assertEqual((autosaver.save_count, autosaver.last_rows), (1, 12))
+        self.dojo.load_state("memory:pressure")
+        self.assertEqual(self.dojo.get_person(new_staff.id).name, "Ada Obi")
+
+    def test_autosave_after_changes(self):
+        """ This function test the autosave runs after enough changes """
+        self.dojo.start_autosave("memory:pressure", 3600, 1)
+        self.dojo.add_person("Ada Obi", "staff")
+        autosaver = self.dojo.autosaver
+        for _ in range(500):
+            if autosaver.save_count:
+                break
+            time.sleep(0.01)
+        self.dojo.print_autosave_status()
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertRegex(ansi_escape.sub("", output[len(output) - 1]),
+                         r"^Last autosave at .* for 12 rows, 1 autosaves")
+        self.dojo.stop_autosave()
+
+    def test_autosave_keeps_direct_changes(self):
+        """ This function test no change made outside a command is lost """
+        dojo = Dojo()
+        dojo.start_autosave("memory:pressure", 3600, 1)
+        for number in range(20000):
+            dojo.add_person("Staff {}".format(number), "staff")
+        autosaver = dojo.stop_autosave()
+        self.assertGreater(autosaver.save_count, 1)
+        self.assertEqual(dojo.load_state("memory:pressure")["rows"], 20000)
+
+    def test_autosave_lazy_state(self):
+        """ This function test the autosave of a state loaded lazily """
+        self.dojo.save_state("memory:pressure")
+        self.dojo.load_state("memory:pressure", lazy=True)
+        self.dojo.start_autosave("memory:autosaved", 3600, 1)
+        new_staff = self.dojo.add_person("Ada Obi", "staff")
+        autosaver = self.dojo.autosaver
+        for _ in range(500):
+            if autosaver.save_count or not autosaver.is_running():
+                break
+            time.sleep(0.01)
+        self.assertEqual((autosaver.save_count, autosaver.last_error),
+                         (1, None))
+        self.dojo.stop_autosave()
+        self.dojo.reset()
+        self.dojo.load_state("memory:autosaved")
+        self.assertEqual(self.dojo.get_person(new_staff.id).name, "Ada Obi")
+        MemoryDB().discard("autosaved")
+
+    def test_autosave_error_shown(self):
+        """ This function test an error ending the autosave is shown """
+        self.dojo.start_autosave("memory:pressure", 3600, 1)
+        autosaver = self.dojo.autosaver
+
+        def fail():
+            raise RuntimeError("disk gone")
+        autosaver.take_snapshot_when_free = fail
+        self.dojo.add_person("Ada Obi", "staff")
+        autosaver.thread.join(5)
+        self.dojo.print_autosave_status()
+        self.assertEqual(self.dojo.notices[-1].level, "error")
+        self.assertIn("disk gone", self.dojo.notices[-1].message)
+        self.dojo.stop_autosave()
+
+    def test_load_state_migrates_old_schema(self):
+        """ This function test loading a database of the original schema """
+        write_version_1_state("data/{}.sqlite".format(PRESSURE))
+        self.dojo.load_state(PRESSURE)
+        self.assertEqual(self.dojo.get_room("Hall").total_space, 10)
+        fellow = self.dojo.get_person("F-ABCDE")
+        self.assertEqual((fellow.office.name, fellow.livingspace.name),
+                         ("Hall", "Den"))
+        self.assertIsNone(self.dojo.get_person("S-ABCDE").office)
+        conn = sqlite3.connect("data/{}.sqlite".format(PRESSURE))
+        self.assertEqual(
+            conn.execute("PRAGMA user_version").fetchone()[0], 2)
+        conn.close()
+        backup = sqlite3.connect("data/{}.sqlite.v1.bak".format(PRESSURE))
+        self.assertEqual(
+            backup.execute("SELECT name FROM room_table").fetchall(),
+            [("Hall",), ("Den",)])
+        backup.close()
+
+
+class TestBackends(TestCase):
+    def setUp(self):
+        self.dojo = ConsoleDojo()
+        self.dojo.create_room(["Blue"], "office")
+        self.dojo.create_room(["Black"], "livingspace")
+        self.dojo.get_room("Blue").total_space = 10
+        self.dojo.add_person("Ada Obi", "fellow", "Y")
+        self.dojo.add_person("Bola Obi", "staff")
+
+    def tearDown(self):
+        if MemoryDB().db_exists("pressure"):
+            MemoryDB().discard("pressure")
+        if os.path.isfile("data/{}.jsonl".format(PRESSURE)):
+            os.remove("data/{}.jsonl".format(PRESSURE))
+
+    def get_state(self, dojo):
+        return (sorted((room.name, room.total_space)
+                       for room in dojo.all_rooms),
+                sorted((person.id, person.name, person.office.name)
+                       for person in dojo.staff_list + dojo.fellow_list),
+                dojo.fellow_list[0].livingspace.name)
+
+    def test_memory_backend(self):
+        """ This function test saving and loading a state in memory """
+        self.dojo.save_state("memory:pressure")
+        self.assertFalse(os.path.isfile("data/{}.sqlite".format(PRESSURE)))
+        new_dojo = ConsoleDojo()
+        new_dojo.load_state("memory:pressure")
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "Data in memory:pressure have been successfully "
+                         "loaded")
+        self.assertEqual(self.get_state(new_dojo), self.get_state(self.dojo))
+
+    def test_jsonl_backend(self):
+        """ This function test saving and loading a JSON-lines state """
+        self.dojo.save_state("jsonl:" + PRESSURE)
+        self.assertTrue(os.path.isfile("data/{}.jsonl".format(PRESSURE)))
+        new_dojo = ConsoleDojo()
+        new_dojo.load_state("jsonl:" + PRESSURE)
+        self.assertEqual(self.get_state(new_dojo), self.get_state(self.dojo))
+
+    def test_incomplete_backend(self):
+        """ This function test a backend missing methods cannot be made """
+        class NoLoadDB(StorageBackend):
+            def db_exists(self, db_name):
+                return False
+
+            claim = discard = lock = save_state = db_exists
+
+        with self.assertRaises(TypeError):
+            NoLoadDB()
+
+    def test_backend_names_resolved(self):
+        """ This function test saves resolve the backend of the name """
+        self.dojo.save_state("memory:pressure")
+        self.dojo.load_state("memory:pressure")
+        new_staff = self.dojo.add_person("Chidi Obi", "staff")
+        self.dojo.save_state("memory:pressure", incremental=True)
+        new_dojo = ConsoleDojo()
+        new_dojo.load_state("memory:pressure", lazy=True)
+        self.assertEqual(new_dojo.get_person(new_staff.id).name, "Chidi Obi")
+        self.assertEqual(len(new_dojo.all_rooms), 2)
+        self.assertFalse(os.path.isfile("data/memory:pressure.sqlite"))
+        new_dojo.reset()
+        for kwargs in [{"incremental": True}, {"binary": True}]:
+            self.dojo.save_state("jsonl:" + PRESSURE, **kwargs)
+        self.assertEqual([notice.message for notice in self.dojo.notices][-2:],
+                         ["{}.jsonl cannot be used for incremental "
+                          "saves".format(PRESSURE), "{}.jsonl cannot be used "
+                          "for binary snapshots".format(PRESSURE)])
+        self.assertFalse(os.path.isfile("data/{}.jsonl".format(PRESSURE)))
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.dojo = ConsoleDojo()
+        instrumentation.reset()
+        instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_calls_recorded(self):
+        """ This function test the calls of instrumented methods """
+        self.dojo.create_room(["Blue"], "office")
+        self.dojo.add_person("Ada Obi", "staff")
+        self.dojo.add_person("Bola Obi", "staff")
+        renders = instrumentation.histograms["render"].count
+        self.assertGreater(renders, 0)
+        self.dojo.print_allocation()
+        self.assertGreater(instrumentation.histograms["render"].count,
+                           renders)
+        self.dojo.save_state("memory:pressure")
+        self.assertEqual(instrumentation.histograms["Dojo.save_state"].count,
+                         1)
+        MemoryDB().discard("pressure")
+        instrumentation.disable()
+        self.dojo.add_person("Chidi Obi", "staff")
+        self.assertEqual(instrumentation.histograms["Dojo.add_person"].count,
+                         2)
+        self.assertIn("Dojo.create_room", instrumentation.format_stats())
+        stats_path = temp_path(self, "stats.json")
+        instrumentation.dump_stats(stats_path)
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual(len(stats["Dojo.add_person"]["samples"]), 2)
+
+
+class TestJournal(TestCase):
+    def setUp(self):
+        self.dojo = ConsoleDojo()
+        self.dojo.start_journal(CRASH)
+
+    def tearDown(self):
+        self.dojo.stop_journal()
+        self.dojo.reset()
+        if MemoryDB().db_exists("other"):
+            MemoryDB().discard("other")
+        for suffix in [".journal", "_snapshot.sqlite",
+                       "_snapshot.sqlite-wal", "_snapshot.sqlite-shm"]:
+            if os.path.isfile("data/" + CRASH + suffix):
+                os.remove("data/" + CRASH + suffix)
+
+    def get_state(self, dojo):
+        """ This function gets the rooms, people and allocations of dojo """
+        return (
+            sorted(room.name for room in dojo.all_rooms),
+            sorted((person.id, person.name) for person in
+                   dojo.staff_list + dojo.fellow_list),
+            {room: sorted(person.id for person in people)
+             for room, people in dojo.allocated.items() if people},
+            {key: list(ids) for key, ids in dojo.unallocated.items()})
+
+    def make_changes(self):
+        self.dojo.create_room(["Blue", "Green"], "office")
+        self.dojo.create_room(["Black"], "livingspace")
+        for name in ["Ada Obi", "Bola Obi", "Chidi Obi", "Dayo Obi",
+                     "Emeka Obi"]:
+            self.dojo.add_person(name, "fellow", "Y")
+        staff = self.dojo.add_person("Andy Carroll", "staff")
+        new_office = "Green" if staff.office.name == "Blue" else "Blue"
+        self.dojo.reallocate_person(staff.id, new_office)
+        self.dojo.remove_person(self.dojo.fellow_list[0].id)
+
+    def test_replay_journal(self):
+        """ This function test recovering state from the journal alone """
+        self.make_changes()
+        self.dojo.journal.close()
+        recovered = ConsoleDojo()
+        recovered.start_journal(CRASH)
+        self.assertEqual(self.get_state(recovered),
+                         self.get_state(self.dojo))
+        recovered.stop_journal()
+
+    def test_journal_in_use(self):
+        """ This function test a journal is not shared between sessions """
+        other = ConsoleDojo()
+        other.start_journal(CRASH)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "{}.journal is in use by another "
+                         "session".format(CRASH))
+        self.assertIsNone(other.journal)
+
+    def test_snapshot_keeps_order(self):
+        """ This function test people and waitlists keep their order """
+        self.dojo.create_room(["Blue", "Green"], "office")
+        fellows = [self.dojo.add_person(name, "fellow", "Y") for name in
+                   ["Ada Obi", "Bola Obi", "Chidi Obi", "Dayo Obi",
+                    "Emeka Obi", "Femi Obi", "Gbenga Obi", "Hauwa Obi"]]
+        self.dojo.take_snapshot()
+        new_office = "Green" if fellows[0].office.name == "Blue" else "Blue"
+        self.dojo.reallocate_person(fellows[0].id, new_office)
+        self.dojo.take_snapshot()
+        self.dojo.journal.close()
+        recovered = ConsoleDojo()
+        recovered.start_journal(CRASH)
+        self.assertEqual(list(recovered.unallocated["livingspace"]),
+                         [fellow.id for fellow in fellows])
+        self.assertEqual([fellow.id for fellow in recovered.fellow_list],
+                         [fellow.id for fellow in fellows])
+        recovered.stop_journal()
+
+    def test_journal_kept_across_load(self):
+        """ This function test loading a state does not stop the journal """
+        self.make_changes()
+        self.dojo.save_state("memory:other")
+        self.dojo.reset()
+        self.assertIsNotNone(self.dojo.journal)
+        self.dojo.load_state("memory:other")
+        self.dojo.add_person("Femi Obi", "staff")
+        self.dojo.journal.close()
+        recovered = ConsoleDojo()
+        recovered.start_journal(CRASH)
+        self.assertEqual(self.get_state(recovered),
+                         self.get_state(self.dojo))
+        recovered.stop_journal()
+
+    def test_replay_snapshot_and_journal(self):
+        """ This function test recovering from a snapshot and journal """
+        self.dojo.snapshot_interval = 4
+        self.make_changes()
+        self.assertTrue(
+            os.path.isfile("data/{}_snapshot.sqlite".format(CRASH)))
+        self.assertLess(self.dojo.journal.record_count, 4)
+        self.dojo.journal.close()
+        recovered = ConsoleDojo()
+        recovered.start_journal(CRASH)
+        self.assertEqual(self.get_state(recovered),
+                         self.get_state(self.dojo))
+        recovered.stop_journal()
+
+    def test_first_snapshot_keeps_state(self):
+        """ This function test a new journal checkpoints the current state """
+        self.dojo.stop_journal()
+        os.remove("data/{}_snapshot.sqlite".format(CRASH))
+        self.dojo.create_room(["Blue"], "office")
+        self.dojo.add_person("Andy Carroll", "staff")
+        state = self.get_state(self.dojo)
+        self.dojo.start_journal(CRASH)
+        self.assertEqual(self.get_state(self.dojo), state)
+        self.assertEqual(self.dojo.notices, [])
+        self.dojo.journal.close()
+        recovered = ConsoleDojo()
+        recovered.start_journal(CRASH)
+        self.assertEqual(self.get_state(recovered), state)
+        recovered.stop_journal()
+
+    def test_unreadable_snapshot_not_replayed(self):
+        """ This function test a journal is not replayed without snapshot """
+        self.make_changes()
+        self.dojo.journal.close()
+        with open("data/{}_snapshot.sqlite".format(CRASH), "w") as snapshot:
+            snapshot.write("not a database")
+        recovered = Dojo()
+        recovered.create_room(["Red"], "office")
+        recovered.start_journal(CRASH)
+        self.assertIsNone(recovered.journal)
+        self.assertEqual(recovered.notices[-1].message,
+                         "{}.journal has not been replayed, its snapshot "
+                         "could not be loaded".format(CRASH))
+        self.assertEqual([room.name for room in recovered.all_rooms],
+                         ["Red"])
+        self.assertEqual(recovered.staff_list + recovered.fellow_list, [])
+        recovered.reset()
+
+
+class TestDojoCore(TestCase):
+    """ This class test the dojo without the console layer """
+
+    def setUp(self):
+        self.dojo = Dojo()
+
+    def tearDown(self):
+        self.dojo.reset()
+
+    def test_core_returns_results_without_output(self):
+        """ This function test results and notices replace the output """
+        rooms = self.dojo.create_room(["Ile", "Ile", "Oko1"], "office")
+        self.assertEqual([room.name for room in rooms], ["Ile"])
+        person = self.dojo.add_person("Ada Obi", "staff")
+        self.assertEqual(person.creation_messages()[1],
+                         ("info", "Ada has been allocated the office Ile"))
+        self.assertIsNone(self.dojo.reallocate_person(person.id, "Oko"))
+        self.assertEqual(self.dojo.print_room("Ile"),
+                         "ILE\n" + "-" * 30 + "\nADA OBI")
+        self.assertEqual([notice.level for notice in self.dojo.notices],
+                         ["error", "error"])
+        self.assertIn("Ile", self.dojo.notices[0].message)
+        self.assertEqual(self.dojo.notices[1].message, "Room not found")
+        self.assertEqual(sys.stdout.getvalue(), "")
+
+    def test_core_import_is_light(self):
+        """ This function test the console and database are not imported """
+        modules = subprocess.check_output(
+            [sys.executable, "-c", "import sys, rooms.dojo; "
+             "print(' '.join(sys.modules))"], universal_newlines=True).split()
+        for module in ["termcolor", "sqlite3", "multiprocessing"]:
+            self.assertNotIn(module, modules)
@@ -1,13 +1,15 @@
 from unittest import TestCase
 
-from rooms.dojo import Dojo
+from rooms.console import ConsoleDojo
 from persons.fellows import Fellow
+from persons.id_allocator import IdAllocator
 from persons.persons import Person
+from persons.waitlist import Waitlist
 
 
 class TestPersonClass(TestCase):
     def setUp(self):
-        self.dojo = Dojo()
+        self.dojo = ConsoleDojo()
         self.new_staff = self.dojo.add_person("Andy Carroll", "staff")
         self.new_staff_2 = self.dojo.add_person("Andy Caroline", "staff")
         self.new_fellow = self.dojo.add_person("Andy Carroll", "fellow")
@@ -28,7 +30,7 @@ class TestPersonClass(TestCase):
     def test_generate_id_fellow(self):
         """ This function test for successful generation of fellow id """
         new_fellow = Person("Garba Oluwatomi", "fellow")
-        new_fellow.generate_id(self.dojo.fellow_list)
+        new_fellow.generate_id(self.dojo.id_allocator)
         self.assertEqual(len(new_fellow.id), 7)
         self.assertEqual(new_fellow.id[0], "F")
         self.assertNotEqual(new_fellow.id, self.new_fellow.id)
@@ -36,8 +38,72 @@ class TestPersonClass(TestCase):
     def test_generate_id_staff(self):
         """ This function test for successful generation of staff id """
         new_staff = Person("Chigozie Oluwatomi", "staff")
-        new_staff.generate_id(self.dojo.staff_list)
+        new_staff.generate_id(self.dojo.id_allocator)
         self.assertEqual(len(new_staff.id), 7)
         self.assertEqual(new_staff.id[0], "S")
         self.assertNotEqual(new_staff.id, self.new_staff.id)
         self.assertNotEqual(new_staff.id, self.new_staff_2.id)
+
+
+class TestWaitlist(TestCase):
+    def setUp(self):
+        self.waitlist = Waitlist(["F-AAAAA", "S-BBBBB", "F-CCCCC"])
+
+    def test_waitlist_keeps_order(self):
+        """ This function test that the waitlist keeps insertion order """
+        self.waitlist.append("S-DDDDD")
+        self.assertEqual(list(self.waitlist),
+                         ["F-AAAAA", "S-BBBBB", "F-CCCCC", "S-DDDDD"])
+
+    def test_waitlist_remove(self):
+        """ This function test membership and removal from the waitlist """
+        self.assertIn("S-BBBBB", self.waitlist)
+        self.waitlist.remove("S-BBBBB")
+        self.assertNotIn("S-BBBBB", self.waitlist)
+        self.assertRaises(ValueError, self.waitlist.remove, "S-BBBBB")
+        self.assertEqual(len(self.waitlist), 2)
+
+    def test_waitlist_pop(self):
+        """ This function test popping the earliest id on the waitlist """
+        self.assertEqual(self.waitlist.pop(), "F-AAAAA")
+        self.assertEqual(self.waitlist.pop(), "S-BBBBB")
+        self.assertEqual(self.waitlist.pop(), "F-CCCCC")
+        self.assertRaises(IndexError, self.waitlist.pop)
+
+
+class TestIdAllocator(TestCase):
+    def setUp(self):
+        self.allocator = IdAllocator()
+
+    def test_generate_unique_ids(self):
+        """ This function test that generated ids are unique and valid """
+        dojo = ConsoleDojo()
+        ids = self.allocator.reserve("fellow", 1000)
+        self.assertEqual(len(set(ids)), 1000)
+        for person_id in ids:
+            self.assertTrue(dojo.check_valid_id(person_id))
+            self.assertEqual(person_id[0], "F")
+
+    def test_id_space_exhausted(self):
+        """ This function test the warning and exhaustion of the id space """
+        self.allocator.id_space = 10
+        self.allocator.reserve("staff", 8)
+        self.assertFalse(self.allocator.nearly_exhausted("staff"))
+        self.allocator.generate("staff")
+        self.assertTrue(self.allocator.nearly_exhausted("staff"))
+        self.assertFalse(self.allocator.nearly_exhausted("staff"))
+        self.assertEqual(len(self.allocator.reserve("staff", 5)), 1)
+        self.assertIsNone(self.allocator.generate("staff"))
+        self.assertIsNotNone(self.allocator.generate("fellow"))
+
+    def test_stored_and_retired_ids(self):
+        """ This function test stored ids count and removed ids retire """
+        allocator = IdAllocator(is_taken={"S-AAAAA"}.__contains__,
+                                stored={"staff": 9})
+        allocator.id_space = 10
+        self.assertTrue(allocator.nearly_exhausted("staff"))
+        allocator.retire("S-AAAAA")
+        self.assertIn("S-AAAAA", allocator.issued["S"])
+        self.assertEqual(allocator.count_used("S"), 9)
+        self.assertEqual(len(allocator.reserve("staff", 5)), 1)
+        self.assertIsNone(allocator.generate("staff"))
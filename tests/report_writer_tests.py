@@ -0,0 +1,128 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from rooms.dojo import Dojo
+from utils.custom_messages import file_cancelled_message
+from utils.report_writer import BufferedSink, peek, render_report
+from utils.safe_files import atomic_writer, file_lock
+
+# the report is named after the process so test runs can go on in parallel
+REPORT = "report_{}".format(os.getpid())
+
+
+class CountingSink(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class TestReportWriter(TestCase):
+    def test_render_report_streams_blocks(self):
+        """ This function test the first block is written at once """
+        sink = CountingSink()
+        produced = []
+
+        def blocks():
+            for number in range(1000):
+                produced.append(number)
+                if number == 1:
+                    self.assertEqual(sink.getvalue(), "TITLE\nline 0\n")
+                yield "line {}\n".format(number)
+
+        self.assertEqual(render_report(blocks(), [sink], "TITLE\n"), 1000)
+        self.assertEqual(len(produced), 1000)
+        self.assertTrue(sink.getvalue().endswith("line 999\n"))
+        self.assertEqual(sink.writes, 3)
+
+    def test_buffered_sink_writes_in_chunks(self):
+        """ This function test the text is passed on in large chunks """
+        sink = CountingSink()
+        buffer = BufferedSink(sink)
+        for _ in range(100):
+            buffer.write("x" * 1024)
+        buffer.flush()
+        self.assertEqual(len(sink.getvalue()), 100 * 1024)
+        self.assertEqual(sink.writes, 3)
+
+    def test_peek(self):
+        """ This function test an empty report is found without loss """
+        self.assertIsNone(peek(iter([])))
+        self.assertEqual(list(peek(iter(["a", "b"]))), ["a", "b"])
+
+
+class TestStreamingReports(TestCase):
+    def setUp(self):
+        self.dojo = Dojo()
+
+    def tearDown(self):
+        self.dojo.reset()
+        if os.path.isfile("data/{}.txt".format(REPORT)):
+            os.remove("data/{}.txt".format(REPORT))
+
+    def test_reports_to_sink_and_file(self):
+        """ This function test reports reach the sinks and the file """
+        self.dojo.create_room(["Blue"], "office")
+        self.dojo.add_person("Mike Tyson", "staff")
+        self.dojo.add_person("Ada Obi", "fellow", "Y")
+        pipe = io.StringIO()
+        self.assertEqual(self.dojo.show_report(
+            self.dojo.unallocated_lines(), "UNALLOCATED LIST\n\n", [pipe]), 1)
+        self.assertEqual(pipe.getvalue(),
+                         "UNALLOCATED LIST\n\nADA OBI - NO LIVINGSPACE\n")
+        self.assertEqual(self.dojo.print_allocation(REPORT), 1)
+        self.dojo.file_exist_option = "a"
+        self.assertEqual(self.dojo.print_person_list("staff"), 1)
+        self.assertEqual(self.dojo.print_allocation(REPORT), 1)
+        with open("data/{}.txt".format(REPORT)) as report_file:
+            self.assertEqual(report_file.read(), 2 * (
+                "\nBLUE\n" + "-" * 19 + "\nMIKE TYSON, ADA OBI\n\n"))
+        self.dojo.file_exist_option = None
+        self.assertEqual(self.dojo.print_allocation(REPORT), 1)
+        self.assertEqual(self.dojo.notices[-1].message,
+                         file_cancelled_message)
+
+    def test_report_file_locked_for_rename_only(self):
+        """ This function test the file is free while a report is written """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "report.txt")
+        with atomic_writer(path) as report_file:
+            report_file.write("first\n")
+            with file_lock(path):
+                pass
+        with atomic_writer(path, append=True) as report_file:
+            report_file.write("second\n")
+        with open(path) as report_file:
+            self.assertEqual(report_file.read(), "first\nsecond\n")
+        self.assertEqual(os.listdir(directory), ["report.txt"])
+
+    def test_file_lock_removed_when_released(self):
+        """ This function test sessions take turns and leave no lock file """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "report.txt")
+        holders = []
+
+        def hold_lock():
+            for _ in range(50):
+                with file_lock(path):
+                    holders.append(threading.get_ident())
+                    time.sleep(0.0001)
+                    holders.append(threading.get_ident())
+
+        threads = [threading.Thread(target=hold_lock) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(holders[0::2], holders[1::2])
+        self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,132 @@
+import builtins
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from unittest import TestCase
+
+from thedojo import TheDojo, main
+import re
+ansi_escape = re.compile(r'\x1b[^m]*m')
+# the report is named after the process so test runs can go on in parallel
+REPORT = "batch_{}".format(os.getpid())
+
+
+class TestBatchMode(TestCase):
+    def setUp(self):
+        self.app = TheDojo(interactive=False)
+
+    def tearDown(self):
+        self.app.dojo.reset()
+        self.app.dojo.file_exist_option = None
+        if os.path.isfile("data/{}.txt".format(REPORT)):
+            os.remove("data/{}.txt".format(REPORT))
+
+    def test_run_batch(self):
+        """ This function test running a script of commands """
+        status = self.app.run_batch(["# rooms", "create_room office Blue",
+                                     "", "add_person Ada Obi staff"])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(self.app.dojo.staff_list), 1)
+
+    def test_run_batch_failure(self):
+        """ This function test the status of a script with bad commands """
+        status = self.app.run_batch(["create_room office", "quit",
+                                     "create_room office Blue"])
+        self.assertEqual(status, 1)
+        self.assertEqual(len(self.app.dojo.all_rooms), 0)
+
+    def test_run_batch_dojo_errors(self):
+        """ This function test errors reported by the dojo fail a script """
+        for line in ["add_person Ada Obi staff Y", "remove_person S-AAAAA",
+                     "create_room hall Blue"]:
+            self.assertEqual(TheDojo(interactive=False).run_batch(
+                ["create_room office Blue", line]), 1)
+        self.assertEqual(self.app.run_batch(["print_rooms"]), 0)
+
+    def test_run_batch_missing_script(self):
+        """ This function test a script that cannot be found """
+        self.assertEqual(main(["--batch", "data/missing_script.txt"]), 2)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "The script data/missing_script.txt could not be "
+                         "found")
+
+    def test_run_batch_restores_colours(self):
+        """ This function test colours are only disabled during a script """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        script = os.path.join(directory, "script.txt")
+        with open(script, "w") as script_file:
+            script_file.write("create_room office Blue\n")
+        os.environ.pop("ANSI_COLORS_DISABLED", None)
+        stdout = sys.stdout
+        with open(os.path.join(directory, "output.txt"), "w+") as output:
+            sys.stdout = output
+            try:
+                status = main(["--batch", script])
+            finally:
+                sys.stdout = stdout
+            output.seek(0)
+            self.assertEqual(output.read().strip(),
+                             "An office called Blue has been successfully "
+                             "created")
+        self.assertEqual(status, 0)
+        self.assertNotIn("ANSI_COLORS_DISABLED", os.environ)
+
+    def test_run_batch_without_file_descriptor(self):
+        """ This function test a script run with output to a StringIO """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        script = os.path.join(directory, "script.txt")
+        with open(script, "w") as script_file:
+            script_file.write("create_room office Blue\n")
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            status = main(["--batch", script])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(status, 0)
+        self.assertEqual(output.strip(), "An office called Blue has been "
+                         "successfully created")
+
+    def test_run_batch_without_prompts(self):
+        """ This function test prompts are answered in batch mode """
+        self.app.dojo.file_exist_option = "a"
+        self.app.run_batch(["create_room office Blue",
+                            "add_person Ada Obi staff",
+                            "print_allocations --o=" + REPORT,
+                            "print_allocations --o=" + REPORT,
+                            "load_state missing"])
+        with open("data/{}.txt".format(REPORT)) as report:
+            self.assertEqual(report.read().count("ADA OBI"), 2)
+        output = sys.stdout.getvalue().strip().split("\n")
+        self.assertEqual(ansi_escape.sub("", output[len(output) - 1]),
+                         "File not found")
+
+    def test_prompts_let_go_of_lock(self):
+        """ This function test a prompt does not hold the dojo lock """
+        app = TheDojo()
+        answers = []
+
+        def answer(prompt):
+            thread = threading.Thread(target=lambda: answers.append(
+                app.dojo.lock.acquire(timeout=5) and
+                app.dojo.lock.release() is None))
+            thread.start()
+            thread.join()
+            return "n" if prompt == "(y/n): " else "c"
+
+        self.addCleanup(setattr, builtins, "input", builtins.input)
+        builtins.input = answer
+        app.onecmd("create_room office Blue")
+        app.onecmd("add_person Ada Obi staff")
+        app.onecmd("print_allocations --o=" + REPORT)
+        app.onecmd("print_allocations --o=" + REPORT)
+        app.onecmd("load_state missing")
+        self.assertEqual(answers, [True, True])
+        self.assertFalse(app.dojo.command_running)
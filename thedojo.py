@@ -1,36 +1,65 @@
 #!/usr/bin/env python
+"""
+Usage:
+    thedojo.py [--journal=<name>]
+    thedojo.py --batch [<script>] [--file-exist=<option>] [--journal=<name>]
+
+Options:
+    --journal=<name>        Recover the state journaled under the name at
+                            startup and journal every further change
+    --batch                 Run the commands of a script, or of the stdin
+                            when there is no script or it is '-', without
+                            prompts and exit with status 1 if any failed
+    --file-exist=<option>   What to do with a report file that already
+                            exists in batch mode: a to append to it, w to
+                            overwrite it or c to cancel [default: a]
+"""
 import cmd
+import io
 import os
+import sys
 
 from docopt import docopt, DocoptExit
 from termcolor import cprint
 from pyfiglet import figlet_format
 
-from rooms.dojo import Dojo
+from rooms.console import ConsoleDojo
+from utils import instrumentation
+from utils.command_parser import CommandParser
 from utils.custom_messages import (
     invalid_command, unexpected_error, welcome_message, missing_command,
-    state_overwrite_warning, invalid_wants_accomodation
+    state_overwrite_warning, invalid_wants_accomodation, stats_on_info,
+    stats_off_info, stats_reset_info, stats_empty_info, stats_dumped_info,
+    script_not_found_error
 )
 
 
 def docopt_cmd(func):
-    """ This is the decorator for the functions running the commands """
+    """
+    This is the decorator for the functions running the commands, the
+    parser of the usage docstring is built once when the class is set up
+    """
+    parser = CommandParser(func.__doc__)
 
     def fn(self, arg):
         opt = None
+        command = func.__name__[3:]
         try:
-            opt = docopt(fn.__doc__, arg)
+            with instrumentation.measure("command.{}.parse".format(command)):
+                opt = parser.parse(arg)
 
         except DocoptExit as e:
             # The DocoptExit is thrown when the args do not match.
             # It prints a message to the user and the usage block.
             cprint(invalid_command, "yellow")
             cprint(e, "cyan")
+            self.errors += 1
             return
         except:
             return
 
-        return func(self, opt)
+        with instrumentation.measure("command.{}.run".format(command)):
+            return func(self, opt)
 
     fn.__name__ = func.__name__
     fn.__doc__ = func.__doc__
@@ -39,34 +68,82 @@ def docopt_cmd(func):
 
 
 class TheDojo (cmd.Cmd):
-    os.system("clear")
-    cprint(figlet_format("The Dojo", font="starwars"),
-           "yellow", attrs=["bold"])
     intro = welcome_message
     prompt = "The_Dojo >>> "
     doc_header = "List of commands that can be used in this app"
-    dojo = Dojo()
+    dojo = ConsoleDojo()
+
+    def __init__(self, interactive=True, **kwargs):
+        cmd.Cmd.__init__(self, **kwargs)
+        self.interactive = interactive
+        self.errors = 0
+
+    def onecmd(self, line):
+        """
+        Commands hold the dojo lock so autosave sees whole changes, the
+        lock is let go while a prompt waits for the user. The notices of
+        the dojo are cleared first, they hold those of the command only.
+        """
+        self.dojo.notices.clear()
+        with self.dojo.running_command():
+            return cmd.Cmd.onecmd(self, line)
 
     def default(self, line):
         cprint(missing_command.format(line), "yellow")
+        self.errors += 1
+
+    def confirm(self, warning):
+        """
+        This function asks the user to confirm an action, in batch mode
+        the action goes ahead without asking
+        """
+        if not self.interactive:
+            return True
+        cprint(warning, "red")
+        with self.dojo.waiting_for_user():
+            return input("(y/n): ").lower() == "y"
+
+    def run_batch(self, lines):
+        """
+        This function runs each command of lines through the same
+        handlers as the prompt. Blank lines and lines starting with # are
+        skipped and quit ends the run. It returns the exit status, 1 when
+        any command failed, that is any command the dojo reported an error
+        for.
+        """
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                self.onecmd(line)
+            except SystemExit:
+                break
+            except Exception as error:
+                cprint("{}: {}".format(line, error), "red")
+                self.errors += 1
+            if any(notice.level == "error" for notice in self.dojo.notices):
+                self.errors += 1
+        self.dojo.stop_autosave()
+        return 1 if self.errors else 0
 
     @docopt_cmd
     def do_print_room(self, arg):
-        """Usage: print_room <room_name>"""
+        """Usage: print_room <room_name> [--db=sqlite_database]"""
         room = arg['<room_name>']
-        self.dojo.print_room(room)
+        self.dojo.print_room(room, arg['--db'])
 
     @docopt_cmd
     def do_print_allocations(self, arg):
-        """Usage: print_allocations [--o=filename]  """
+        """Usage: print_allocations [--o=filename] [--db=sqlite_database]"""
         file_name = arg['--o']
-        self.dojo.print_allocation(file_name)
+        self.dojo.print_allocation(file_name, arg['--db'])
 
     @docopt_cmd
     def do_print_unallocated(self, arg):
-        """Usage: print_unallocated [--o=filename]  """
+        """Usage: print_unallocated [--o=filename] [--db=sqlite_database]"""
         file_name = arg['--o']
-        self.dojo.print_unallocated(file_name)
+        self.dojo.print_unallocated(file_name, arg['--db'])
 
     @docopt_cmd
     def do_create_room(self, arg):
@@ -87,14 +164,15 @@ class TheDojo (cmd.Cmd):
         accommodation = arg['<wants_accommodation>']
         if accommodation and accommodation.lower() not in \
                 ["y", "yes", "no", "n"]:
-            cprint(invalid_wants_accomodation, "red")
+            self.dojo.notify("error", invalid_wants_accomodation)
             return
         accommodation = "Y" if accommodation and accommodation.lower() in \
             ["y", "yes"] else "N"
         new_person = self.dojo.add_person(fname + " " + lname,
                                           designation, accommodation)
         if new_person:
-            new_person.print_creation_info()
+            for level, message in new_person.creation_messages():
+                self.dojo.notify(level, message)
 
     @docopt_cmd
     def do_reallocate_person(self, arg):
@@ -103,10 +181,21 @@ class TheDojo (cmd.Cmd):
         new_room = arg['<new_room>']
         self.dojo.reallocate_person(person_id, new_room)
 
+    @docopt_cmd
+    def do_remove_person(self, arg):
+        """Usage: remove_person <unique_id>"""
+        self.dojo.remove_person(arg['<unique_id>'])
+
     @docopt_cmd
     def do_load_people(self, arg):
-        """Usage: load_people <file_name>"""
-        self.dojo.load_people(arg['<file_name>'])
+        """Usage: load_people <file_name> [--workers=<count>]"""
+        workers = arg['--workers']
+        if workers and not workers.isdigit():
+            cprint(invalid_command, "yellow")
+            self.errors += 1
+            return
+        self.dojo.load_people(arg['<file_name>'],
+                              int(workers) if workers else None)
 
     @docopt_cmd
     def do_print_people(self, arg):
@@ -117,17 +206,70 @@ class TheDojo (cmd.Cmd):
 
     @docopt_cmd
     def do_save_state(self, arg):
-        """Usage: save_state [--db=sqlite_database]"""
+        """Usage: save_state [--db=sqlite_database]""" \
+            """ [--incremental | --binary]"""
         db_name = arg['--db']
-        self.dojo.save_state(db_name)
+        self.dojo.save_state(db_name, arg['--incremental'], arg['--binary'])
 
     @docopt_cmd
     def do_load_state(self, arg):
-        """Usage: load_state <sqlite_database>"""
-        cprint(state_overwrite_warning, "red")
-        overwrite = input("(y/n): ")
-        if overwrite.lower() == "y":
-            self.dojo.load_state(arg['<sqlite_database>'])
+        """Usage: load_state <sqlite_database> [--binary | --lazy]"""
+        if self.confirm(state_overwrite_warning):
+            self.dojo.load_state(arg['<sqlite_database>'], arg['--binary'],
+                                 arg['--lazy'])
+
+    @docopt_cmd
+    def do_journal(self, arg):
+        """Usage: journal <journal_name>"""
+        self.dojo.start_journal(arg['<journal_name>'])
+
+    @docopt_cmd
+    def do_autosave(self, arg):
+        """
+        Usage:
+            autosave start <sqlite_database> [--interval=<seconds>]""" \
+        """ [--changes=<count>]
+            autosave stop
+            autosave status
+        """
+        if arg['start']:
+            interval = arg['--interval'] or "60"
+            changes = arg['--changes'] or "1000"
+            if not interval.isdigit() or not changes.isdigit():
+                cprint(invalid_command, "yellow")
+                self.errors += 1
+                return
+            self.dojo.start_autosave(arg['<sqlite_database>'], int(interval),
+                                     int(changes))
+        elif arg['stop']:
+            if not self.dojo.stop_autosave():
+                self.dojo.print_autosave_status()
+        else:
+            self.dojo.print_autosave_status()
+
+    @docopt_cmd
+    def do_stats(self, arg):
+        """
+        Usage:
+            stats [--dump=<file>]
+            stats (on | off | reset)
+        """
+        if arg['on']:
+            instrumentation.enable()
+            cprint(stats_on_info, "green")
+        elif arg['off']:
+            instrumentation.disable()
+            cprint(stats_off_info, "green")
+        elif arg['reset']:
+            instrumentation.reset()
+            cprint(stats_reset_info, "green")
+        elif not instrumentation.histograms:
+            cprint(stats_empty_info, "yellow")
+        else:
+            cprint(instrumentation.format_stats(), "green")
+            if arg['--dump']:
+                instrumentation.dump_stats(arg['--dump'])
+                cprint(stats_dumped_info.format(arg['--dump']), "green")
 
     @docopt_cmd
     def do_print_rooms(self, arg):
@@ -137,8 +279,74 @@ class TheDojo (cmd.Cmd):
     @docopt_cmd
     def do_quit(self, arg):
         """Usage: quit"""
+        self.dojo.stop_autosave()
         cprint("=========== Good Bye =============!\n", "green")
         exit()
 
 
-TheDojo().cmdloop()
+def buffer_output(stdout):
+    """
+    This function gives a buffered writer of the file descriptor of
+    stdout. An output without a file descriptor, such as a StringIO, is
+    used as it is.
+    """
+    try:
+        descriptor = stdout.fileno()
+    except (AttributeError, OSError):
+        return stdout
+    stdout.flush()
+    return io.TextIOWrapper(
+        io.open(descriptor, "wb", buffering=1 << 16, closefd=False),
+        encoding=stdout.encoding, errors="replace")
+
+
+def run_batch(script, file_exist_option, journal_name=None):
+    """
+    This function runs a command script without the banner, prompts or
+    colours. The output is buffered and written out as it fills up. The
+    colours and the output are restored when the script ends.
+    """
+    if script and script != "-" and not os.path.isfile(script):
+        cprint(script_not_found_error.format(script), "red")
+        return 2
+    colors_disabled = os.environ.get("ANSI_COLORS_DISABLED")
+    os.environ["ANSI_COLORS_DISABLED"] = "1"
+    stdout = sys.stdout
+    sys.stdout = buffer_output(stdout)
+    TheDojo.dojo.file_exist_option = file_exist_option
+    try:
+        if journal_name:
+            TheDojo.dojo.start_journal(journal_name)
+        if script and script != "-":
+            with open(script) as script_file:
+                status = TheDojo(interactive=False).run_batch(script_file)
+        else:
+            status = TheDojo(interactive=False).run_batch(sys.stdin)
+    finally:
+        sys.stdout.flush()
+        sys.stdout = stdout
+        if colors_disabled is None:
+            del os.environ["ANSI_COLORS_DISABLED"]
+        else:
+            os.environ["ANSI_COLORS_DISABLED"] = colors_disabled
+    return status
+
+
+def main(argv=None):
+    arg = docopt(__doc__, argv)
+    if arg['--batch']:
+        if arg['--file-exist'] not in ["a", "w", "c"]:
+            cprint(invalid_command, "yellow")
+            return 2
+        return run_batch(arg['<script>'], arg['--file-exist'],
+                         arg['--journal'])
+    os.system("clear")
+    cprint(figlet_format("The Dojo", font="starwars"),
+           "yellow", attrs=["bold"])
+    if arg['--journal']:
+        TheDojo.dojo.start_journal(arg['--journal'])
+    TheDojo().cmdloop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
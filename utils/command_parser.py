@@ -0,0 +1,41 @@
+from docopt import (
+    AnyOptions, Dict, DocoptExit, Option, TokenStream, extras, formal_usage,
+    parse_argv, parse_defaults, parse_pattern, printable_usage
+)
+
+
+class CommandParser(object):
+    """
+    This class is a docopt parser built once from a usage docstring.
+    Calling docopt parses the docstring again for every command, here
+    the usage pattern is kept and only the arguments are matched. The
+    arguments accepted, the values returned and the DocoptExit raised
+    are the same as those of docopt.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.usage = printable_usage(doc)
+        self.options = parse_defaults(doc)
+        self.pattern = parse_pattern(formal_usage(self.usage), self.options)
+        pattern_options = set(self.pattern.flat(Option))
+        for any_options in self.pattern.flat(AnyOptions):
+            any_options.children = list(
+                set(parse_defaults(doc)) - pattern_options)
+        self.pattern = self.pattern.fix()
+
+    def parse(self, argv):
+        """
+        This function matches the arguments against the usage pattern and
+        returns the dictionary of values docopt would return
+        """
+        DocoptExit.usage = self.usage
+        argv = parse_argv(TokenStream(argv, DocoptExit), list(self.options),
+                          False)
+        extras(True, None, argv, self.doc)
+        matched, left, collected = self.pattern.match(argv)
+        if matched and left == []:
+            return Dict((leaf.name, list(leaf.value)
+                         if isinstance(leaf.value, list) else leaf.value)
+                        for leaf in (self.pattern.flat() + collected))
+        raise DocoptExit()
@@ -32,6 +32,10 @@ livingspace_request_error = "Staff cannot request for a livingspace!"
 invalid_designation_error = (
     "Person cannot be created due to invalid designation!"
 )
+invalid_record_error = (
+    "Person cannot be created, a name, a designation and an optional"
+    " accommodation option must be supplied as text!"
+)
 empty_allocation_list = "Nobody on the allocated list."
 empty_room_list = "No room added yet"
 empty_unallocated_list = "Nobody on the unallocated list."
@@ -58,4 +62,51 @@ line_parameter_error = (
 )
 people_loaded_info = "{} on the list have been successfully loaded"
 empty_file_error = "The file selected is empty"
-state_loaded_info = "Data in {}.sqlite have been successfully loaded"
+state_loaded_info = "Data in {} have been successfully loaded"
+state_not_loaded_error = "{} could not be loaded: {}"
+id_space_warning = (
+    "Warning: the ids available for a {} are nearly exhausted"
+)
+id_space_exhausted_error = (
+    "Person cannot be created, all ids for a {} have been issued"
+)
+person_removed_info = "{} {} with id {} has been successfully removed"
+incremental_name_error = (
+    "A database name must be supplied to save the state incrementally"
+)
+incremental_exist_error = (
+    "{} already existed and was not saved or loaded in this session!"
+    " Kindly choose another name."
+)
+journal_started_info = (
+    "Journaling to {}.journal, {} journal entries have been recovered"
+)
+binary_state_exist_error = (
+    "Snapshot name already existed! Kindly choose another name."
+)
+binary_state_saved_info = "The state has been successfully saved in {}.dojo"
+saved_state_unreadable_error = "{}.sqlite cannot be read: {}"
+autosave_started_info = (
+    "Autosaving to {} every {} seconds or {} changes"
+)
+autosave_stopped_info = "Autosave to {} has been stopped"
+autosave_off_info = "Autosave is off"
+autosave_not_running_error = (
+    "The autosave thread is not running, stop and start the autosave"
+)
+autosave_status_info = (
+    "Last autosave at {} took {:.3f}s for {} rows, {} autosaves in total"
+)
+journal_in_use_error = "{}.journal is in use by another session"
+journal_snapshot_error = (
+    "{}.journal has not been replayed, its snapshot could not be loaded"
+)
+unsupported_backend_error = "{} cannot be used for {}"
+script_not_found_error = "The script {} could not be found"
+stats_on_info = "Command timings are being recorded"
+stats_off_info = "Command timings are no longer recorded"
+stats_reset_info = "Command timings have been cleared"
+stats_empty_info = (
+    "No command timings recorded, run 'stats on' or set DOJO_STATS=1"
+)
+stats_dumped_info = "Command timings have been written to {}"
@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+from functools import wraps
+import os
+import random
+import sys
+import time
+
+
+class Histogram(object):
+    """
+    This class keeps the wall times and allocated memory blocks of the
+    calls of a command or function. At most max_samples times are kept,
+    picked at random once there are more, to give the percentiles.
+    """
+
+    max_samples = 10000
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.allocations = 0
+        self.samples = []
+
+    def add(self, seconds, allocations):
+        self.count += 1
+        self.total += seconds
+        self.allocations += allocations
+        if len(self.samples) < self.max_samples:
+            self.samples.append(seconds)
+        else:
+            index = random.randrange(self.count)
+            if index < self.max_samples:
+                self.samples[index] = seconds
+
+    def percentile(self, ratio):
+        """ This function gets the time below which ratio of calls fall """
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(ratio * len(samples)))]
+
+    def to_dict(self):
+        return {"count": self.count, "total_seconds": self.total,
+                "p50_seconds": self.percentile(0.5),
+                "p95_seconds": self.percentile(0.95),
+                "p99_seconds": self.percentile(0.99),
+                "allocations_per_call": self.allocations / max(self.count, 1)}
+
+
+enabled = os.environ.get("DOJO_STATS") == "1"
+histograms = {}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    histograms.clear()
+
+
+@contextmanager
+def measure(name):
+    """
+    This function records the wall time and the change in allocated
+    memory blocks of the block it wraps under name, when instrumentation
+    is enabled. The allocation count is rough as blocks freed in the
+    block are subtracted.
+    """
+    if not enabled:
+        yield
+        return
+    blocks = sys.getallocatedblocks()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start_time
+        histograms.setdefault(name, Histogram()).add(
+            seconds, max(sys.getallocatedblocks() - blocks, 0))
+
+
+def instrumented(func):
+    """
+    This function is a decorator recording the calls of a function under
+    its qualified name, it only checks a flag when instrumentation is off
+    """
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        with measure(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def format_stats():
+    """ This function formats the recorded calls as a table """
+    lines = ["{:<32}{:>8}{:>11}{:>11}{:>11}{:>11}{:>10}".format(
+        "name", "calls", "total (s)", "p50 (ms)", "p95 (ms)", "p99 (ms)",
+        "allocs")]
+    for name in sorted(histograms):
+        stats = histograms[name].to_dict()
+        lines.append("{:<32}{:>8}{:>11.3f}{:>11.3f}{:>11.3f}{:>11.3f}"
+                     "{:>10.0f}".format(
+                         name, stats["count"], stats["total_seconds"],
+                         stats["p50_seconds"] * 1000,
+                         stats["p95_seconds"] * 1000,
+                         stats["p99_seconds"] * 1000,
+                         stats["allocations_per_call"]))
+    return "\n".join(lines)
+
+
+def dump_stats(path):
+    """
+    This function writes the recorded calls and their samples to a JSON
+    file for offline analysis
+    """
+    import json
+
+    with open(path, "w") as stats_file:
+        json.dump({name: dict(histogram.to_dict(),
+                              samples=histogram.samples)
+                   for name, histogram in histograms.items()},
+                  stats_file, indent=2)
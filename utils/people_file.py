@@ -0,0 +1,172 @@
+from importlib import import_module
+import os
+import sys
+
+from utils.custom_messages import (
+    invalid_designation_error, invalid_wants_accomodation,
+    livingspace_request_error
+)
+
+file_openers = {".gz": "gzip", ".bz2": "bz2"}
+# people files are decoded the same way whether read in one pass or in
+# parallel chunks, whatever the locale of the machine
+people_file_encoding = "utf-8"
+
+
+def get_people_file_path(file_name):
+    """
+    This function resolves the file name passed to load_people. It can be
+    a path to a file or the name of a .txt file in the data folder.
+    """
+    if os.path.isfile(file_name):
+        return file_name
+    data_file = "data/{}.txt".format(file_name)
+    if os.path.isfile(data_file):
+        return data_file
+
+
+def open_people_file(file_name):
+    """
+    This function opens the people file for reading as text in the
+    people file encoding, gzip and bz2 files are decompressed on the fly
+    and '-' reads from the stdin. It returns None when the file cannot be
+    found.
+    """
+    if file_name == "-":
+        return sys.stdin
+    path = get_people_file_path(file_name)
+    if path:
+        module = file_openers.get(os.path.splitext(path)[1].lower())
+        if module:
+            return import_module(module).open(
+                path, "rt", encoding=people_file_encoding)
+        return open(path, "rt", encoding=people_file_encoding)
+
+
+def read_people_lines(file_name):
+    """
+    This function yields the lines of the people file one at a time so
+    that the file is never held in memory as a whole
+    """
+    people_file = open_people_file(file_name)
+    try:
+        for line in people_file:
+            yield line
+    finally:
+        if people_file is not sys.stdin:
+            people_file.close()
+
+
+def parse_person_line(line):
+    """
+    This function splits a line of the people file into the name,
+    designation and accommodation option of the person. It returns None
+    when the line does not have the right number of parameters.
+    """
+    person_detail = line.strip().split()
+    if len(person_detail) not in [3, 4]:
+        return None
+    if len(person_detail) == 3:
+        person_detail.append("N")
+    name = person_detail[0] + " " + person_detail[1]
+    return name, person_detail[2], person_detail[3]
+
+
+def check_person_details(designation, wants_accommodation):
+    """
+    This function validates the designation and accommodation option
+    of a person, it returns the error message or None when valid
+    """
+    wants_accommodation = wants_accommodation.lower()
+    designation = designation.lower().strip()
+    if wants_accommodation not in ["yes", "y", "no", "n"]:
+        return invalid_wants_accomodation
+    elif designation not in ["fellow", "staff"]:
+        return invalid_designation_error
+    elif designation == "staff" and wants_accommodation in ["y", "yes"]:
+        return livingspace_request_error
+
+
+def can_load_in_parallel(file_name):
+    """
+    This function checks if a people file can be split into byte ranges,
+    which is not possible for the stdin or compressed files
+    """
+    path = get_people_file_path(file_name) if file_name != "-" else None
+    return bool(path) and \
+        os.path.splitext(path)[1].lower() not in file_openers
+
+
+def split_file_ranges(path, chunk_size):
+    """
+    This function splits a file into (start, end) byte ranges of about
+    chunk_size bytes, each range ends just after a newline
+    """
+    ranges = []
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as people_file:
+        start = 0
+        while start < file_size:
+            people_file.seek(start + chunk_size)
+            people_file.readline()
+            end = min(people_file.tell(), file_size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_people_chunk(chunk):
+    """
+    This function parses and validates the lines of a byte range of the
+    people file. It returns the number of lines read and a list of
+    (line index, kind, value) entries for the lines that are not blank,
+    where kind is 'person', 'invalid' or 'parameters'.
+    """
+    path, start, end = chunk
+    with open(path, "rb") as people_file:
+        people_file.seek(start)
+        data = people_file.read(end - start).decode(people_file_encoding)
+    entries = []
+    lines = data.split("\n")
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        person_detail = parse_person_line(line)
+        if not person_detail:
+            entries.append((index, "parameters", None))
+            continue
+        error = check_person_details(person_detail[1], person_detail[2])
+        if error:
+            entries.append((index, "invalid", error))
+        else:
+            entries.append((index, "person", person_detail))
+    return len(lines) - 1, entries
+
+
+def parse_people_in_parallel(path, workers, chunk_size=4 * 1024 * 1024):
+    """
+    This function parses the people file in a pool of processes and
+    yields (line number, kind, value) entries in the original file order.
+    The total number of lines is yielded last as (line count, None, None).
+    At most two chunks per worker are parsed ahead of the entries being
+    consumed, so memory stays bounded however large the file is.
+    """
+    from collections import deque
+    from itertools import islice
+    from multiprocessing import Pool
+
+    line_offset = 0
+    ranges = iter(split_file_ranges(path, chunk_size))
+    pending = deque()
+    with Pool(workers) as pool:
+        while True:
+            for start, end in islice(ranges, 2 * workers - len(pending)):
+                pending.append(pool.apply_async(
+                    parse_people_chunk, ((path, start, end),)))
+            if not pending:
+                break
+            line_count, entries = pending.popleft().get()
+            for index, kind, value in entries:
+                yield line_offset + index + 1, kind, value
+            line_offset += line_count
+    yield line_offset + 1, None, None
@@ -0,0 +1,67 @@
+from itertools import chain
+
+
+class BufferedSink(object):
+    """
+    This class collects the text written to a sink and passes it on in
+    chunks of about buffer_size characters, so a report of many lines
+    costs a few writes. The first text is passed on at once so the start
+    of a report is seen without waiting for the buffer to fill, and the
+    writer can flush the buffer at any time.
+    """
+
+    buffer_size = 64 * 1024
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.pending = []
+        self.size = 0
+        self.written = False
+
+    def write(self, text):
+        self.pending.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size or not self.written:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.sink.write("".join(self.pending))
+            self.pending = []
+            self.size = 0
+            self.written = True
+
+
+def peek(blocks):
+    """
+    This function checks whether a report has any block without losing
+    it, it returns None for an empty report or an iterator of all the
+    blocks otherwise
+    """
+    blocks = iter(blocks)
+    for first in blocks:
+        return chain([first], blocks)
+
+
+def render_report(blocks, sinks, title=""):
+    """
+    This function writes the title and then the blocks of a report, as
+    they are produced, to each of the sinks. A sink is anything with a
+    write method: a file, a pipe or the terminal. The title and the first
+    block are passed on at once, after that only the blocks waiting in
+    the buffers are held in memory. It returns the number of blocks.
+    """
+    buffers = [BufferedSink(sink) for sink in sinks]
+    count = 0
+    if title:
+        for buffer in buffers:
+            buffer.write(title)
+    for block in blocks:
+        for buffer in buffers:
+            buffer.write(block)
+            if not count:
+                buffer.flush()
+        count += 1
+    for buffer in buffers:
+        buffer.flush()
+    return count
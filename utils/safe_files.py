@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def create_exclusive(path):
+    """
+    This function creates an empty file at the path unless a file is
+    already there. The check and the creation are one atomic step, so of
+    several sessions creating the same file only one succeeds. It returns
+    True when the file was created.
+    """
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+    except FileExistsError:
+        return False
+    return True
+
+
+@contextmanager
+def file_lock(path):
+    """
+    This function holds an advisory lock on a lock file next to the file
+    at the path while the block runs. The file itself is never opened,
+    closing a descriptor of a SQLite database would drop the locks SQLite
+    holds on it. The lock file is removed when the lock is released, a
+    session that locked a lock file after it was removed tries again on
+    a new one. The lock is skipped on platforms without flock.
+    """
+    if not fcntl:
+        yield
+        return
+    lock_path = path + ".lock"
+    while True:
+        descriptor = os.open(lock_path, os.O_RDONLY | os.O_CREAT, 0o644)
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(descriptor), os.stat(lock_path)):
+                break
+        except FileNotFoundError:
+            pass
+        os.close(descriptor)
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+        os.close(descriptor)
+
+
+def try_lock(open_file):
+    """
+    This function takes an advisory lock on an open file for as long as
+    it stays open. An OSError is raised when another session holds it.
+    """
+    if fcntl:
+        fcntl.flock(open_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def make_temp_file(path):
+    """ This function creates an empty temporary file next to the path """
+    import tempfile
+
+    directory, name = os.path.split(path)
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=directory or ".", prefix=name + ".", suffix=".tmp")
+    os.close(descriptor)
+    os.chmod(temp_path, 0o644)
+    return temp_path
+
+
+@contextmanager
+def atomic_writer(path, append=False):
+    """
+    This function opens a temporary file next to the path for the block
+    to write to and renames it into place when the block ends, so the
+    file is never seen half written. When append is True the current
+    content and the text written are copied into a second temporary file
+    first. The block runs without a lock, the file is only locked for
+    the copy and the rename so writers of the same file take turns. The
+    file is left as it was if the block fails.
+    """
+    import shutil
+
+    temp_paths = [make_temp_file(path)]
+    try:
+        with open(temp_paths[0], "w") as temp_file:
+            yield temp_file
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        with file_lock(path):
+            if append:
+                temp_paths.append(make_temp_file(path))
+                with open(temp_paths[1], "wb") as joined_file:
+                    for part in [path, temp_paths[0]]:
+                        with open(part, "rb") as part_file:
+                            shutil.copyfileobj(part_file, joined_file)
+                    joined_file.flush()
+                    os.fsync(joined_file.fileno())
+            os.replace(temp_paths[-1], path)
+            temp_paths.pop()
+    finally:
+        for temp_path in temp_paths:
+            os.remove(temp_path)